@@ -0,0 +1,256 @@
+"""
+Reports the accuracy of many evaluation runs at once, per model and
+relations order, per number of relation types and per graph size, with
+bootstrap confidence intervals. For example, from src:
+
+    python analyze_results.py --results ../data/results/qa_models/*.txt \
+        --stats ../data/dataset_stats.csv
+
+Every results file is reduced to the instances and correct answers of each
+graph, which is cached by the hash of the file, so reporting again over
+many runs only reads the new ones.
+"""
+import argparse
+import hashlib
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+from results_sink import is_parquet
+
+RELATIONS_ORDERS = [
+    'as_is', 'shuffle', 'interleave_asc', 'interleave_desc', 'latest'
+]
+
+# Changing how the results are reduced must change it, so the cache of
+# the older reductions is ignored
+CACHE_VERSION = 1
+
+# Number of bytes read at a time when hashing a results file
+HASH_CHUNK_SIZE = 1 << 20
+
+# Max number of resampled graphs held in memory at once when bootstrapping
+BOOTSTRAP_CHUNK_SIZE = 1 << 22
+
+
+def config_argparser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Reports the accuracy of evaluation runs")
+
+    parser.add_argument("--results",
+                        type=str,
+                        nargs="+",
+                        required=True,
+                        help="The results files. They should be named"\
+                            " <model>_<relations order>_results.<ext>")
+
+    parser.add_argument("--stats",
+                        type=str,
+                        default=None,
+                        help="The stats of the dataset, as saved by"\
+                            " dataset_stats.py. Needed to report per graph"\
+                            " size. Default: None")
+
+    parser.add_argument("--n_bootstrap",
+                        type=int,
+                        default=1000,
+                        help="Number of bootstrap samples. Default: 1000")
+
+    parser.add_argument("--confidence",
+                        type=float,
+                        default=0.95,
+                        help="Confidence of the intervals. Default: 0.95")
+
+    parser.add_argument("--seed",
+                        type=int,
+                        default=0,
+                        help="Seed of the bootstrap. Default: 0")
+
+    parser.add_argument("--cache_dir",
+                        type=str,
+                        default=".analysis_cache",
+                        help="Where to cache the reduced results files."\
+                            " Default: .analysis_cache")
+
+    parser.add_argument("--save_to",
+                        type=str,
+                        default=None,
+                        help="Where to save the report as csv. Default: None")
+
+    return parser
+
+
+def parse_run_name(results_path: str) -> tuple[str, str]:
+    """
+    Returns the model and the relations order of a results file named
+    <model>_<relations order>_results.<ext>. The relations order is empty
+    if it isn't in the name.
+    """
+    name = pathlib.Path(results_path).stem.removesuffix("_results")
+    for relations_order in RELATIONS_ORDERS:
+        if name.endswith("_" + relations_order):
+            return name.removesuffix("_" + relations_order), relations_order
+    return name, ""
+
+
+def hash_file(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as results_file:
+        while chunk := results_file.read(HASH_CHUNK_SIZE):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def reduce_results(results_path: str) -> pd.DataFrame:
+    """
+    Returns the instances and correct answers of every graph of the results
+    """
+    columns = ['graph_id', 'expected', 'predicted']
+    if is_parquet(results_path):
+        results = pd.read_parquet(results_path, columns=columns)
+    else:
+        results = pd.read_csv(results_path,
+                              usecols=columns,
+                              dtype={
+                                  'graph_id': np.int64,
+                                  'expected': str,
+                                  'predicted': str
+                              },
+                              keep_default_na=False)
+
+    results['correct'] = results['expected'] == results['predicted']
+    graphs = results.groupby('graph_id', sort=True)['correct'].agg(
+        n_instances='size', n_correct='sum')
+    return graphs.reset_index()
+
+
+def load_reduced_results(results_path: str,
+                         cache_dir: str = None) -> pd.DataFrame:
+    """
+    Returns reduce_results of the file, cached in cache_dir by its hash
+    """
+    if cache_dir is None:
+        return reduce_results(results_path)
+
+    cache_path = pathlib.Path(
+        cache_dir) / f"{hash_file(results_path)}-v{CACHE_VERSION}.npz"
+    if cache_path.exists():
+        with np.load(cache_path) as cached:
+            return pd.DataFrame({name: cached[name] for name in cached.files})
+
+    graphs = reduce_results(results_path)
+    cache_path.parent.mkdir(exist_ok=True, parents=True)
+    # Written aside and renamed, so a halted run never leaves it half written
+    tmp_path = cache_path.with_suffix(".tmp.npz")
+    np.savez(tmp_path, **{name: graphs[name].to_numpy() for name in graphs})
+    tmp_path.replace(cache_path)
+    return graphs
+
+
+def load_runs(results_paths: list[str],
+              stats_path: str = None,
+              cache_dir: str = None) -> pd.DataFrame:
+    """
+    Returns the instances and correct answers of every graph of every run,
+    with the model and relations order of the run and the number of
+    relation types of the graph. With the dataset stats, it also has the
+    number of nodes of the graph and the relation types come from them.
+    Otherwise, they are the instances of the graph, as every relation type
+    is asked once.
+    """
+    runs = list()
+    for results_path in results_paths:
+        graphs = load_reduced_results(results_path, cache_dir)
+        graphs['model'], graphs['relations_order'] = parse_run_name(
+            results_path)
+        runs.append(graphs)
+    runs = pd.concat(runs, ignore_index=True)
+
+    if stats_path is None:
+        runs['relations'] = runs['n_instances']
+        return runs
+
+    stats = pd.read_csv(stats_path, usecols=['nodes', 'relations'])
+    assert runs['graph_id'].max() < len(stats), \
+        f"{stats_path} has less graphs than the results!"
+    runs['nodes'] = stats['nodes'].to_numpy()[runs['graph_id']]
+    runs['relations'] = stats['relations'].to_numpy()[runs['graph_id']]
+    return runs
+
+
+def bootstrap_accuracy(n_instances: np.ndarray,
+                       n_correct: np.ndarray,
+                       n_bootstrap: int = 1000,
+                       confidence: float = 0.95,
+                       rng: np.random.Generator = None) -> tuple[float, float]:
+    """
+    Returns the confidence interval of the accuracy over the graphs with
+    n_instances and n_correct. The graphs are resampled instead of the
+    instances, as the answers of a graph aren't independent.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    n_graphs = len(n_instances)
+    samples_per_chunk = max(1, BOOTSTRAP_CHUNK_SIZE // n_graphs)
+    accuracies = list()
+    for chunk_start in range(0, n_bootstrap, samples_per_chunk):
+        chunk_s = min(samples_per_chunk, n_bootstrap - chunk_start)
+        sample_ids = rng.integers(0, n_graphs, size=(chunk_s, n_graphs))
+        accuracies.append(n_correct[sample_ids].sum(axis=1) /
+                          n_instances[sample_ids].sum(axis=1))
+
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(np.concatenate(accuracies), [alpha, 1 - alpha])
+    return float(low), float(high)
+
+
+def report(runs: pd.DataFrame,
+           n_bootstrap: int = 1000,
+           confidence: float = 0.95,
+           seed: int = 0) -> pd.DataFrame:
+    """
+    Returns the accuracy and its confidence interval of every model and
+    relations order, overall (group 'all'), per number of relation types
+    (group 'relations') and, if known, per number of nodes (group 'nodes').
+    """
+    rng = np.random.default_rng(seed)
+    run_columns = ['model', 'relations_order']
+    group_columns = ['relations', 'nodes'
+                    ] if 'nodes' in runs else ['relations']
+
+    rows = list()
+    for group_by in ['all'] + group_columns:
+        by = run_columns if group_by == 'all' else run_columns + [group_by]
+        for key, graphs in runs.groupby(by, sort=True):
+            n_instances = graphs['n_instances'].to_numpy()
+            n_correct = graphs['n_correct'].to_numpy()
+            ci_low, ci_high = bootstrap_accuracy(n_instances, n_correct,
+                                                 n_bootstrap, confidence, rng)
+            rows.append({
+                'model': key[0],
+                'relations_order': key[1],
+                'group_by': group_by,
+                'group': key[2] if group_by != 'all' else '',
+                'n_graphs': len(graphs),
+                'n_instances': int(n_instances.sum()),
+                'accuracy': n_correct.sum() / n_instances.sum(),
+                'ci_low': ci_low,
+                'ci_high': ci_high
+            })
+
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    args = config_argparser().parse_args()
+
+    runs = load_runs(args.results, args.stats, args.cache_dir)
+    accuracy_report = report(runs, args.n_bootstrap, args.confidence,
+                             args.seed)
+
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(accuracy_report[accuracy_report['group_by'] == 'all'].drop(
+            columns=['group_by', 'group']).to_string(index=False))
+
+    if args.save_to is not None:
+        accuracy_report.to_csv(args.save_to, index=False)
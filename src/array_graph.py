@@ -0,0 +1,454 @@
+import calendar
+import datetime
+import random
+
+import numpy as np
+
+from graph import DateInterval, Relation, StarGraph
+
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+class ArrayStarGraph():
+    """
+    A StarGraph stored as integer columns instead of Relation objects.
+
+    Every edge is a row: the relation type id, the entity id and the start and
+    end dates as day ordinals (see datetime.date.toordinal). Ids index the
+    relation_names and entity_names tables. Relation types are interned in
+    the order they are first seen, as the keys of StarGraph.relations_map,
+    and rows keep their insertion order, so both representations render the
+    same text.
+    """
+
+    def __init__(self,
+                 relation_names: list[str] = None,
+                 entity_names: list[str] = None,
+                 rel_ids: np.ndarray = None,
+                 entity_ids: np.ndarray = None,
+                 starts: np.ndarray = None,
+                 ends: np.ndarray = None):
+        self.relation_names: list[str] = list(
+            relation_names) if relation_names is not None else list()
+        self.entity_names: list[str] = list(
+            entity_names) if entity_names is not None else list()
+        self.rel_ids = self._as_column(rel_ids)
+        self.entity_ids = self._as_column(entity_ids)
+        self.starts = self._as_column(starts)
+        self.ends = self._as_column(ends)
+
+        n_rows = len(self.rel_ids)
+        assert len(self.entity_ids) == n_rows and len(self.starts) == n_rows \
+            and len(self.ends) == n_rows, "All columns must have the same length!"
+        assert np.all(self.starts <= self.ends), \
+            "Start dates must be before end dates!"
+
+    @staticmethod
+    def _as_column(values) -> np.ndarray:
+        if values is None:
+            return np.empty(0, dtype=np.int32)
+        return np.asarray(values, dtype=np.int32)
+
+    @classmethod
+    def from_star_graph(cls, graph: StarGraph) -> 'ArrayStarGraph':
+        """
+        Returns an ArrayStarGraph with the same edges as the graph
+        """
+        entity_to_id = dict()
+        rel_ids, entity_ids, starts, ends = list(), list(), list(), list()
+        for rel_id, relations in enumerate(graph.relations_map.values()):
+            for relation in relations:
+                rel_ids.append(rel_id)
+                entity_ids.append(
+                    entity_to_id.setdefault(relation.name, len(entity_to_id)))
+                starts.append(relation.date_interval.start.toordinal())
+                ends.append(relation.date_interval.end.toordinal())
+
+        return cls(list(graph.relations_map.keys()), list(entity_to_id),
+                   rel_ids, entity_ids, starts, ends)
+
+    @classmethod
+    def generate_star_graphs(cls,
+                             n_graphs: int,
+                             entities: list[str],
+                             relations: list[str],
+                             start_year: int = 2000,
+                             end_year: int = 2025,
+                             rng: np.random.Generator = None,
+                             n_tries: int = 5) -> list['ArrayStarGraph']:
+        """
+        Generates n_graphs random graphs at once. It follows the same
+        distribution as StarGraph.generate_star_graph(): the entities are
+        shuffled and each one gets a random relation type and up to n_tries
+        random DateIntervals in the years [start_year, end_year). The first
+        one that doesn't overlap with the relations of the same type is kept,
+        otherwise the entity is left out of the graph.
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+
+        n_entities = len(entities)
+        size = (n_graphs, n_entities)
+        entity_order = rng.permuted(np.tile(np.arange(n_entities),
+                                            (n_graphs, 1)),
+                                    axis=1)
+        rel_ids = rng.integers(0, len(relations), size=size)
+        starts, ends = _random_intervals(list(range(start_year, end_year)),
+                                         size + (n_tries, ), rng)
+
+        accepted = np.zeros(size, dtype=bool)
+        accepted_starts = np.zeros(size, dtype=np.int32)
+        accepted_ends = np.zeros(size, dtype=np.int32)
+        for entity_idx in range(n_entities):
+            pending = np.arange(n_graphs)
+            for try_idx in range(n_tries):
+                # Every graph is pending on the first try, so avoid copies
+                rows = slice(None) if try_idx == 0 else pending
+                same_type = accepted[rows, :entity_idx] & (
+                    rel_ids[rows, :entity_idx] == rel_ids[rows, entity_idx,
+                                                          None])
+                new_starts = starts[rows, entity_idx, try_idx]
+                new_ends = ends[rows, entity_idx, try_idx]
+                overlaps = _overlap(accepted_starts[rows, :entity_idx],
+                                    accepted_ends[rows, :entity_idx],
+                                    new_starts[:, None], new_ends[:, None])
+                valid = ~np.any(same_type & overlaps, axis=1)
+
+                valid_graphs = pending[valid]
+                accepted[valid_graphs, entity_idx] = True
+                accepted_starts[valid_graphs, entity_idx] = new_starts[valid]
+                accepted_ends[valid_graphs, entity_idx] = new_ends[valid]
+                pending = pending[~valid]
+                if len(pending) == 0:
+                    break
+
+        # Relation types are numbered in the order they first appear
+        first_seen = np.full((n_graphs, len(relations)), n_entities)
+        graph_ids, entity_idxs = np.nonzero(accepted)
+        np.minimum.at(first_seen, (graph_ids, rel_ids[graph_ids,
+                                                      entity_idxs]),
+                      entity_idxs)
+        types_order = np.argsort(first_seen, axis=1, kind='stable')
+        types_rank = np.argsort(types_order, axis=1, kind='stable')
+        rel_ids = np.take_along_axis(types_rank, rel_ids, axis=1)
+        n_types = np.count_nonzero(first_seen < n_entities, axis=1)
+
+        graphs = list()
+        for graph_id in range(n_graphs):
+            graph_accepted = accepted[graph_id]
+            graph_entities = entity_order[graph_id, graph_accepted]
+            graphs.append(
+                cls([
+                    relations[rel_id]
+                    for rel_id in types_order[graph_id, :n_types[graph_id]]
+                ], [entities[entity_id] for entity_id in graph_entities],
+                    rel_ids[graph_id, graph_accepted],
+                    np.arange(len(graph_entities)),
+                    accepted_starts[graph_id, graph_accepted],
+                    accepted_ends[graph_id, graph_accepted]))
+
+        return graphs
+
+    def to_star_graph(self) -> StarGraph:
+        """
+        Returns a StarGraph with the same edges as this graph
+        """
+        graph = StarGraph()
+        for row in range(len(self)):
+            graph.add_edge(self.relation_names[self.rel_ids[row]],
+                           self._relation_at(row))
+
+        return graph
+
+    @classmethod
+    def from_dict(cls,
+                  target_dict: dict[str, dict],
+                  strformat: str = None) -> 'ArrayStarGraph':
+        """
+        Returns an ArrayStarGraph from the target_dict. It follows the same
+        format as StarGraph.to_dict(). The relations are expected to not
+        overlap, as when the dict was created by StarGraph.to_dict().
+        """
+        entity_to_id = dict()
+        rel_ids, entity_ids, start_strs, end_strs = list(), list(), list(
+        ), list()
+        for rel_id, relations_dict in enumerate(target_dict.values()):
+            for relation_dict in relations_dict['relations']:
+                rel_ids.append(rel_id)
+                entity_ids.append(
+                    entity_to_id.setdefault(relation_dict['name'],
+                                            len(entity_to_id)))
+                start_strs.append(relation_dict['date_interval']['start_date'])
+                end_strs.append(relation_dict['date_interval']['end_date'])
+
+        return cls(list(target_dict.keys()), list(entity_to_id), rel_ids,
+                   entity_ids, _parse_dates(start_strs, strformat),
+                   _parse_dates(end_strs, strformat))
+
+    def to_dict(self, strformat: str = None) -> dict:
+        """
+        Returns a dict of this Graph following the same format as
+        StarGraph.to_dict()
+        """
+        # Group rows by relation type with the latest relation first
+        order = np.lexsort((-self.starts, self.rel_ids))
+        start_strs = _format_dates(self.starts[order], strformat)
+        end_strs = _format_dates(self.ends[order], strformat)
+        entity_ids = self.entity_ids[order].tolist()
+        counts = np.bincount(self.rel_ids,
+                             minlength=len(self.relation_names)).tolist()
+
+        self_dict = dict()
+        row = 0
+        for rel_name, count in zip(self.relation_names, counts):
+            if count == 0:
+                continue
+            self_dict[rel_name] = {
+                'rel_name':
+                rel_name,
+                'relations': [{
+                    'name': self.entity_names[entity_ids[idx]],
+                    'date_interval': {
+                        'start_date': start_strs[idx],
+                        'end_date': end_strs[idx]
+                    }
+                } for idx in range(row, row + count)]
+            }
+            row += count
+
+        return self_dict
+
+    def _relation_at(self, row: int) -> Relation:
+        start = datetime.datetime.fromordinal(int(self.starts[row]))
+        end = datetime.datetime.fromordinal(int(self.ends[row]))
+        return Relation(self.entity_names[self.entity_ids[row]],
+                        DateInterval(start, end))
+
+    def _name_ranks(self) -> np.ndarray:
+        """
+        Returns the position of every relation type id when sorting the
+        relation names, as StarGraph renders relation types by name
+        """
+        ranks = np.empty(len(self.relation_names), dtype=np.int32)
+        ranks[np.argsort(np.array(self.relation_names, dtype=object),
+                         kind='stable')] = np.arange(len(self.relation_names))
+        return ranks
+
+    def _latest_rows(self) -> np.ndarray:
+        """
+        Returns the row of the latest relation of every relation type,
+        ordered by relation type id
+        """
+        if len(self) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        order = np.lexsort((self.starts, self.rel_ids))
+        sorted_rel_ids = self.rel_ids[order]
+        is_last = np.append(sorted_rel_ids[1:] != sorted_rel_ids[:-1], True)
+        return order[is_last]
+
+    def _lines(self, rows: np.ndarray) -> list[str]:
+        rel_names = [self.relation_names[idx] for idx in self.rel_ids[rows]]
+        entities = [self.entity_names[idx] for idx in self.entity_ids[rows]]
+        starts = _iso_dates(self.starts[rows])
+        ends = _iso_dates(self.ends[rows])
+        return [
+            f"Relation {rel} with entity named {entity} in time interval {start} to {end}"
+            for rel, entity, start, end in zip(rel_names, entities, starts,
+                                               ends)
+        ]
+
+    def get_all_latest(self) -> dict[str, Relation]:
+        """
+        Return the latest relation for every relation type.
+
+        Return a dict with relation name as key and the Relation as value
+        """
+        return {
+            self.relation_names[self.rel_ids[row]]: self._relation_at(row)
+            for row in self._latest_rows().tolist()
+        }
+
+    def get_all_latest_str(self) -> str:
+        rows = self._latest_rows()
+        rows = rows[np.argsort(self._name_ranks()[self.rel_ids[rows]])]
+        return "\n".join(self._lines(rows))
+
+    def to_list(self) -> list[str]:
+        """
+        Returns a list of strings of Relations inside this graph
+        """
+        order = np.argsort(self._name_ranks()[self.rel_ids], kind='stable')
+        return self._lines(order)
+
+    def shuffled_list(self, seed: int = None) -> list[str]:
+        """
+        Returns a shuffled list of strings of Relations inside this graph.
+        It shuffles as StarGraph.shuffled_list() does for the same seed.
+        """
+        random.seed(seed)
+        graph_list = self.to_list()
+        random.shuffle(graph_list)
+        return graph_list
+
+    def get_shuffled_str(self, seed: int = None) -> str:
+        return "\n".join(self.shuffled_list(seed))
+
+    def get_interleaved_list(self, ascending: bool = True) -> list[str]:
+        """
+        Returns a list containing interleaved relations from every relation type.
+        See StarGraph.get_interleaved_list() for more.
+        """
+        name_ranks = self._name_ranks()[self.rel_ids]
+        starts = self.starts if ascending else -self.starts
+        order = np.lexsort((starts, name_ranks))
+
+        # Position of every relation inside its relation type
+        sorted_ranks = name_ranks[order]
+        group_starts = np.searchsorted(sorted_ranks, sorted_ranks)
+        positions = np.arange(len(order)) - group_starts
+
+        return self._lines(order[np.lexsort((sorted_ranks, positions))])
+
+    def get_interleaved_str(self, ascending: bool = True) -> str:
+        return "\n".join(self.get_interleaved_list(ascending))
+
+    def n_nodes_for_relation(self, rel_name: str) -> int:
+        """
+        Returns the number of relations with the
+        rel_name. If it doesn't exists in the graph,
+        returns 0.
+        """
+        if rel_name not in self.relation_names:
+            return 0
+
+        rel_id = self.relation_names.index(rel_name)
+        return int(np.count_nonzero(self.rel_ids == rel_id))
+
+    def n_relation_types(self) -> int:
+        """
+        Return the number of diferent relations types this graph has. This is
+        not the number of edges, but their labels
+        """
+        return len(np.unique(self.rel_ids))
+
+    def n_relations(self) -> int:
+        return len(self.rel_ids)
+
+    def mean_nodes_per_relation_type(self) -> float:
+        """
+        Return the number of nodes divided by the number of relations
+        """
+        return len(self) / self.n_relation_types()
+
+    def _edge_keys(self) -> np.ndarray:
+        """
+        Returns the sorted edges as (relation, entity, start, end) rows
+        using names, so graphs with different id tables can be compared
+        """
+        keys = np.empty(len(self),
+                        dtype=[('rel', object), ('entity', object),
+                               ('start', np.int32), ('end', np.int32)])
+        keys['rel'] = np.array(self.relation_names, dtype=object)[self.rel_ids]
+        keys['entity'] = np.array(self.entity_names,
+                                  dtype=object)[self.entity_ids]
+        keys['start'] = self.starts
+        keys['end'] = self.ends
+        return np.sort(keys, order=['rel', 'start', 'end', 'entity'])
+
+    def __len__(self):
+        return len(self.rel_ids)
+
+    def __str__(self):
+        return "\n".join(self.to_list())
+
+    def __eq__(self, other: 'ArrayStarGraph'):
+        if len(self) != len(other):
+            return False
+
+        return bool(np.all(self._edge_keys() == other._edge_keys()))
+
+
+def _overlap(starts: np.ndarray, ends: np.ndarray, other_starts: np.ndarray,
+             other_ends: np.ndarray) -> np.ndarray:
+    """
+    Element-wise DateInterval.overlap() over day ordinals
+    """
+    # Equal starts are covered by contains or contained, and the start and
+    # end overlaps by intersecting with a positive length
+    intersect = np.maximum(starts, other_starts) < np.minimum(ends, other_ends)
+    contains = (starts <= other_starts) & (ends >= other_ends)
+    contained = (starts >= other_starts) & (ends <= other_ends)
+    return intersect | contains | contained
+
+
+def _random_intervals(years: list[int], size: tuple,
+                      rng: np.random.Generator) -> tuple[np.ndarray]:
+    """
+    Returns the start and end day ordinals of random DateIntervals, with the
+    same distribution as DateInterval.get_random()
+    """
+    month_starts = np.empty((len(years), 12), dtype=np.int32)
+    final_days = np.empty((len(years), 12), dtype=np.int32)
+    for year_idx, year in enumerate(years):
+        for month in range(1, 13):
+            month_starts[year_idx, month - 1] = datetime.date(year, month,
+                                                              1).toordinal()
+            final_days[year_idx, month - 1] = calendar.monthrange(year,
+                                                                  month)[1]
+
+    dates = list()
+    for _ in range(2):
+        year_idxs = rng.integers(0, len(years), size=size)
+        months = rng.integers(0, 12, size=size)
+        # As in DateInterval, the last day of the month is never picked
+        days = rng.integers(1, final_days[year_idxs, months])
+        dates.append(month_starts[year_idxs, months] + days - 1)
+
+    return np.minimum(*dates), np.maximum(*dates)
+
+
+def _parse_dates(date_strs: list[str], strformat: str = None) -> np.ndarray:
+    """
+    Returns the day ordinals of the date strings
+    """
+    if strformat is None:
+        strformat = DateInterval.strformat
+
+    if strformat == "%d-%m-%Y":
+        iso_strs = [f"{date[6:]}-{date[3:5]}-{date[:2]}" for date in date_strs]
+        days = np.array(iso_strs, dtype='datetime64[D]').astype(np.int64)
+        return (days + _EPOCH_ORDINAL).astype(np.int32)
+
+    return np.array([
+        datetime.datetime.strptime(date, strformat).toordinal()
+        for date in date_strs
+    ],
+                    dtype=np.int32)
+
+
+def _iso_dates(ordinals: np.ndarray) -> list[str]:
+    """
+    Returns the day ordinals as year-month-day strings
+    """
+    days = ordinals.astype(np.int64) - _EPOCH_ORDINAL
+    return days.astype('datetime64[D]').astype(str).tolist()
+
+
+def _format_dates(ordinals: np.ndarray, strformat: str = None) -> list[str]:
+    """
+    Returns the day ordinals as strings following strformat
+    """
+    if strformat is None:
+        strformat = DateInterval.strformat
+
+    if strformat == "%d-%m-%Y":
+        return [
+            f"{date[8:]}-{date[5:7]}-{date[:4]}"
+            for date in _iso_dates(ordinals)
+        ]
+
+    return [
+        datetime.date.fromordinal(ordinal).strftime(strformat)
+        for ordinal in ordinals.tolist()
+    ]
@@ -0,0 +1,295 @@
+"""
+Micro-benchmarks of the core operations of graph.py across graph sizes.
+For every operation and size, it reports the calls per second and the peak
+memory allocated by a call. Run it from src:
+
+    python -m benchmarks.bench_graph --results_path bench_graph.json
+
+The results are compared against a baseline. Operations that got slower
+than the tolerance are reported as regressions and the run fails.
+"""
+import argparse
+from collections.abc import Callable
+import datetime
+import json
+import pathlib
+import random
+import sys
+from timeit import default_timer as timer
+import tracemalloc
+
+from graph import DateInterval, Relation, Relations, StarGraph
+
+BASELINE_PATH = pathlib.Path(
+    __file__).resolve().parent / "baselines" / "bench_graph.json"
+
+DEFAULT_N_EDGES = [10, 100, 1000, 10000, 100000]
+DEFAULT_N_RELATION_TYPES = [1, 10, 100, 1000]
+
+# Operations that get slower than this fraction of their baseline speed
+# are regressions
+DEFAULT_TOLERANCE = 0.3
+
+_FIRST_DATE = datetime.datetime(2000, 1, 1)
+
+
+def config_argparser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the core operations of graph.py")
+
+    parser.add_argument("--n_edges",
+                        type=int,
+                        nargs="+",
+                        default=DEFAULT_N_EDGES,
+                        help="The number of edges of the graphs")
+
+    parser.add_argument("--n_relation_types",
+                        type=int,
+                        nargs="+",
+                        default=DEFAULT_N_RELATION_TYPES,
+                        help="The number of relation types of the graphs")
+
+    parser.add_argument(
+        "--min_seconds",
+        type=float,
+        default=0.2,
+        help="Min seconds of every timing. Fast operations are called many"\
+            " times. Default: 0.2")
+
+    parser.add_argument("--repeats",
+                        type=int,
+                        default=3,
+                        help="Timings of every operation. The best is kept."\
+                            " Default: 3")
+
+    parser.add_argument("--results_path",
+                        type=str,
+                        default=None,
+                        help="Where to save the results as JSON")
+
+    parser.add_argument("--baseline_path",
+                        type=str,
+                        default=str(BASELINE_PATH),
+                        help="The baseline results to compare against")
+
+    parser.add_argument("--tolerance",
+                        type=float,
+                        default=DEFAULT_TOLERANCE,
+                        help="Max fraction an operation can get slower than"\
+                            f" its baseline. Default: {DEFAULT_TOLERANCE}")
+
+    parser.add_argument("--save_baseline",
+                        action="store_true",
+                        default=False,
+                        help="If the results should replace the baseline")
+
+    return parser
+
+
+def build_edges(n_edges: int, n_relation_types: int,
+                seed: int = 0) -> list[tuple[str, Relation]]:
+    """
+    Returns n_edges (relation name, relation) in random order, split
+    between n_relation_types. The relations of every type don't overlap.
+    """
+    edges = list()
+    for edge_id in range(n_edges):
+        rel_id = edge_id % n_relation_types
+        # Every relation type has its own sequence of disjoint intervals
+        start = _FIRST_DATE + datetime.timedelta(days=2 *
+                                                 (edge_id // n_relation_types))
+        edges.append((f"r{rel_id}",
+                      Relation(f"e{edge_id}",
+                               DateInterval(start, start +
+                                            datetime.timedelta(days=1)))))
+
+    random.Random(seed).shuffle(edges)
+    return edges
+
+
+def build_graph(edges: list[tuple[str, Relation]]) -> StarGraph:
+    graph = StarGraph()
+    for rel_name, relation in edges:
+        graph.add_edge(rel_name, relation)
+    return graph
+
+
+def add_relations(edges: list[tuple[str, Relation]]) -> dict[str, Relations]:
+    relations_map = dict()
+    for rel_name, relation in edges:
+        relations_map.setdefault(rel_name, Relations(rel_name)).add(relation)
+    return relations_map
+
+
+def get_operations(
+        n_edges: int, n_relation_types: int) -> dict[str, Callable[[], object]]:
+    """
+    Returns the operations to benchmark on a graph of the given size
+    """
+    edges = build_edges(n_edges, n_relation_types)
+    graph = build_graph(edges)
+    same_graph = build_graph(edges)
+    graph_dict = graph.to_dict()
+
+    return {
+        'Relations.add': lambda: add_relations(edges),
+        'StarGraph.from_dict': lambda: StarGraph.from_dict(graph_dict),
+        'StarGraph.to_dict': graph.to_dict,
+        'StarGraph.get_interleaved_list': graph.get_interleaved_list,
+        'StarGraph.get_all_latest': graph.get_all_latest,
+        'StarGraph.__len__': lambda: len(graph),
+        'StarGraph.__eq__': lambda: graph == same_graph
+    }
+
+
+def get_overlap_operation() -> Callable[[], object]:
+    interval = DateInterval(datetime.datetime(2000, 1, 1),
+                            datetime.datetime(2001, 1, 1))
+    other = DateInterval(datetime.datetime(2000, 6, 1),
+                         datetime.datetime(2002, 1, 1))
+    return lambda: interval.overlap(other)
+
+
+def time_operation(operation: Callable[[], object],
+                   min_seconds: float = 0.2,
+                   repeats: int = 3) -> float:
+    """
+    Returns the best seconds per call of the operation. It is called enough
+    times for every timing to take at least min_seconds.
+    """
+    n_calls = 1
+    while True:
+        start = timer()
+        for _ in range(n_calls):
+            operation()
+        elapsed = timer() - start
+        if elapsed >= min_seconds:
+            break
+        n_calls *= 2 if elapsed == 0 else max(
+            2, int(min_seconds / elapsed * 1.2))
+
+    best = elapsed / n_calls
+    for _ in range(repeats - 1):
+        start = timer()
+        for _ in range(n_calls):
+            operation()
+        best = min(best, (timer() - start) / n_calls)
+    return best
+
+
+def measure_peak_memory(operation: Callable[[], object]) -> int:
+    """
+    Returns the peak bytes allocated by a call of the operation
+    """
+    tracemalloc.start()
+    try:
+        operation()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def _result(operation_name: str, n_edges: int, n_relation_types: int,
+            operation: Callable[[], object], min_seconds: float,
+            repeats: int) -> dict:
+    seconds = time_operation(operation, min_seconds, repeats)
+    return {
+        'operation': operation_name,
+        'n_edges': n_edges,
+        'n_relation_types': n_relation_types,
+        'seconds_per_call': seconds,
+        'ops_per_s': 1 / seconds,
+        'peak_memory_bytes': measure_peak_memory(operation)
+    }
+
+
+def run(n_edges_list: list[int],
+        n_relation_types_list: list[int],
+        min_seconds: float = 0.2,
+        repeats: int = 3) -> list[dict]:
+    """
+    Returns the result of every operation for every graph size. Graphs
+    with more relation types than edges are skipped.
+    """
+    results = [
+        _result('DateInterval.overlap', 1, 1, get_overlap_operation(),
+                min_seconds, repeats)
+    ]
+    for n_edges in n_edges_list:
+        for n_relation_types in n_relation_types_list:
+            if n_relation_types > n_edges:
+                continue
+
+            operations = get_operations(n_edges, n_relation_types)
+            for operation_name, operation in operations.items():
+                results.append(
+                    _result(operation_name, n_edges, n_relation_types,
+                            operation, min_seconds, repeats))
+    return results
+
+
+def _result_key(result: dict) -> tuple[str, int, int]:
+    return (result['operation'], result['n_edges'],
+            result['n_relation_types'])
+
+
+def find_regressions(results: list[dict], baseline: list[dict],
+                     tolerance: float) -> list[dict]:
+    """
+    Returns the results of the operations that are slower than their
+    baseline by more than the tolerance, with their speed ratio
+    """
+    baseline_by_key = {_result_key(result): result for result in baseline}
+    regressions = list()
+    for result in results:
+        baseline_result = baseline_by_key.get(_result_key(result))
+        if baseline_result is None:
+            continue
+
+        ratio = result['ops_per_s'] / baseline_result['ops_per_s']
+        if ratio < 1 - tolerance:
+            regressions.append(dict(result, baseline_ratio=ratio))
+    return regressions
+
+
+def save_results(results: list[dict], path: str):
+    path = pathlib.Path(path)
+    path.parent.mkdir(exist_ok=True, parents=True)
+    with open(path, 'w') as results_file:
+        json.dump(results, results_file, indent=2)
+
+
+if __name__ == "__main__":
+    args = config_argparser().parse_args()
+
+    results = run(args.n_edges, args.n_relation_types, args.min_seconds,
+                  args.repeats)
+    for result in results:
+        print(f"{result['operation']:<32} edges={result['n_edges']:<7} "\
+              f"types={result['n_relation_types']:<5} "\
+              f"{result['ops_per_s']:>14.1f} ops/s "\
+              f"{result['peak_memory_bytes'] / 1024:>12.1f} KiB")
+
+    if args.results_path is not None:
+        save_results(results, args.results_path)
+
+    if args.save_baseline:
+        save_results(results, args.baseline_path)
+        sys.exit()
+
+    baseline_path = pathlib.Path(args.baseline_path)
+    if not baseline_path.exists():
+        sys.exit(f"There is no baseline at {baseline_path}!")
+
+    with open(baseline_path, 'r') as baseline_file:
+        baseline = json.load(baseline_file)
+    regressions = find_regressions(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"Regression: {regression['operation']} with "\
+              f"{regression['n_edges']} edges and "\
+              f"{regression['n_relation_types']} types runs at "\
+              f"{regression['baseline_ratio']:.0%} of its baseline speed")
+
+    if len(regressions) > 0:
+        sys.exit(1)
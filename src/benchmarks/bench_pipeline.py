@@ -0,0 +1,235 @@
+"""
+Measures the overhead of eval_model.run without a model. It generates
+synthetic datasets of increasing size and evaluates them with the
+evaluators.OracleLLM, reporting the instances per second and the seconds
+of every stage. Whatever isn't a stage, such as reading and parsing the
+dataset in get_eval_pair, is reported as other. Run it from src:
+
+    python -m benchmarks.bench_pipeline --n_graphs 100 1000
+"""
+import argparse
+import functools
+import json
+import pathlib
+import tempfile
+from timeit import default_timer as timer
+
+import context_store
+from dataset import DatasetWriter
+import eval_model
+from evaluators import OracleLLM
+from generate_dataset import generate
+from metrics import METRICS
+import rendering
+import utils
+
+STAGES = ['prompt_building', 'model_call', 'post_processing', 'result_writing']
+
+
+def config_argparser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Measures the overhead of the evaluation pipeline")
+
+    parser.add_argument("--n_graphs",
+                        type=int,
+                        nargs="+",
+                        default=[100, 1000, 10000],
+                        help="The number of graphs of every dataset")
+
+    parser.add_argument("--entities",
+                        type=int,
+                        default=40,
+                        help="Number of entities of every graph. Default: 40")
+
+    parser.add_argument("--relations",
+                        type=int,
+                        default=20,
+                        help="Number of relation types. Default: 20")
+
+    parser.add_argument("--seed",
+                        type=int,
+                        default=0,
+                        help="The seed of the datasets. Default: 0")
+
+    parser.add_argument("--batch_s",
+                        type=int,
+                        default=8,
+                        help="The number of instances given to the model at"\
+                            " once. Default: 8")
+
+    parser.add_argument("--relations_order",
+                        type=str,
+                        default='as_is',
+                        choices=list(rendering.ORDERINGS),
+                        help="The order of the relations. Default: as_is")
+
+    parser.add_argument("--packed",
+                        action="store_true",
+                        default=False,
+                        help="If the questions of a graph are packed")
+
+    parser.add_argument("--workers",
+                        type=int,
+                        default=1,
+                        help="Number of processes answering. Default: 1")
+
+    parser.add_argument("--error_rate",
+                        type=float,
+                        default=0.0,
+                        help="Fraction of wrong answers of the oracle."\
+                            " Default: 0")
+
+    parser.add_argument("--latency_s",
+                        type=float,
+                        default=0.0,
+                        help="Seconds the oracle waits per call. Default: 0")
+
+    parser.add_argument("--instance_latency_s",
+                        type=float,
+                        default=0.0,
+                        help="Seconds the oracle waits per instance."\
+                            " Default: 0")
+
+    parser.add_argument("--prepare_contexts",
+                        action="store_true",
+                        default=False,
+                        help="If the contexts should be rendered into a"\
+                            " context store before evaluating. Its time"\
+                            " isn't measured")
+
+    parser.add_argument("--results_path",
+                        type=str,
+                        default=None,
+                        help="Where to save the results as JSON")
+
+    return parser
+
+
+def write_dataset(data_path: pathlib.Path, n_graphs: int, n_entities: int,
+                  n_relations: int, seed: int):
+    entities = [f'e{i}' for i in range(1, n_entities)]
+    relations = [f'r{i}' for i in range(n_relations)]
+    with DatasetWriter(data_path) as writer:
+        writer.write_all(
+            generate(n_graphs, entities, relations, 2000, 2025, seed))
+
+
+def accuracy(results_path: pathlib.Path) -> float:
+    results = eval_model.read_results(results_path)
+    if len(results) == 0:
+        return 0.0
+    return sum(expected == predicted
+               for expected, predicted in results.values()) / len(results)
+
+
+def run_pipeline(data_path: pathlib.Path, work_path: pathlib.Path,
+                 oracle_kwargs: dict, **run_kwargs) -> dict:
+    """
+    Evaluates the dataset with an OracleLLM. Returns the instances, their
+    accuracy, the seconds of the run and of every stage.
+    """
+    results_path = work_path / "results.csv"
+    llm_factory = functools.partial(OracleLLM, **oracle_kwargs)
+
+    start = timer()
+    eval_model.run(data_path,
+                   llm_factory(),
+                   results_path,
+                   no_progress_bar=True,
+                   apply_regex=True,
+                   llm_factory=llm_factory,
+                   metrics_path=work_path / "metrics.json",
+                   **run_kwargs)
+    seconds = timer() - start
+
+    summary = METRICS.summary(with_percentiles=False)
+    stages = {
+        stage: summary['histograms'].get(stage, {'total': 0.0})['total']
+        for stage in STAGES
+    }
+    n_instances = summary['counters'].get('instances', 0)
+    result = {
+        'n_instances': n_instances,
+        'accuracy': accuracy(results_path),
+        'seconds': seconds,
+        'instances_per_s': n_instances / seconds,
+        'stages_s': stages,
+        # With workers, the stages run in parallel to the main process
+        'other_s': max(0.0, seconds - sum(stages.values())),
+    }
+    result['overhead_per_instance_s'] = (
+        seconds - stages['model_call']) / max(n_instances, 1)
+    return result
+
+
+def run(n_graphs_list: list[int],
+        n_entities: int = 40,
+        n_relations: int = 20,
+        seed: int = 0,
+        oracle_kwargs: dict = None,
+        prepare_contexts: bool = False,
+        **run_kwargs) -> list[dict]:
+    """
+    Returns the result of evaluating a synthetic dataset of every size.
+    If prepare_contexts, the contexts are rendered into a context store
+    before. See run_pipeline.
+    """
+    oracle_kwargs = oracle_kwargs if oracle_kwargs is not None else dict()
+    print_enabled = utils.PRINT_ENABLED
+    utils.PRINT_ENABLED = False
+    results = list()
+    try:
+        for n_graphs in n_graphs_list:
+            with tempfile.TemporaryDirectory() as work_dir:
+                work_path = pathlib.Path(work_dir)
+                data_path = work_path / "dataset.jsonl"
+                write_dataset(data_path, n_graphs, n_entities, n_relations,
+                              seed)
+                if prepare_contexts:
+                    context_store.prepare(
+                        data_path,
+                        [run_kwargs.get('relations_order', 'as_is')]).close()
+                result = {'n_graphs': n_graphs}
+                result.update(
+                    run_pipeline(data_path, work_path, oracle_kwargs,
+                                 **run_kwargs))
+                results.append(result)
+    finally:
+        utils.PRINT_ENABLED = print_enabled
+    return results
+
+
+if __name__ == "__main__":
+    args = config_argparser().parse_args()
+
+    oracle_kwargs = {
+        'error_rate': args.error_rate,
+        'latency_s': args.latency_s,
+        'instance_latency_s': args.instance_latency_s
+    }
+    results = run(args.n_graphs,
+                  args.entities,
+                  args.relations,
+                  args.seed,
+                  oracle_kwargs,
+                  args.prepare_contexts,
+                  relations_order=args.relations_order,
+                  batch_s=args.batch_s,
+                  packed=args.packed,
+                  workers=args.workers)
+
+    print(f"{'graphs':>8} {'instances':>10} {'inst/s':>10} {'accuracy':>9}"\
+          f" {'overhead/inst':>14} " +
+          " ".join(f"{stage:>16}" for stage in STAGES + ['other']))
+    for result in results:
+        stages_s = list(result['stages_s'].values()) + [result['other_s']]
+        print(f"{result['n_graphs']:>8} {result['n_instances']:>10}"\
+              f" {result['instances_per_s']:>10.1f} {result['accuracy']:>9.2%}"\
+              f" {result['overhead_per_instance_s'] * 1e6:>12.1f}us " +
+              " ".join(f"{seconds:>15.3f}s" for seconds in stages_s))
+
+    if args.results_path is not None:
+        results_path = pathlib.Path(args.results_path)
+        results_path.parent.mkdir(exist_ok=True, parents=True)
+        with open(results_path, 'w') as results_file:
+            json.dump(results, results_file, indent=2)
@@ -0,0 +1,104 @@
+"""
+Measures how long it takes to import the CLI modules in a fresh interpreter
+and which slow dependencies they import. Run it from src:
+
+    python -m benchmarks.import_time
+"""
+import argparse
+import json
+import pathlib
+import subprocess
+import sys
+
+SRC_PATH = pathlib.Path(__file__).resolve().parent.parent
+
+DEFAULT_MODULES = [
+    'graph', 'dataset', 'generate_dataset', 'dataset_stats', 'evaluators',
+    'eval_model'
+]
+
+# Dependencies that take seconds to import
+SLOW_DEPENDENCIES = ['torch', 'transformers', 'openai', 'pandas']
+
+_IMPORT_SCRIPT = """
+import json
+import sys
+import time
+
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    'seconds': elapsed,
+    'slow_dependencies': [name for name in {slow_dependencies!r} if name in sys.modules]
+}}))
+"""
+
+
+def config_argparser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Measures the import time of the CLI modules")
+
+    parser.add_argument("--modules",
+                        type=str,
+                        nargs="+",
+                        default=DEFAULT_MODULES,
+                        help="The modules to import")
+
+    parser.add_argument("--repeats",
+                        type=int,
+                        default=5,
+                        help="Times every module is imported. Default: 5")
+
+    parser.add_argument(
+        "--max_seconds",
+        type=float,
+        default=None,
+        help="If given, it fails if a module takes longer to import")
+
+    return parser
+
+
+def measure_import(module: str) -> dict:
+    """
+    Imports the module in a new interpreter. Returns the seconds it took
+    and the slow dependencies it imported.
+    """
+    script = _IMPORT_SCRIPT.format(module=module,
+                                   slow_dependencies=SLOW_DEPENDENCIES)
+    output = subprocess.run([sys.executable, "-c", script],
+                            cwd=SRC_PATH,
+                            capture_output=True,
+                            text=True,
+                            check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(modules: list[str], repeats: int = 5) -> dict[str, dict]:
+    """
+    Returns the best import time of every module over the repeats and the
+    slow dependencies it imported.
+    """
+    results = dict()
+    for module in modules:
+        measures = [measure_import(module) for _ in range(repeats)]
+        results[module] = {
+            'seconds': min(measure['seconds'] for measure in measures),
+            'slow_dependencies': measures[0]['slow_dependencies']
+        }
+    return results
+
+
+if __name__ == "__main__":
+    args = config_argparser().parse_args()
+
+    results = run(args.modules, args.repeats)
+    too_slow = list()
+    for module, result in results.items():
+        slow_dependencies = ", ".join(result['slow_dependencies']) or "-"
+        print(f"{module:<20} {result['seconds']:8.3f}s   slow deps: {slow_dependencies}")
+        if args.max_seconds is not None and result['seconds'] > args.max_seconds:
+            too_slow.append(module)
+
+    if len(too_slow) > 0:
+        sys.exit(f"Too slow to import: {', '.join(too_slow)}")
@@ -0,0 +1,247 @@
+import argparse
+from collections import namedtuple
+from collections.abc import Generator, Iterable
+import json
+import pathlib
+import random
+import sqlite3
+
+from dataset import hash_dataset, iter_graphs_dicts
+from graph import StarGraph
+import rendering
+
+# The rendered context of a graph in a relations order, the (rel_name,
+# entity name) of the latest relation of every type, which are the
+# instances to evaluate, and the sorted names of its entities
+GraphContext = namedtuple('GraphContext',
+                          ['graph_id', 'targets', 'context', 'entities'])
+
+# Number of graphs inserted in a single transaction
+_INSERT_CHUNK_SIZE = 1000
+
+
+def render_graph_contexts(
+        graph_id: int,
+        graph_dict: dict,
+        relations_orders: list[str],
+        rng: random.Random = None) -> dict[str, GraphContext]:
+    """
+    Builds the graph of the graph dict and returns its context in every
+    relations order. See rendering.ORDERINGS.
+    """
+    graph = StarGraph.from_dict(graph_dict)
+    targets = [(rel_name, relation.name)
+               for rel_name, relation in graph.get_all_latest().items()]
+    entities = graph.entity_names()
+    return {
+        relations_order:
+        GraphContext(graph_id, targets,
+                     rendering.render(graph, relations_order, rng=rng),
+                     entities)
+        for relations_order in relations_orders
+    }
+
+
+def context_store_path(data_path: str) -> pathlib.Path:
+    data_path = pathlib.Path(data_path)
+    return data_path.with_name(data_path.name + ".contexts.sqlite")
+
+
+class ContextStore():
+    """
+    The contexts of every graph of a dataset, already rendered in some
+    relations orders, and their targets, stored in a SQLite database next to
+    the dataset. Evaluating from it doesn't build nor render the graphs. It
+    is keyed by the sha256 of the dataset content, so it isn't used once the
+    dataset changes. See prepare.
+    """
+
+    def __init__(self, path: str):
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        self._connection = sqlite3.connect(self.path)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS metadata ("
+                "key TEXT PRIMARY KEY, "
+                "value TEXT NOT NULL)")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS graphs ("
+                "graph_id INTEGER PRIMARY KEY, "
+                "targets TEXT NOT NULL, "
+                "entities TEXT NOT NULL)")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS contexts ("
+                "relations_order TEXT NOT NULL, "
+                "graph_id INTEGER NOT NULL, "
+                "context TEXT NOT NULL, "
+                "PRIMARY KEY (relations_order, graph_id)) WITHOUT ROWID")
+
+    def _get_metadata(self, key: str):
+        row = self._connection.execute(
+            "SELECT value FROM metadata WHERE key = ?", (key, )).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def _set_metadata(self, key: str, value):
+        self._connection.execute(
+            "INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)",
+            (key, json.dumps(value)))
+
+    @property
+    def dataset_hash(self) -> str | None:
+        return self._get_metadata('dataset_hash')
+
+    def relations_orders(self) -> list[str]:
+        """
+        The relations orders whose contexts are stored
+        """
+        relations_orders = self._get_metadata('relations_orders')
+        return relations_orders if relations_orders is not None else list()
+
+    def write(self, graphs_contexts: Iterable[dict[str, GraphContext]],
+              dataset_hash: str):
+        """
+        Replaces the stored contexts by the graphs contexts, a dict with the
+        context of the graph in every relations order, for every graph
+        """
+        with self._connection:
+            self._connection.execute("DELETE FROM metadata")
+            self._connection.execute("DELETE FROM graphs")
+            self._connection.execute("DELETE FROM contexts")
+
+        relations_orders = None
+        chunk = list()
+        for graph_contexts in graphs_contexts:
+            relations_orders = list(graph_contexts)
+            chunk.append(graph_contexts)
+            if len(chunk) == _INSERT_CHUNK_SIZE:
+                self._insert(chunk)
+                chunk = list()
+        self._insert(chunk)
+
+        # The metadata is written last, so a halted write is never used
+        with self._connection:
+            self._set_metadata(
+                'relations_orders',
+                relations_orders if relations_orders is not None else list())
+            self._set_metadata('dataset_hash', dataset_hash)
+
+    def _insert(self, chunk: list[dict[str, GraphContext]]):
+        graphs_rows = list()
+        for graph_contexts in chunk:
+            # The targets and entities are the same in every order
+            graph_context = next(iter(graph_contexts.values()))
+            graphs_rows.append(
+                (graph_context.graph_id, json.dumps(graph_context.targets),
+                 json.dumps(graph_context.entities)))
+
+        with self._connection:
+            self._connection.executemany(
+                "INSERT INTO graphs (graph_id, targets, entities) "
+                "VALUES (?, ?, ?)", graphs_rows)
+            self._connection.executemany(
+                "INSERT INTO contexts (relations_order, graph_id, context) "
+                "VALUES (?, ?, ?)",
+                [(relations_order, graph_context.graph_id,
+                  graph_context.context) for graph_contexts in chunk
+                 for relations_order, graph_context in graph_contexts.items()])
+
+    def iter_graphs_contexts(
+            self,
+            relations_order: str,
+            first_graph_id: int = 0) -> Generator[GraphContext]:
+        """
+        Generator that returns the context of every graph in the relations
+        order, from the graph with first_graph_id on
+        """
+        assert relations_order in self.relations_orders(), \
+            f"{self.path} has no contexts in the {relations_order} order!"
+
+        rows = self._connection.execute(
+            "SELECT graphs.graph_id, targets, context, entities "
+            "FROM contexts JOIN graphs USING (graph_id) "
+            "WHERE relations_order = ? AND graphs.graph_id >= ? "
+            "ORDER BY graphs.graph_id", (relations_order, first_graph_id))
+        for graph_id, targets, context, entities in rows:
+            targets = [tuple(target) for target in json.loads(targets)]
+            yield GraphContext(graph_id, targets, context,
+                               json.loads(entities))
+
+    def close(self):
+        self._connection.close()
+
+
+def load_context_store(data_path: str,
+                       dataset_hash: str = None) -> ContextStore | None:
+    """
+    Returns the context store of the dataset. Returns None if there is none
+    or if it is stale, i.e., its hash isn't the dataset_hash. If
+    dataset_hash isn't provided, it is computed from the dataset.
+    """
+    path = context_store_path(data_path)
+    if not path.exists():
+        return None
+
+    if dataset_hash is None:
+        dataset_hash = hash_dataset(data_path)
+    context_store = ContextStore(path)
+    if context_store.dataset_hash != dataset_hash:
+        context_store.close()
+        return None
+
+    return context_store
+
+
+def prepare(data_path: str,
+            relations_orders: list[str] = None,
+            seed: int = 0) -> ContextStore:
+    """
+    Renders every graph of the dataset in the relations orders, by default
+    all the registered ones, and saves them in the context store next to it.
+    The random orders use a generator per graph derived from the seed, so
+    they are the same in every run using the store.
+    """
+    if relations_orders is None:
+        relations_orders = list(rendering.ORDERINGS)
+
+    def get_graphs_contexts() -> Generator[dict[str, GraphContext]]:
+        for graph_id, graph_dict in enumerate(iter_graphs_dicts(data_path)):
+            yield render_graph_contexts(graph_id, graph_dict,
+                                        relations_orders,
+                                        random.Random(f"{seed}-{graph_id}"))
+
+    context_store = ContextStore(context_store_path(data_path))
+    context_store.write(get_graphs_contexts(), hash_dataset(data_path))
+    return context_store
+
+
+def config_argparser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Renders the contexts of a dataset for every relations"\
+            " order and stores them next to it, so evaluating it doesn't"\
+            " build the graphs")
+
+    parser.add_argument("--data",
+                        type=str,
+                        required=True,
+                        help="The dataset path")
+
+    parser.add_argument("--relations_orders",
+                        type=str,
+                        nargs="+",
+                        default=None,
+                        choices=list(rendering.ORDERINGS),
+                        help="The relations orders to render. Default: all")
+
+    parser.add_argument("--seed",
+                        type=int,
+                        default=0,
+                        help="The seed of the random orders. Default: 0")
+
+    return parser
+
+
+if __name__ == "__main__":
+    args = config_argparser().parse_args()
+
+    prepare(args.data, args.relations_orders, args.seed).close()
@@ -0,0 +1,360 @@
+import argparse
+import bisect
+from collections.abc import Generator, Iterable
+import hashlib
+import itertools
+import json
+import pathlib
+
+# Number of characters read at a time from legacy datasets
+LEGACY_CHUNK_SIZE = 1 << 16
+
+# Number of bytes read at a time when hashing a dataset
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def is_legacy_dataset(data_path: str) -> bool:
+    """
+    Returns if the dataset is stored in the legacy format: a single JSON list
+    with every graph dict. Otherwise, it is stored as JSON lines, one graph
+    dict per line.
+    """
+    with open(data_path, 'r') as data_file:
+        while True:
+            chunk = data_file.read(LEGACY_CHUNK_SIZE)
+            if chunk == "":
+                return False
+            chunk = chunk.lstrip()
+            if chunk != "":
+                return chunk.startswith("[")
+
+
+def iter_graphs_dicts(data_path: str,
+                      start_offset: int = 0) -> Generator[dict]:
+    """
+    Generator that returns the graphs dicts of the dataset one at a time,
+    so the whole dataset is never in memory.
+    start_offset: The byte offset of the first graph to return. See
+    DatasetManifest. Only JSON lines datasets can start after the first graph.
+    See StarGraph.to_dict() for the graph dict format.
+    """
+    dataset_path = pathlib.Path(data_path)
+    if is_legacy_dataset(dataset_path):
+        assert start_offset == 0, "Legacy datasets can only be read from the start!"
+        with open(dataset_path, 'r') as data_file:
+            yield from _iter_legacy_graphs_dicts(data_file)
+        return
+
+    with open(dataset_path, 'rb') as data_file:
+        data_file.seek(start_offset)
+        for line in data_file:
+            line = line.strip()
+            if line != b"":
+                yield json.loads(line)
+
+
+def _iter_legacy_graphs_dicts(data_file) -> Generator[dict]:
+    """
+    Decode the elements of a JSON list one at a time, reading the file in
+    chunks.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = False
+    reached_eof = False
+    while True:
+        buffer = buffer.lstrip(" \t\r\n,")
+        if started and buffer.startswith("]"):
+            return
+
+        try:
+            if not started:
+                if not buffer.startswith("["):
+                    raise json.JSONDecodeError("Expecting '['", buffer, 0)
+                started = True
+                buffer = buffer[1:]
+                continue
+
+            graph_dict, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if reached_eof:
+                raise
+            chunk = data_file.read(LEGACY_CHUNK_SIZE)
+            reached_eof = chunk == ""
+            buffer += chunk
+            continue
+
+        yield graph_dict
+        buffer = buffer[end:]
+
+
+class DatasetManifest():
+    """
+    Index of a JSON lines dataset. For every graph, it has the byte offset
+    of its line, its number of relation types (that is, of instances to
+    evaluate) and its number of edges. It is keyed by the sha256 of the
+    dataset content, so it isn't used once the dataset changes. It also
+    has the size and modification time of the dataset when it was saved,
+    so the dataset is only hashed to check it once they change.
+    """
+
+    def __init__(self,
+                 dataset_hash: str = None,
+                 offsets: list[int] = None,
+                 n_relation_types: list[int] = None,
+                 n_edges: list[int] = None,
+                 dataset_size: int = None,
+                 dataset_mtime_ns: int = None):
+        self.dataset_hash = dataset_hash
+        self.dataset_size = dataset_size
+        self.dataset_mtime_ns = dataset_mtime_ns
+        self.offsets: list[int] = offsets if offsets is not None else list()
+        self.n_relation_types: list[int] = list()
+        if n_relation_types is not None:
+            self.n_relation_types = n_relation_types
+        self.n_edges: list[int] = n_edges if n_edges is not None else list()
+        # Number of instances up to (and including) every graph
+        self._instances_ends: list[int] = list(
+            itertools.accumulate(self.n_relation_types))
+
+    def add(self, offset: int, graph_dict: dict):
+        """
+        Adds the graph dict written at the offset to the index
+        """
+        n_relation_types = len(graph_dict)
+        self.offsets.append(offset)
+        self.n_relation_types.append(n_relation_types)
+        self.n_edges.append(
+            sum(len(relations_dict['relations'])
+                for relations_dict in graph_dict.values()))
+        self._instances_ends.append(self.n_instances() + n_relation_types)
+
+    def n_graphs(self) -> int:
+        return len(self.offsets)
+
+    def n_instances(self) -> int:
+        if len(self._instances_ends) == 0:
+            return 0
+        return self._instances_ends[-1]
+
+    def total_instances(self, n_graphs: int = -1, n_instances: int = -1) -> int:
+        """
+        Calculate the total number of instances of the first n_graphs graphs,
+        limited to n_instances. Negative values mean no limit.
+        """
+        total = self.n_instances()
+        if 0 <= n_graphs < self.n_graphs():
+            total = self._instances_ends[n_graphs - 1] if n_graphs > 0 else 0
+        if n_instances >= 0:
+            total = min(total, n_instances)
+        return total
+
+    def locate_instance(self, instance_id: int) -> tuple[int, int]:
+        """
+        Returns the id of the graph with the instance_id-th instance and how
+        many instances of that graph come before it.
+        """
+        graph_id = bisect.bisect_right(self._instances_ends, instance_id)
+        graph_start = self._instances_ends[graph_id - 1] if graph_id > 0 else 0
+        return graph_id, instance_id - graph_start
+
+    def to_dict(self) -> dict:
+        return {
+            'dataset_hash': self.dataset_hash,
+            'offsets': self.offsets,
+            'n_relation_types': self.n_relation_types,
+            'n_edges': self.n_edges,
+            'dataset_size': self.dataset_size,
+            'dataset_mtime_ns': self.dataset_mtime_ns
+        }
+
+    @staticmethod
+    def from_dict(target_dict: dict) -> 'DatasetManifest':
+        # Older manifests don't have the size and modification time
+        return DatasetManifest(target_dict['dataset_hash'],
+                               target_dict['offsets'],
+                               target_dict['n_relation_types'],
+                               target_dict['n_edges'],
+                               target_dict.get('dataset_size'),
+                               target_dict.get('dataset_mtime_ns'))
+
+    def update_stat(self, data_path: str):
+        """
+        Sets the size and modification time to the current ones of the dataset
+        """
+        stat = pathlib.Path(data_path).stat()
+        self.dataset_size = stat.st_size
+        self.dataset_mtime_ns = stat.st_mtime_ns
+
+    def matches_stat(self, data_path: str) -> bool:
+        """
+        If the dataset still has the size and modification time of the
+        manifest
+        """
+        stat = pathlib.Path(data_path).stat()
+        return self.dataset_size == stat.st_size \
+            and self.dataset_mtime_ns == stat.st_mtime_ns
+
+    def save(self, data_path: str):
+        """
+        Saves this manifest next to the dataset, with its current size and
+        modification time
+        """
+        self.update_stat(data_path)
+        with open(manifest_path(data_path), 'w') as manifest_file:
+            json.dump(self.to_dict(), manifest_file)
+
+
+def manifest_path(data_path: str) -> pathlib.Path:
+    data_path = pathlib.Path(data_path)
+    return data_path.with_name(data_path.name + ".manifest.json")
+
+
+def _hash_file(data_path: str):
+    hasher = hashlib.sha256()
+    with open(data_path, 'rb') as data_file:
+        while chunk := data_file.read(HASH_CHUNK_SIZE):
+            hasher.update(chunk)
+    return hasher
+
+
+def hash_dataset(data_path: str) -> str:
+    """
+    Returns the sha256 of the dataset content, which keys the files derived
+    from it, such as its manifest
+    """
+    return _hash_file(data_path).hexdigest()
+
+
+def load_manifest(data_path: str,
+                  dataset_hash: str = None) -> DatasetManifest | None:
+    """
+    Returns the manifest of the dataset. Returns None if there is none or if
+    it is stale, i.e., its hash isn't the dataset_hash. The dataset is only
+    hashed if its size or modification time changed since the manifest was
+    saved. Then, if dataset_hash isn't provided, it is computed from the
+    dataset, and a manifest that is still fresh is saved again with the new
+    modification time.
+    """
+    path = manifest_path(data_path)
+    if not path.exists():
+        return None
+
+    with open(path, 'r') as manifest_file:
+        manifest = DatasetManifest.from_dict(json.load(manifest_file))
+
+    if manifest.matches_stat(data_path):
+        return manifest
+
+    if dataset_hash is None:
+        dataset_hash = _hash_file(data_path).hexdigest()
+    if manifest.dataset_hash != dataset_hash:
+        return None
+
+    manifest.save(data_path)
+    return manifest
+
+
+def build_manifest(data_path: str) -> DatasetManifest:
+    """
+    Returns a new manifest of a JSON lines dataset
+    """
+    if is_legacy_dataset(data_path):
+        raise ValueError(
+            f"Can't build a manifest for {data_path} as it is a legacy JSON list dataset!"
+        )
+
+    hasher = hashlib.sha256()
+    manifest = DatasetManifest()
+    manifest.update_stat(data_path)
+    offset = 0
+    with open(data_path, 'rb') as data_file:
+        for line in data_file:
+            hasher.update(line)
+            if line.strip() != b"":
+                manifest.add(offset, json.loads(line))
+            offset += len(line)
+
+    manifest.dataset_hash = hasher.hexdigest()
+    return manifest
+
+
+class DatasetWriter():
+    """
+    Appends graphs dicts to a dataset file in the JSON lines format,
+    one graph dict per line. Appending to an existing dataset keeps it valid.
+    When closed, it saves the manifest of the dataset next to it.
+    """
+
+    def __init__(self, data_path: str):
+        self.data_path = pathlib.Path(data_path)
+        self.data_path.parent.mkdir(exist_ok=True, parents=True)
+
+        needs_newline = False
+        self._hasher = hashlib.sha256()
+        self.manifest = DatasetManifest()
+        if self.data_path.exists() and self.data_path.stat().st_size > 0:
+            if is_legacy_dataset(self.data_path):
+                raise ValueError(
+                    f"Can't append to {self.data_path} as it is a legacy JSON list dataset!"
+                )
+            with open(self.data_path, 'rb') as data_file:
+                data_file.seek(-1, 2)
+                needs_newline = data_file.read(1) != b"\n"
+
+            self._hasher = _hash_file(self.data_path)
+            manifest = load_manifest(self.data_path,
+                                     self._hasher.hexdigest())
+            if manifest is None:
+                manifest = build_manifest(self.data_path)
+            self.manifest = manifest
+
+        self._file = open(self.data_path, 'ab')
+        self._offset = self._file.tell()
+        if needs_newline:
+            self._write_bytes(b"\n")
+
+    def _write_bytes(self, content: bytes):
+        self._file.write(content)
+        self._hasher.update(content)
+        self._offset += len(content)
+
+    def write(self, graph_dict: dict):
+        """
+        Appends a graph dict to the dataset
+        """
+        self.manifest.add(self._offset, graph_dict)
+        self._write_bytes((json.dumps(graph_dict) + "\n").encode())
+
+    def write_all(self, graphs_dicts: Iterable[dict]):
+        for graph_dict in graphs_dicts:
+            self.write(graph_dict)
+
+    def close(self):
+        self._file.close()
+        self.manifest.dataset_hash = self._hasher.hexdigest()
+        self.manifest.save(self.data_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def config_argparser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Builds the manifest of a JSON lines dataset")
+
+    parser.add_argument("--data",
+                        type=str,
+                        required=True,
+                        help="The dataset path")
+
+    return parser
+
+
+if __name__ == "__main__":
+    args = config_argparser().parse_args()
+
+    build_manifest(args.data).save(args.data)
@@ -1,8 +1,6 @@
 import argparse
-import json
-import pathlib
-import pandas as pd
 
+from dataset import iter_graphs_dicts
 from graph import StarGraph
 
 
@@ -23,17 +21,16 @@ def config_argparser() -> argparse.ArgumentParser:
 
 
 def save_stats(data_path: str, save_to: str):
-    dataset_path = pathlib.Path(data_path)
-    with open(dataset_path, 'r') as data_file:
-        graphs_dicts: list[dict] = json.load(data_file)
-
     graph_sizes = list()
     relation_count = list()
-    for graph_dict in graphs_dicts:
+    for graph_dict in iter_graphs_dicts(data_path):
         graph = StarGraph.from_dict(graph_dict)
         graph_sizes.append(len(graph))
         relation_count.append(graph.n_relation_types())
 
+    # pandas is slow to import, so it is only imported when saving
+    import pandas as pd
+
     df = pd.DataFrame()
     df['nodes'] = graph_sizes
     df['relations'] = relation_count
@@ -1,24 +1,46 @@
 import argparse
-from collections.abc import Generator
-from collections import namedtuple
+from collections.abc import Callable, Generator, Iterable
+from collections import deque, namedtuple
+import functools
 import json
 import math
+import multiprocessing
+import os
 import pathlib
 import re
+from timeit import default_timer as timer
 
 from dotenv import dotenv_values
 from tqdm import tqdm
 
-from evaluators import LLM, URLLLM, HuggingFaceQuestionAnsweringLLM, HuggingFaceChatLLM, HuggingFaceNLIModel
-from graph import StarGraph
+from context_store import (ContextStore, GraphContext, load_context_store,
+                           render_graph_contexts)
+from dataset import DatasetManifest, iter_graphs_dicts, load_manifest
+from evaluators import LLM, CachedLLM, get_llm_class
+from metrics import METRICS
+import rendering
+from response_cache import ResponseCache
+from results_sink import open_results_sink, read_results_columns, ResultsSink
 import utils
 
 DataInstance = namedtuple(
     "DataInstance",
-    ['graph_id', 'relation_name', 'target_entity', 'relations'])
+    ['graph_id', 'relation_name', 'target_entity', 'relations', 'entities'],
+    defaults=[()])
+
+# The graph_id, rel_name, expected, predicted, score and latency_s of an
+# instance. See results_sink.RESULTS_COLUMNS.
+Result = tuple[int, str, str, str, float | None, float]
 
 LLM_answer_max_tokens = 20
 
+# Max number of groups of graphs waiting to be answered or saved per worker
+PENDING_GROUPS_PER_WORKER = 4
+
+# The LLM and the answer_batch args of a worker process. See _init_worker.
+_worker_llm: LLM = None
+_worker_answer_kwargs: dict = None
+
 
 def config_argparser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser()
@@ -53,6 +75,15 @@ def config_argparser() -> argparse.ArgumentParser:
         help=
         "If it should show only the last relations from every relation type")
 
+    parser.add_argument(
+        "--relations_order",
+        type=str,
+        required=False,
+        default=None,
+        choices=list(rendering.ORDERINGS),
+        help="The order of the relations, such as chronological_asc. If given,"\
+            " the order flags above are ignored. See rendering.py")
+
     parser.add_argument("--n_graphs",
                         type=int,
                         required=False,
@@ -70,14 +101,28 @@ def config_argparser() -> argparse.ArgumentParser:
                         type=int,
                         required=False,
                         default=1,
-                        help="The batch size. It might not be used")
+                        help="The number of instances given to the model at once."\
+                            " See pipeline_batch_s for the Hugging Face models")
+
+    parser.add_argument(
+        "--pipeline_batch_s",
+        type=int,
+        required=False,
+        default=1,
+        help="The batch size of the Hugging Face pipelines. The instances given"\
+            " at once are sorted by length and answered in batches of this size."\
+            " Default: 1")
 
     parser.add_argument("--starting_batch",
                         type=int,
                         required=False,
                         default=0,
                         help="The batch id from where to start evaluating. "\
-                            " Usefull to continue running after a halt. Default: 0")
+                            " Usefull to continue running after a halt. With"\
+                            " --packed or many --workers, the batches have"\
+                            " whole graphs, so it is the number of batches"\
+                            " saved, as logged in --batch_metrics_path."\
+                            " Default: 0")
 
     parser.add_argument(
         "--url",
@@ -97,6 +142,31 @@ def config_argparser() -> argparse.ArgumentParser:
         "The model name to be used such as microsoft/Phi-3-mini-4k-instruct. Default is ''"
         + " as when running with local-llm")
 
+    parser.add_argument(
+        "--max_in_flight",
+        type=int,
+        required=False,
+        default=1,
+        help=
+        "Max number of concurrent requests to the URL model. If greater than 1,"\
+            " the instances of a batch are sent concurrently. Default: 1")
+
+    parser.add_argument(
+        "--cache_path",
+        type=str,
+        required=False,
+        default=None,
+        help=
+        "Path of a SQLite database caching the model responses across runs."\
+            " Default: None (no cache)")
+
+    parser.add_argument("--cache_max_entries",
+                        type=int,
+                        required=False,
+                        default=1000000,
+                        help="Max number of cached responses. The least recently "\
+                            "used are evicted. Default: 1000000")
+
     parser.add_argument(
         "--qa",
         action="store_true",
@@ -105,6 +175,14 @@ def config_argparser() -> argparse.ArgumentParser:
         help=
         "If it should use the question-answering pipeline from Hugging Face")
 
+    parser.add_argument(
+        "--reuse_context",
+        action="store_true",
+        default=False,
+        required=False,
+        help="If the model should encode every context once and reuse it for "\
+            "all its questions. Only for the qa and chat models")
+
     parser.add_argument(
         "--chat",
         action="store_true",
@@ -121,10 +199,78 @@ def config_argparser() -> argparse.ArgumentParser:
             "should be given by the model_name arg. "
     )
 
+    parser.add_argument(
+        "--score_candidates",
+        action='store_true',
+        default=False,
+        required=False,
+        help="If the chat model should answer with the entity of the graph "\
+            "with the highest likelihood instead of generating. Only for the chat model")
+
+    parser.add_argument(
+        "--packed",
+        action='store_true',
+        default=False,
+        required=False,
+        help="If it should ask all the questions of a graph in a single prompt."\
+            " Only for the URL and chat models")
+
     parser.add_argument("--results_path",
                         type=str,
                         required=True,
-                        help="The path to the csv file to save the results")
+                        help="The path to the csv file to save the results."\
+                            " If it ends with .parquet, they are saved as"\
+                            " Parquet with their score and latency. See"\
+                            " results_sink.py to export them as csv")
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        required=False,
+        default=1,
+        help="Number of processes answering the questions, each one with its"\
+            " own model. The graphs are split between them. Default: 1")
+
+    parser.add_argument(
+        "--quantize",
+        action="store_true",
+        default=False,
+        required=False,
+        help="If the qa or nli model should be quantized to int8. Only on CPU")
+
+    parser.add_argument(
+        "--n_threads",
+        type=int,
+        required=False,
+        default=None,
+        help="Number of threads used by the Hugging Face models within every op."\
+            " Default: None (the PyTorch default, or the cores split between"\
+            " the workers)")
+
+    parser.add_argument(
+        "--reference_results",
+        type=str,
+        required=False,
+        default=None,
+        help="The results csv of a reference run, such as the fp32 model. If"\
+            " given, it prints the accuracy delta and agreement with it")
+
+    parser.add_argument(
+        "--metrics_path",
+        type=str,
+        required=False,
+        default=None,
+        help="Where to save the summary of the run metrics: the seconds of"\
+            " every stage, counters and throughput. Saved as csv if it ends"\
+            " with .csv, else as JSON. Default: None (no metrics)")
+
+    parser.add_argument(
+        "--batch_metrics_path",
+        type=str,
+        required=False,
+        default=None,
+        help="Where to save the metrics so far after every batch, as JSON lines."\
+            " Default: None")
 
     parser.add_argument("--print-times",
                         action="store_true",
@@ -152,28 +298,63 @@ def config_argparser() -> argparse.ArgumentParser:
 def get_eval_pair(data_path: str,
                   relations_order: str = 'as_is',
                   n_instances: int = -1,
-                  batch_s: int = 1) -> Generator[list[DataInstance]]:
+                  batch_s: int = 1,
+                  start_instance: int = 0,
+                  manifest: DatasetManifest = None,
+                  context_store: ContextStore = None
+                  ) -> Generator[list[DataInstance]]:
     """
     Generator that returns data instances to be evaluated.
     data_path: The path to the data
     shuffle: If it should shuffle the relations text
     n_instances: Number to limit total instances generated.
     batch_s: The batch size
+    start_instance: The id of the first instance to generate. The previous
+    ones are skipped. If the dataset manifest is provided, it seeks directly
+    to the graph of that instance.
+    context_store: If provided, the contexts are read from it instead of
+    building and rendering the graphs. See context_store.prepare.
     """
-    dataset_path = pathlib.Path(data_path)
-    with open(dataset_path, 'r') as data_file:
-        graphs_dicts: list[dict] = json.load(data_file)
+    first_graph_id, skip_in_graph = 0, start_instance
+    start_offset = 0
+    if manifest is not None and start_instance > 0:
+        first_graph_id, skip_in_graph = manifest.locate_instance(
+            start_instance)
+        if first_graph_id == manifest.n_graphs():
+            return
+        start_offset = manifest.offsets[first_graph_id]
+
+    def render_graphs_contexts() -> Generator[GraphContext]:
+        nonlocal skip_in_graph
+        for graph_id, graph_dict in enumerate(
+                iter_graphs_dicts(data_path, start_offset), first_graph_id):
+            # Every relation type of the graph is an instance, so the
+            # skipped graphs are neither built nor rendered
+            if skip_in_graph >= len(graph_dict):
+                skip_in_graph -= len(graph_dict)
+                continue
+            yield render_graph_contexts(graph_id, graph_dict,
+                                        [relations_order])[relations_order]
+
+    if context_store is not None:
+        graphs_contexts = context_store.iter_graphs_contexts(
+            relations_order, first_graph_id)
+    else:
+        graphs_contexts = render_graphs_contexts()
 
-    instance_count = 0
+    instance_count = start_instance
     reached_n_instances = False
     batch = list()
-    for graph_id, graph_dict in enumerate(graphs_dicts):
-        graph = StarGraph.from_dict(graph_dict)
-
-        text_to_show = _get_text_to_show(relations_order, graph)
+    for graph_context in graphs_contexts:
+        # Every relation type of the graph is an instance
+        if skip_in_graph >= len(graph_context.targets):
+            skip_in_graph -= len(graph_context.targets)
+            continue
 
-        for rel, entity in graph.get_all_latest().items():
-            if instance_count == n_instances:
+        targets = graph_context.targets[skip_in_graph:]
+        skip_in_graph = 0
+        for rel, entity_name in targets:
+            if 0 <= n_instances <= instance_count:
                 reached_n_instances = True
                 break
 
@@ -181,8 +362,9 @@ def get_eval_pair(data_path: str,
                 yield batch
                 batch = list()
 
-            batch.append(DataInstance(graph_id, rel, entity.name,
-                                      text_to_show))
+            batch.append(
+                DataInstance(graph_context.graph_id, rel, entity_name,
+                             graph_context.context, graph_context.entities))
             instance_count += 1
 
         if reached_n_instances:
@@ -192,25 +374,6 @@ def get_eval_pair(data_path: str,
         yield batch
 
 
-def _get_text_to_show(relations_order: str, graph: StarGraph):
-    if relations_order == 'shuffle':
-        return graph.get_shuffled_str()
-
-    if relations_order == 'interleave_asc':
-        return graph.get_interleaved_str(True)
-
-    if relations_order == 'interleave_desc':
-        return graph.get_interleaved_str(False)
-
-    if relations_order == "latest":
-        return graph.get_all_latest_str()
-
-    if relations_order == 'as_is':
-        return str(graph)
-
-    raise ValueError(relations_order, "is not a valid value!")
-
-
 def run(data_path: str,
         llm: LLM,
         results_path: str,
@@ -221,24 +384,68 @@ def run(data_path: str,
         starting_batch: int = 0,
         no_progress_bar: bool = False,
         apply_regex: bool = True,
-        is_nli: bool = False):
+        is_nli: bool = False,
+        packed: bool = False,
+        score_candidates: bool = False,
+        workers: int = 1,
+        llm_factory: Callable[[], LLM] = None,
+        metrics_path: str = None,
+        batch_metrics_path: str = None):
+    """
+    Evaluates the llm on the dataset and saves the results to results_path.
+    See results_sink.open_results_sink.
+    If packed, all the questions of a graph are asked in a single prompt
+    and a batch has the whole graphs of at least batch_s instances, so
+    their number isn't known ahead and starting_batch counts these
+    batches. See _transform_batch_to_packed_inputs.
+    If score_candidates, the entities of the graph are given to the llm as
+    the candidate answers of every question.
+    If workers is greater than 1, the graphs are split between that many
+    processes, each one with its own LLM built by llm_factory, and llm
+    isn't used. The results are saved in the same order, a group of whole
+    graphs with at least batch_s instances at a time, and starting_batch
+    counts these groups, as packed batches. See _answer_in_workers.
+    If a context store of the dataset has the relations_order, the contexts
+    are read from it. See context_store.prepare.
+    If metrics_path is given, the summary of the metrics of the run is saved
+    there as JSON or csv. See metrics.MetricsRegistry.save. If
+    batch_metrics_path is given, the counters and stage totals so far are
+    appended there as a JSON line after every saved batch.
+    """
+    assert not (packed and is_nli), "NLI models can't answer packed questions!"
+    assert not (packed and score_candidates), \
+        "Packed questions can't be answered by scoring candidates!"
     assert type(
         batch_s
     ) == int, f"Batch size must be an integer but {type(batch_s)} was given!"
     assert batch_s > 0, f"Batch size must be positive but {batch_s} was given!"
-
-    dataset_path = pathlib.Path(data_path)
-    with open(dataset_path, 'r') as data_file:
-        graphs_dicts: list[dict] = json.load(data_file)
-
-    results_path: pathlib.Path = pathlib.Path(results_path)
-    results_path.parent.mkdir(exist_ok=True, parents=True)
-
-    if starting_batch == 0:
-        with open(results_path, 'w') as result_file:
-            result_file.write("graph_id,rel_name,expected,predicted\n")
-
-    total_instances = get_total_instances(n_graphs, n_instances, graphs_dicts)
+    assert workers == 1 or llm_factory is not None, \
+        "Workers need a llm_factory to build their LLMs!"
+
+    if metrics_path is not None or batch_metrics_path is not None:
+        METRICS.enabled = True
+        METRICS.reset()
+    if batch_metrics_path is not None:
+        pathlib.Path(batch_metrics_path).parent.mkdir(exist_ok=True,
+                                                      parents=True)
+        open(batch_metrics_path, 'w').close()
+
+    # The manifest and the context store are only used if they are of
+    # this dataset. A fresh manifest has the hash of the dataset, so it is
+    # only hashed if the manifest is stale and there is a context store.
+    manifest = load_manifest(data_path)
+    dataset_hash = manifest.dataset_hash if manifest is not None else None
+    context_store = load_context_store(data_path, dataset_hash)
+    if context_store is not None:
+        if relations_order not in context_store.relations_orders():
+            context_store.close()
+            context_store = None
+
+    if manifest is not None:
+        total_instances = manifest.total_instances(n_graphs, n_instances)
+    else:
+        total_instances = get_total_instances(n_graphs, n_instances,
+                                              iter_graphs_dicts(data_path))
 
     n_batches = int(math.ceil(total_instances / batch_s))
 
@@ -249,30 +456,217 @@ def run(data_path: str,
         'nli': _nli_question_formater,
         'other': _other_question_formater
     }
-    question_fmt_func = questions_fmt_func[
-        'nli'] if is_nli else questions_fmt_func['other']
-
-    for batch_id, batch_data in enumerate(
-            tqdm(get_eval_pair(data_path,
-                               relations_order,
-                               n_instances=total_instances,
-                               batch_s=batch_s),
-                 total=n_batches,
-                 desc="Batches",
-                 disable=no_progress_bar)):
-        if batch_id < starting_batch:
-            continue
+    answer_kwargs = {
+        'context_fmt':
+        context_fmt,
+        'question_fmt_func':
+        questions_fmt_func['nli'] if is_nli else questions_fmt_func['other'],
+        'apply_regex':
+        apply_regex,
+        'packed':
+        packed,
+        'score_candidates':
+        score_candidates
+    }
 
-        batch_entries = _transform_batch_to_inputs(context_fmt,
-                                                   question_fmt_func,
-                                                   batch_data)
+    start_instance = starting_batch * batch_s
+    if (packed or workers > 1) and starting_batch > 0:
+        # The batches, or the groups of the workers, have whole graphs, so
+        # the first instance of the starting batch depends on the sizes of
+        # the graphs before it
+        graphs_sizes = manifest.n_relation_types if manifest is not None else (
+            len(graph_dict) for graph_dict in iter_graphs_dicts(data_path))
+        start_instance = _grouped_start_instance(graphs_sizes,
+                                                 starting_batch, batch_s)
+
+    batches = get_eval_pair(data_path,
+                            relations_order,
+                            n_instances=total_instances,
+                            batch_s=batch_s,
+                            start_instance=start_instance,
+                            manifest=manifest,
+                            context_store=context_store)
+    if packed:
+        # The graphs are never split between batches, or their questions
+        # would be asked in many prompts
+        batches = _group_by_graphs(batches, batch_s)
+        n_batches = None
+
+    with open_results_sink(results_path, append=starting_batch > 0) as sink:
+        if workers > 1:
+            done_instances = min(start_instance, total_instances)
+            with tqdm(total=total_instances,
+                      initial=done_instances,
+                      desc="Instances",
+                      disable=no_progress_bar) as progress:
+                for group_id, group_results in enumerate(
+                        _answer_in_workers(batches, batch_s, workers,
+                                           llm_factory, answer_kwargs),
+                        starting_batch):
+                    save_results_to(group_results, sink)
+                    progress.update(len(group_results))
+                    _save_batch_metrics(batch_metrics_path, group_id)
+        else:
+            for batch_id, batch_data in enumerate(
+                    tqdm(batches,
+                         total=n_batches,
+                         initial=starting_batch if n_batches is None else min(
+                             starting_batch, n_batches),
+                         desc="Batches",
+                         disable=no_progress_bar), starting_batch):
+                batch_results = answer_batch(llm, batch_data,
+                                             **answer_kwargs)
+                save_results_to(batch_results, sink)
+                _save_batch_metrics(batch_metrics_path, batch_id)
+
+    if context_store is not None:
+        context_store.close()
+
+    if metrics_path is not None:
+        METRICS.save(metrics_path)
+
+
+def _save_batch_metrics(batch_metrics_path: str | None, batch_id: int):
+    if batch_metrics_path is None:
+        return
+
+    with open(batch_metrics_path, 'a') as metrics_file:
+        batch_metrics = {'batch': batch_id}
+        batch_metrics.update(METRICS.summary(with_percentiles=False))
+        metrics_file.write(json.dumps(batch_metrics) + "\n")
+
+
+def answer_batch(llm: LLM,
+                 batch_data: list[DataInstance],
+                 context_fmt: str,
+                 question_fmt_func,
+                 apply_regex: bool = True,
+                 packed: bool = False,
+                 score_candidates: bool = False
+                 ) -> list[Result]:
+    """
+    Asks the llm the questions of the batch and returns their results
+    """
+    METRICS.increment('batches')
+    METRICS.increment('instances', len(batch_data))
+    if packed:
+        batch_entries, groups = _transform_batch_to_packed_inputs(
+            context_fmt, batch_data)
+        max_group_s = max(len(group) for group in groups)
+        start = timer()
+        responses = proccess_batch(llm, batch_entries,
+                                   LLM_answer_max_tokens * max_group_s)
+        return post_process_packed_responses(batch_data, groups, responses,
+                                             apply_regex, timer() - start)
+
+    batch_entries = _transform_batch_to_inputs(context_fmt, question_fmt_func,
+                                               batch_data, score_candidates)
+
+    start = timer()
+    responses = proccess_batch(llm, batch_entries)
+
+    return post_process_responses(batch_data, responses, apply_regex,
+                                  timer() - start)
+
+
+def _group_by_graphs(
+        batches: Iterable[list[DataInstance]],
+        min_instances: int) -> Generator[list[DataInstance]]:
+    """
+    Regroups the instances of the batches in groups of whole graphs with at
+    least min_instances instances, but the last one.
+    """
+    group = list()
+    for batch_data in batches:
+        for instance in batch_data:
+            if len(group) >= min_instances and instance.graph_id != group[
+                    -1].graph_id:
+                yield group
+                group = list()
+            group.append(instance)
+
+    if len(group) > 0:
+        yield group
+
+
+def _grouped_start_instance(graphs_sizes: Iterable[int], starting_batch: int,
+                            min_instances: int) -> int:
+    """
+    Returns the first instance of the starting_batch-th group of whole
+    graphs with at least min_instances instances, given the number of
+    instances of every graph. See _group_by_graphs.
+    """
+    start_instance, group_s, n_groups = 0, 0, 0
+    for graph_s in graphs_sizes:
+        if n_groups == starting_batch:
+            break
+        start_instance += graph_s
+        group_s += graph_s
+        if group_s >= min_instances:
+            n_groups += 1
+            group_s = 0
+    return start_instance
+
+
+def _init_worker(llm_factory: Callable[[], LLM], answer_kwargs: dict,
+                 metrics_enabled: bool, print_enabled: bool):
+    global _worker_llm, _worker_answer_kwargs
+    METRICS.enabled = metrics_enabled
+    METRICS.reset()
+    utils.PRINT_ENABLED = print_enabled
+    _worker_llm = llm_factory()
+    _worker_answer_kwargs = answer_kwargs
+
+
+def _answer_group_in_worker(
+        group: list[DataInstance],
+        batch_s: int) -> tuple[list[Result], dict]:
+    """
+    Returns the results of the group and the metrics recorded meanwhile
+    """
+    if _worker_answer_kwargs['packed']:
+        # The packed questions of a graph must be in the same batch
+        batch_s = len(group)
+
+    group_results = list()
+    for batch_start in range(0, len(group), batch_s):
+        group_results.extend(
+            answer_batch(_worker_llm, group[batch_start:batch_start + batch_s],
+                         **_worker_answer_kwargs))
+    return group_results, METRICS.take_snapshot()
+
+
+def _answer_in_workers(
+    batches: Iterable[list[DataInstance]], batch_s: int, workers: int,
+    llm_factory: Callable[[], LLM], answer_kwargs: dict
+) -> Generator[list[Result]]:
+    """
+    Generator that returns the results of groups of whole graphs, answered
+    by the workers in batches of batch_s. The results follow the order of
+    the batches. Only a few groups per worker are read ahead, so the
+    dataset is never in memory. The metrics of the workers are merged into
+    METRICS.
+    """
 
-        responses = proccess_batch(llm, batch_entries)
+    def get_results(pending_group) -> list[Result]:
+        group_results, metrics_snapshot = pending_group.get()
+        METRICS.merge(metrics_snapshot)
+        return group_results
 
-        batch_results = post_process_responses(batch_data, responses,
-                                               apply_regex)
+    pending = deque()
+    with multiprocessing.Pool(workers,
+                              initializer=_init_worker,
+                              initargs=(llm_factory, answer_kwargs,
+                                        METRICS.enabled,
+                                        utils.PRINT_ENABLED)) as pool:
+        for group in _group_by_graphs(batches, batch_s):
+            pending.append(
+                pool.apply_async(_answer_group_in_worker, (group, batch_s)))
+            if len(pending) >= PENDING_GROUPS_PER_WORKER * workers:
+                yield get_results(pending.popleft())
 
-        save_results_to(batch_results, results_path)
+        while len(pending) > 0:
+            yield get_results(pending.popleft())
 
 
 def _nli_question_formater(instance: DataInstance) -> list[str]:
@@ -289,56 +683,197 @@ def _other_question_formater(instance: DataInstance) -> list[str]:
     return question
 
 
-@utils.timer_dec
-def _transform_batch_to_inputs(
-        context_fmt: str, question_fmt_func,
-        batch_data: list[DataInstance]) -> list[dict[str, str]]:
+@utils.timer_dec(name="prompt_building")
+def _transform_batch_to_inputs(context_fmt: str,
+                               question_fmt_func,
+                               batch_data: list[DataInstance],
+                               with_candidates: bool = False) -> list[dict]:
+    """
+    Returns an entry with the context and the question of every instance.
+    If with_candidates, the entries also have the entities of the graph
+    as 'candidates'.
+    """
     batch_entries = [{
         'context': context_fmt.format(instance.relations),
         'question': question_fmt_func(instance)
     } for instance in batch_data]
 
+    if with_candidates:
+        for entry, instance in zip(batch_entries, batch_data):
+            entry['candidates'] = list(instance.entities)
+
     return batch_entries
 
 
-@utils.timer_dec
-def proccess_batch(llm: LLM, batch_entries: list[dict]) -> list[dict]:
+@utils.timer_dec(name="prompt_building")
+def _transform_batch_to_packed_inputs(
+        context_fmt: str, batch_data: list[DataInstance]
+) -> tuple[list[dict[str, str]], list[list[int]]]:
+    """
+    Packs the questions of the instances of the same graph into a single
+    entry, asking for one 'relation: entity' line per relation.
+    Returns the entries and, for each one, the indexes of its instances.
+    """
+    groups: dict[int, list[int]] = dict()
+    for idx, instance in enumerate(batch_data):
+        groups.setdefault(instance.graph_id, list()).append(idx)
+
+    question_fmt = "For each of the relations {}, what is the entity with the latest relation?"
+    question_fmt += " Answer with one line per relation in the format 'relation: entity',"
+    question_fmt += " for example '{}: e1'."
+
+    batch_entries = list()
+    for group in groups.values():
+        relation_names = [batch_data[idx].relation_name for idx in group]
+        batch_entries.append({
+            'context':
+            context_fmt.format(batch_data[group[0]].relations),
+            'question':
+            question_fmt.format(", ".join(relation_names), relation_names[0])
+        })
+
+    return batch_entries, list(groups.values())
+
+
+@utils.timer_dec(name="model_call")
+def proccess_batch(llm: LLM,
+                   batch_entries: list[dict],
+                   max_tokens: int = LLM_answer_max_tokens) -> list[dict]:
     """
     Proccess the batch of data using the provided llm.
     Return a list of LLM responses
     """
-    return llm.answer(batch_entries, max_tokens=LLM_answer_max_tokens)
+    return llm.answer(batch_entries, max_tokens=max_tokens)
 
 
-@utils.timer_dec
-def save_results_to(batch_results: list[tuple[int, str, str, str]],
-                    results_path: pathlib.Path):
-    with open(results_path, 'a') as result_file:
-        lines = [
-            ",".join([str(el) for el in result]) + "\n"
-            for result in batch_results
-        ]
-        result_file.writelines(lines)
+@utils.timer_dec(name="result_writing")
+def save_results_to(batch_results: list[Result], sink: ResultsSink):
+    sink.write(batch_results)
 
 
-@utils.timer_dec
+@utils.timer_dec(name="post_processing")
 def post_process_responses(
         batch_data: list[DataInstance],
         llm_responses: list[dict],
-        apply_regex: bool = True) -> list[tuple[int, str, str, str]]:
+        apply_regex: bool = True,
+        latency_s: float = 0.0) -> list[Result]:
+    """
+    Returns the result of every instance. latency_s are the seconds the llm
+    took to answer the batch.
+    """
     batch_results = list()
     for instance, response in zip(batch_data, llm_responses):
         final_answer = response['answer'].split("\n")[0]
         if apply_regex:
             target_info = re.findall("e[0-9]+", response['answer'])
             final_answer = target_info[0] if len(target_info) > 0 else ''
-        batch_results.append((instance.graph_id, instance.relation_name,
-                              instance.target_entity, final_answer))
+        batch_results.append(
+            (instance.graph_id, instance.relation_name, instance.target_entity,
+             final_answer, response.get('score'), latency_s))
     return batch_results
 
 
+@utils.timer_dec(name="post_processing")
+def post_process_packed_responses(
+        batch_data: list[DataInstance],
+        groups: list[list[int]],
+        llm_responses: list[dict],
+        apply_regex: bool = True,
+        latency_s: float = 0.0) -> list[Result]:
+    """
+    Splits the 'relation: answer' lines of every packed response into the
+    results of its instances. A relation without a line has an empty answer.
+    latency_s are the seconds the llm took to answer the batch.
+    """
+    results_by_idx = dict()
+    for group, response in zip(groups, llm_responses):
+        answers = _parse_packed_answer(
+            response['answer'],
+            [batch_data[idx].relation_name for idx in group])
+
+        for idx in group:
+            instance = batch_data[idx]
+            final_answer = answers.get(instance.relation_name, '')
+            if apply_regex:
+                target_info = re.findall("e[0-9]+", final_answer)
+                final_answer = target_info[0] if len(target_info) > 0 else ''
+            results_by_idx[idx] = (instance.graph_id, instance.relation_name,
+                                   instance.target_entity, final_answer,
+                                   response.get('score'), latency_s)
+
+    return [results_by_idx[idx] for idx in range(len(batch_data))]
+
+
+def _parse_packed_answer(answer: str,
+                         relation_names: list[str]) -> dict[str, str]:
+    """
+    Returns the answer of every relation with a 'relation: answer' line.
+    The relation may be decorated, as in '- r1: e2' or '**r1**: e2', and
+    the lines without a known relation or with an empty answer are
+    ignored. The first line of a relation is its answer.
+    """
+    patterns = {
+        relation_name:
+        re.compile(rf"\b{re.escape(relation_name)}\b\W*:\s*(.*)")
+        for relation_name in relation_names
+    }
+    answers = dict()
+    for line in answer.split("\n"):
+        for relation_name, pattern in patterns.items():
+            match = pattern.search(line)
+            if match is not None and match.group(1).strip() != '':
+                answers.setdefault(relation_name, match.group(1).strip())
+                break
+    return answers
+
+
+def make_llm(model_type: str, model_name: str, **kwargs) -> LLM:
+    """
+    Returns a new LLM of the model_type. See evaluators.LLM_BACKENDS.
+    """
+    return get_llm_class(model_type)(model_name, **kwargs)
+
+
+def read_results(results_path: str) -> dict[tuple[str, str], tuple[str, str]]:
+    """
+    Returns the expected and predicted entities of every (graph_id, rel_name)
+    of the results, saved as csv or Parquet
+    """
+    columns = read_results_columns(
+        results_path, ['graph_id', 'rel_name', 'expected', 'predicted'])
+    return {(str(graph_id), rel_name): (expected, predicted)
+            for graph_id, rel_name, expected, predicted in zip(
+                *columns.values())}
+
+
+def compare_to_reference(results_path: str, reference_path: str) -> dict:
+    """
+    Compares the results to the ones of a reference run over their shared
+    instances. Returns the accuracy of both, its delta and the fraction of
+    instances with the same prediction.
+    """
+    results = read_results(results_path)
+    reference = read_results(reference_path)
+    shared = [key for key in results if key in reference]
+    assert len(shared) > 0, "The results don't share instances with the reference!"
+
+    accuracy = sum(results[key][0] == results[key][1]
+                   for key in shared) / len(shared)
+    reference_accuracy = sum(reference[key][0] == reference[key][1]
+                             for key in shared) / len(shared)
+    agreement = sum(results[key][1] == reference[key][1]
+                    for key in shared) / len(shared)
+    return {
+        'n_instances': len(shared),
+        'accuracy': accuracy,
+        'reference_accuracy': reference_accuracy,
+        'accuracy_delta': accuracy - reference_accuracy,
+        'agreement': agreement
+    }
+
+
 def get_total_instances(n_graphs: int, n_instances: int,
-                        graphs_dicts: list[dict]) -> int:
+                        graphs_dicts: Iterable[dict]) -> int:
     """
     Calculate the total number of instances that will be evaluated
     """
@@ -347,8 +882,8 @@ def get_total_instances(n_graphs: int, n_instances: int,
         if graph_id == n_graphs:
             break
 
-        graph = StarGraph.from_dict(graph_dict)
-        graph_instances = graph.n_relation_types()
+        # Every relation type of the graph is an instance
+        graph_instances = len(graph_dict)
         if n_instances < 0:
             tot_instances += graph_instances
         elif tot_instances + graph_instances < n_instances:
@@ -373,22 +908,60 @@ if __name__ == "__main__":
     else:
         model_type = 'local'
 
-    type_to_model = {
-        'qa': HuggingFaceQuestionAnsweringLLM,
-        'local': URLLLM,
-        'chat': HuggingFaceChatLLM,
-        'nli': HuggingFaceNLIModel
-    }
-
-    llm = type_to_model[model_type](args.model_name,
-                                    url=args.url,
-                                    token=secrets['API_KEY'])
+    assert not args.packed or model_type in ('local', 'chat'), \
+        "Only the URL and chat models can answer packed questions!"
+    assert not args.reuse_context or model_type in ('qa', 'chat'), \
+        "Only the question-answering and chat models can reuse the contexts!"
+    assert not args.score_candidates or model_type == 'chat', \
+        "Only the chat model can score the candidates!"
+    assert not args.quantize or model_type in ('qa', 'nli'), \
+        "Only the qa and nli models can be quantized!"
+    assert args.n_threads is None or model_type != 'local', \
+        "Only the Hugging Face models can set the threads!"
+    assert args.workers > 0, f"workers must be positive but {args.workers} was given!"
+    assert args.workers == 1 or args.cache_path is None, \
+        "The response cache can't be used with many workers!"
+
+    model_kwargs = dict()
+    if model_type != 'local':
+        model_kwargs['pipeline_batch_s'] = args.pipeline_batch_s
+        model_kwargs['n_threads'] = args.n_threads
+        if args.workers > 1 and args.n_threads is None:
+            # The workers share the cores instead of competing for them
+            model_kwargs['n_threads'] = max(1, os.cpu_count() // args.workers)
+    if model_type in ('qa', 'nli'):
+        model_kwargs['quantize'] = args.quantize
+
+    if model_type == 'local':
+        model_kwargs['url'] = args.url
+        model_kwargs['token'] = secrets['API_KEY']
+        model_kwargs['max_in_flight'] = args.max_in_flight
+    elif model_type == 'qa':
+        model_kwargs['reuse_context_encoding'] = args.reuse_context
+    elif model_type == 'chat':
+        model_kwargs['reuse_context_cache'] = args.reuse_context
+        if args.packed:
+            # A packed answer has many lines that may end with a period
+            model_kwargs['stop_on_period'] = False
+        model_kwargs['score_candidates'] = args.score_candidates
+
+    llm_factory = functools.partial(make_llm, model_type, args.model_name,
+                                    **model_kwargs)
+    # With many workers, each one builds its own LLM
+    llm = llm_factory() if args.workers == 1 else None
+
+    cache = None
+    if args.cache_path is not None:
+        cache = ResponseCache(args.cache_path, args.cache_max_entries)
+        llm = CachedLLM(llm, cache)
 
     if not args.print_times:
         utils.PRINT_ENABLED = False
 
     relations_order = None
-    if args.shuffle:
+    if args.relations_order is not None:
+        relations_order = args.relations_order
+    elif args.shuffle:
         relations_order = 'shuffle'
     elif args.interleave_asc:
         relations_order = 'interleave_asc'
@@ -403,4 +976,19 @@ if __name__ == "__main__":
 
     run(args.data, llm, args.results_path, relations_order, args.n_graphs,
         args.n_instances, args.batch_s, args.starting_batch, args.no_progress,
-        args.apply_regex, is_nli)
+        args.apply_regex, is_nli, args.packed, args.score_candidates,
+        args.workers, llm_factory, args.metrics_path, args.batch_metrics_path)
+
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Cache hits: {stats['hits']}, misses: {stats['misses']}, "\
+              f"hit rate: {stats['hit_rate']:.2%}")
+        cache.close()
+
+    if args.reference_results is not None:
+        comparison = compare_to_reference(args.results_path,
+                                          args.reference_results)
+        print(f"Accuracy: {comparison['accuracy']:.2%}, reference: "\
+              f"{comparison['reference_accuracy']:.2%}, delta: "\
+              f"{comparison['accuracy_delta']:+.2%}, agreement: "\
+              f"{comparison['agreement']:.2%} over {comparison['n_instances']} instances")
@@ -1,10 +1,38 @@
-import time
 from abc import ABC, abstractmethod
+import importlib
+import re
+import time
+import zlib
+
+from response_cache import ResponseCache
+
+# Model type -> (module, class) of its LLM. The modules are only imported
+# when their LLMs are used, as their dependencies are slow to import.
+LLM_BACKENDS = {
+    'local': ('url_evaluators', 'URLLLM'),
+    'qa': ('hf_evaluators', 'HuggingFaceQuestionAnsweringLLM'),
+    'chat': ('hf_evaluators', 'HuggingFaceChatLLM'),
+    'nli': ('hf_evaluators', 'HuggingFaceNLIModel')
+}
 
-from openai import OpenAI, OpenAIError
-from transformers import pipeline, StoppingCriteria, StoppingCriteriaList
 
-from utils import timer_dec
+def get_llm_class(model_type: str) -> type['LLM']:
+    """
+    Returns the LLM class of the model_type. See LLM_BACKENDS.
+    """
+    if model_type not in LLM_BACKENDS:
+        raise ValueError(model_type, "is not a valid model type!")
+
+    module_name, class_name = LLM_BACKENDS[model_type]
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def __getattr__(name: str):
+    # The LLMs of the backends can still be imported from here
+    for module_name, class_name in LLM_BACKENDS.values():
+        if class_name == name:
+            return getattr(importlib.import_module(module_name), class_name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class LLM(ABC):
@@ -21,190 +49,133 @@ class LLM(ABC):
     def answer(self, data: list[dict], **kwargs) -> list[dict]:
         pass
 
-
-class URLLLM(LLM):
-    """
-    It first connects to the given url using the token and
-    then can answer the given text. This is useful when running local-llm
-    """
-
-    def __init__(self,
-                 model_name: str = "",
-                 url: str = "",
-                 token: str = 'foo',
-                 **kwargs):
-        super().__init__(model_name, **kwargs)
-        self.client = OpenAI(
-            api_key=token,
-            base_url=url,
-        )
-
-    @timer_dec
-    def answer(self, data: list[dict[str, str]], **kwargs) -> list[dict]:
+    def cache_id(self) -> str:
         """
-        Data is a list of dict of instances. For this LLM, each dict must have 'question'
-        and 'context' keys.
+        Identifies this LLM in a ResponseCache. LLMs whose answers
+        depend on more than the model should extend it.
         """
-        for attempt in range(5):
-            responses = list()
-            try:
-                for instance in data:
-                    content = instance['context'] + "\n" + instance['question']
-                    chat_completion = self.client.chat.completions.create(
-                        messages=[
-                            {
-                                "role": "user",
-                                "content": content,
-                            },
-                        ],
-                        model=self.model_name,
-                        **kwargs)
-                    for choice in chat_completion.choices:
-                        responses.append({'answer': choice.message.content})
-            except OpenAIError as e:
-                error_message = str(e)
-                if "is currently loading" in error_message:
-                    print(
-                        f"Attempt {attempt + 1}/5: Model is still loading. Waiting 10 seconds to try again..."
-                    )
-                    time.sleep(10)
-                else:
-                    print(f"Unnespected error: {error_message}")
-                    raise e
-            else:
-                return responses
-        raise RuntimeError(f"The model didn't load after many tries.")
-
-
-class HuggingFaceQuestionAnsweringLLM(LLM):
-    """
-    This uses the question-answering pipeline from hugging face using the provided model.
-    If the model_name is empty or None, it uses the default from the pipeline
-    """
+        return f"{type(self).__name__}:{self.model_name}"
 
-    def __init__(self, model_name: str, device='cpu', **kwargs):
-        super().__init__(model_name, **kwargs)
-        self.pipeline = pipeline("question-answering",
-                                 model=self.model_name,
-                                 device=device,
-                                 **kwargs)
-
-    @timer_dec
-    def answer(self, data: list[dict[str, str]], **kwargs) -> list[dict]:
-        """
-        Data is a list of dict of instances. For this LLM, each dict must have 'question'
-        and 'context' keys. This allows for batched processing
-
-        Return a list of dicts of answers. Each dict has a 'answer' and 'score' key.
-        """
-        questions = [item["question"] for item in data]
-        contexts = [item["context"] for item in data]
 
-        results = self.pipeline(question=questions, context=contexts)
-
-        if type(results) == dict:
-            results = [results]
-
-        return results
-
-
-class StopOnPeriod(StoppingCriteria):
+class CachedLLM(LLM):
     """
-    Used in the HuggingFaceChatLLM to stop generating text after generating
-    a period (.).
+    Wraps a LLM so it only answers the instances not found in the cache.
+    The wrapped LLM must return one response per instance.
     """
 
-    def __init__(self, tokenizer):
-        super().__init__()
-        self.tokenizer = tokenizer
+    def __init__(self, llm: LLM, cache: ResponseCache):
+        self.llm = llm
+        self.cache = cache
+        self.model_name = llm.model_name
 
-    def __call__(self, input_ids, scores, **kwargs):
-        last_token_id = input_ids[0, -1].item()
-        decoded_text = self.tokenizer.decode([last_token_id],
-                                             skip_special_tokens=True)
-        return decoded_text.endswith(".")
-
-
-class HuggingFaceChatLLM(LLM):
+    def answer(self, data: list[dict], **kwargs) -> list[dict]:
+        keys = [
+            ResponseCache.make_key(self.llm.cache_id(), instance, kwargs)
+            for instance in data
+        ]
+        responses = self.cache.get_many(keys)
 
-    def __init__(self, model_name="", device='cpu', **kwargs):
-        super().__init__(model_name, **kwargs)
-        self.pipeline = pipeline("text-generation",
-                                 model=self.model_name,
-                                 device=device,
-                                 **kwargs)
+        # Instances repeated in the batch are answered once
+        missing = dict()
+        for key, instance in zip(keys, data):
+            if key not in responses:
+                missing.setdefault(key, instance)
 
-        self.stopping_criteria = StoppingCriteriaList(
-            [StopOnPeriod(tokenizer=self.pipeline.tokenizer)])
+        if len(missing) > 0:
+            new_responses = self.llm.answer(list(missing.values()), **kwargs)
+            assert len(new_responses) == len(missing), \
+                f"Expected {len(missing)} responses but got {len(new_responses)}!"
+            new_responses = dict(zip(missing.keys(), new_responses))
+            self.cache.put_many(new_responses)
+            responses.update(new_responses)
 
-    def answer(self, data: list[dict[str, str]], **kwargs) -> list[dict]:
-        """
-        Data is a list of dict of instances. For this LLM, each dict must have 'question'
-        and 'context' keys. This allows for batched processing
+        return [responses[key] for key in keys]
 
-        Return a list of dicts of answers. Each dict has a 'answer' key.
-        """
-        if 'max_tokens' in kwargs:
-            kwargs['max_new_tokens'] = kwargs['max_tokens']
-            del kwargs['max_tokens']
-
-        prompt_fmt = "Context: {}\nUser: {}\nAssistent:"
-        prompts = [
-            prompt_fmt.format(item["context"], item["question"])
-            for item in data
-        ]
-        outputs = self.pipeline(
-            prompts,
-            pad_token_id=self.pipeline.tokenizer.eos_token_id,
-            temperature=0.1,  #Low temperature to keep things simple
-            stopping_criteria=self.stopping_criteria,
-            **kwargs)
+    def cache_id(self) -> str:
+        return self.llm.cache_id()
 
-        responses = list()
-        for output in outputs:
-            responses.append({
-                "answer":
-                output[0]["generated_text"].split('Assistent:')[-1].strip()
-            })
-
-        return responses
 
+class OracleLLM(LLM):
+    """
+    A fake LLM that answers every question with the entity of the latest
+    relation found in its context, so runs can be measured without a
+    model. A fraction error_rate of the instances, chosen by a hash of
+    their question and context, are answered wrongly instead. Every
+    answer call waits latency_s plus instance_latency_s per instance.
+    It understands the questions, packed questions and NLI hypotheses
+    of eval_model.
+    """
 
-class HuggingFaceNLIModel(LLM):
+    relation_pattern = re.compile(
+        r"Relation (\S+) with entity named (\S+) in time interval (\S+) to")
+    question_pattern = re.compile(r"latest relation (\S+?)[?.]")
+    packed_question_pattern = re.compile(r"For each of the relations (.+?),"\
+                                         " what is")
+    nli_question_pattern = re.compile(r"Entity (\S+) has the latest relation")
 
-    def __init__(self, model_name="", device='cpu', **kwargs):
+    def __init__(self,
+                 model_name: str = "oracle",
+                 error_rate: float = 0.0,
+                 latency_s: float = 0.0,
+                 instance_latency_s: float = 0.0,
+                 **kwargs):
         super().__init__(model_name, **kwargs)
-        if 'ModernBERT' in model_name:
-            kwargs['model_kwargs'] = {"reference_compile": False}
-
-        self.pipeline = pipeline("text-classification",
-                                 model=self.model_name,
-                                 device=device,
-                                 **kwargs)
+        assert 0 <= error_rate <= 1, \
+            f"error_rate must be between 0 and 1 but {error_rate} was given!"
+        self.error_rate = error_rate
+        self.latency_s = latency_s
+        self.instance_latency_s = instance_latency_s
 
     def answer(self, data: list[dict[str, str]], **kwargs) -> list[dict]:
         """
-        Data is a list of dict of instances. For this LLM, each dict must have 'question'
-        and 'context' keys. This allows for batched processing
-
-        Return a list of dicts of answers. Each dict has a 'answer' and 'score' keys.
+        Data is a list of dict of instances with 'question' and 'context'
+        keys. Returns a dict with the 'answer' of every instance.
         """
-        premises = [item["context"] for item in data]
-        hypotheses = [item["question"] for item in data]
-
-        inputs = [{
-            'text': premise,
-            'text_pair': hypothesis
-        } for premise, hypothesis in zip(premises, hypotheses)]
-
-        results = self.pipeline(inputs)
-
-        if type(results) == dict:
-            results = [results]
-
-        results = [{
-            'answer': result['label'],
-            'score': result['score']
-        } for result in results]
-
-        return results
+        latency_s = self.latency_s + self.instance_latency_s * len(data)
+        if latency_s > 0:
+            time.sleep(latency_s)
+
+        return [{'answer': self._answer_instance(instance)} for instance in data]
+
+    def _is_wrong(self, instance: dict[str, str]) -> bool:
+        if self.error_rate == 0:
+            return False
+
+        instance_hash = zlib.crc32(
+            (instance['question'] + instance['context']).encode())
+        return instance_hash / 2**32 < self.error_rate
+
+    def _answer_instance(self, instance: dict[str, str]) -> str:
+        # Relation name -> (start date, entity) of its latest relation
+        latest = dict()
+        entities = list()
+        for rel_name, entity, start in self.relation_pattern.findall(
+                instance['context']):
+            entities.append(entity)
+            if rel_name not in latest or latest[rel_name][0] < start:
+                latest[rel_name] = (start, entity)
+
+        is_wrong = self._is_wrong(instance)
+
+        def get_entity(rel_name: str) -> str:
+            entity = latest.get(rel_name, (None, ''))[1]
+            if not is_wrong:
+                return entity
+            # The first other entity of the context, if any
+            return next((other for other in entities if other != entity), '')
+
+        question = instance['question']
+        packed_match = self.packed_question_pattern.search(question)
+        if packed_match is not None:
+            return "\n".join(
+                f"{rel_name}: {get_entity(rel_name)}"
+                for rel_name in packed_match.group(1).split(", "))
+
+        rel_name = self.question_pattern.search(question).group(1)
+        nli_match = self.nli_question_pattern.search(question)
+        if nli_match is not None:
+            is_latest = nli_match.group(1) == latest.get(rel_name,
+                                                         (None, None))[1]
+            return "ENTAILMENT" if is_latest != is_wrong else "CONTRADICTION"
+
+        return get_entity(rel_name)
@@ -1,8 +1,25 @@
 import argparse
-import json
-import pathlib
+from collections.abc import Generator
+import functools
+import math
+import multiprocessing
+import random
 
+import numpy as np
+
+from array_graph import ArrayStarGraph
+import context_store
+from dataset import DatasetWriter
 from graph import StarGraph
+import utils
+
+# Number of graphs generated at once by the vectorized generator. It bounds
+# the memory used by its arrays.
+VECTORIZED_CHUNK_SIZE = 10000
+
+# Number of shards per worker when not vectorized. More shards than workers
+# balance the load between them.
+SHARDS_PER_WORKER = 4
 
 
 def config_argparse() -> argparse.ArgumentParser:
@@ -49,28 +66,170 @@ def config_argparse() -> argparse.ArgumentParser:
                         type=str,
                         default=None,
                         required=False,
-                        help="Path of file to save all generated graphs")
+                        help="Path of file to save all generated graphs. They are "\
+                            "appended one per line if it already exists")
+
+    parser.add_argument("--vectorized",
+                        action='store_true',
+                        default=False,
+                        help="If it should generate the graphs in batches "\
+                            "using NumPy. Much faster for many graphs")
+
+    parser.add_argument("--seed",
+                        type=int,
+                        default=None,
+                        required=False,
+                        help="Master seed. Every graph is generated with its own random "\
+                            "generator derived from it and the graph id. Default: None (random)")
+
+    parser.add_argument("--workers",
+                        type=int,
+                        default=1,
+                        required=False,
+                        help="Number of processes generating graphs. The output doesn't "\
+                            "depend on it. Default: 1")
+
+    parser.add_argument("--prepare_contexts",
+                        action='store_true',
+                        default=False,
+                        help="If it should also render the contexts of every "\
+                            "relations order into a store next to the dataset,"\
+                            " so evaluating it doesn't build the graphs. See "\
+                            "context_store.py")
+
+    parser.add_argument("--verbose",
+                        action="store_true",
+                        required=False,
+                        default=False,
+                        help="If it should print the seed drawn when --seed "\
+                            "isn't given.")
 
     return parser
 
 
+def graph_rng(seed: int, graph_id: int) -> random.Random:
+    """
+    Returns the random generator of a graph. It only depends on the master
+    seed and the graph id, so every graph can be generated alone.
+    """
+    return random.Random(f"{seed}-{graph_id}")
+
+
+def generate_graphs_dicts(first_graph_id: int, last_graph_id: int,
+                          entities: list[str], relations: list[str],
+                          start_year: int, end_year: int,
+                          seed: int) -> list[dict]:
+    graphs_list = list()
+    for graph_id in range(first_graph_id, last_graph_id):
+        graph = StarGraph()
+        graph.generate_star_graph(entities, relations, start_year, end_year,
+                                  graph_rng(seed, graph_id))
+        graphs_list.append(graph.to_dict())
+    return graphs_list
+
+
+def generate_graphs_dicts_vectorized(first_graph_id: int, last_graph_id: int,
+                                     entities: list[str],
+                                     relations: list[str], start_year: int,
+                                     end_year: int, seed: int) -> list[dict]:
+    """
+    Generates the graphs in chunks of VECTORIZED_CHUNK_SIZE. Every chunk has
+    its own random generator, so first_graph_id must be the start of a chunk.
+    """
+    assert first_graph_id % VECTORIZED_CHUNK_SIZE == 0, \
+        f"The first graph id must be a multiple of {VECTORIZED_CHUNK_SIZE}!"
+    graphs_list = list()
+    for chunk_start in range(first_graph_id, last_graph_id,
+                             VECTORIZED_CHUNK_SIZE):
+        chunk_size = min(VECTORIZED_CHUNK_SIZE, last_graph_id - chunk_start)
+        rng = np.random.default_rng(
+            [seed, chunk_start // VECTORIZED_CHUNK_SIZE])
+        graphs = ArrayStarGraph.generate_star_graphs(chunk_size, entities,
+                                                     relations, start_year,
+                                                     end_year, rng)
+        graphs_list.extend(graph.to_dict() for graph in graphs)
+    return graphs_list
+
+
+def get_shards(n_graphs: int, n_workers: int,
+               vectorized: bool) -> list[tuple[int, int]]:
+    """
+    Split the graph ids into (first_graph_id, last_graph_id) shards.
+    """
+    if vectorized:
+        shard_size = VECTORIZED_CHUNK_SIZE
+    else:
+        shard_size = max(1,
+                         math.ceil(n_graphs / (n_workers * SHARDS_PER_WORKER)))
+
+    return [(first_graph_id, min(first_graph_id + shard_size, n_graphs))
+            for first_graph_id in range(0, n_graphs, shard_size)]
+
+
+def generate_shard(shard: tuple[int, int], entities: list[str],
+                   relations: list[str], start_year: int, end_year: int,
+                   seed: int, vectorized: bool) -> list[dict]:
+    generate_func = generate_graphs_dicts_vectorized if vectorized else generate_graphs_dicts
+    return generate_func(shard[0], shard[1], entities, relations, start_year,
+                         end_year, seed)
+
+
+def generate(n_graphs: int,
+             entities: list[str],
+             relations: list[str],
+             start_year: int,
+             end_year: int,
+             seed: int,
+             n_workers: int = 1,
+             vectorized: bool = False) -> Generator[dict]:
+    """
+    Generator of the graphs dicts, created using n_workers processes.
+    The result only depends on the seed, not on the number of workers.
+    """
+    generate_func = functools.partial(generate_shard,
+                                      entities=entities,
+                                      relations=relations,
+                                      start_year=start_year,
+                                      end_year=end_year,
+                                      seed=seed,
+                                      vectorized=vectorized)
+    shards = get_shards(n_graphs, n_workers, vectorized)
+
+    if n_workers == 1:
+        for shard in shards:
+            yield from generate_func(shard)
+    else:
+        with multiprocessing.Pool(n_workers) as pool:
+            for shard_graphs in pool.imap(generate_func, shards):
+                yield from shard_graphs
+
+
 if __name__ == "__main__":
     args = config_argparse().parse_args()
 
     assert args.start_year <= args.end_year, "Starting year can't be greater than ending year!"
+    assert args.workers > 0, f"Workers must be positive but {args.workers} was given!"
+
+    if not args.verbose:
+        utils.PRINT_ENABLED = False
 
     entities = [f'e{i}' for i in range(1, args.entities)]
     relations = [f'r{i}' for i in range(args.relations)]
-    if args.save_to is not None:
-        graphs_list = list()
+    seed = args.seed
+    if seed is None:
+        seed = random.SystemRandom().randrange(2**32)
+        if utils.PRINT_ENABLED:
+            print(f"Using seed {seed}")
+
+    graphs_dicts = generate(args.n_graphs, entities, relations,
+                            args.start_year, args.end_year, seed,
+                            args.workers, args.vectorized)
 
-    for _ in range(args.n_graphs):
-        graph = StarGraph()
-        graph.generate_star_graph(entities, relations, args.start_year,
-                                  args.end_year)
-        graphs_list.append(graph.to_dict())
     if args.save_to is not None:
-        file_path = pathlib.Path(args.save_to)
-        file_path.parent.mkdir(exist_ok=True, parents=True)
-        with open(file_path, 'a') as fp:
-            json.dump(graphs_list, fp)
+        with DatasetWriter(args.save_to) as writer:
+            writer.write_all(graphs_dicts)
+        if args.prepare_contexts:
+            context_store.prepare(args.save_to, seed=seed).close()
+    else:
+        for _ in graphs_dicts:
+            pass
@@ -1,8 +1,10 @@
+import bisect
 import calendar
 import datetime
-from queue import Queue
 import random
 
+import rendering
+
 
 class DateInterval():
     """
@@ -31,27 +33,35 @@ class DateInterval():
         return equal or start_overlap or end_overlap or contains or contained
 
     @classmethod
-    def get_random(cls, years: list = None, seed: int = None):
-        """
-        Returns a random DateInterval in the years interval provided
-        """
-        random.seed(seed)
+    def get_random(cls,
+                   years: list = None,
+                   seed: int = None,
+                   rng: random.Random = None):
+        """
+        Returns a random DateInterval in the years interval provided.
+        If rng is provided, it is used instead of the global random
+        state and seed is ignored.
+        """
+        if rng is None:
+            random.seed(seed)
+            rng = random
         months = list(range(1, 13))
         if years is None:
             years = list(range(2000, 2025))
 
         starting_date, finishing_date = cls._get_start_and_end_date(
-            cls._get_random_date(years, months),
-            cls._get_random_date(years, months))
+            cls._get_random_date(years, months, rng),
+            cls._get_random_date(years, months, rng))
 
         return DateInterval(starting_date, finishing_date)
 
     @classmethod
-    def _get_random_date(cls, years: list[int], months: list[int]):
-        random_year = random.choice(years)
-        random_month = random.choice(months)
+    def _get_random_date(cls, years: list[int], months: list[int],
+                         rng: random.Random):
+        random_year = rng.choice(years)
+        random_month = rng.choice(months)
         _, final_day = calendar.monthrange(random_year, random_month)
-        random_day = random.choice(list(range(1, final_day)))
+        random_day = rng.choice(list(range(1, final_day)))
 
         return datetime.datetime(random_year, random_month, random_day)
 
@@ -192,6 +202,11 @@ class Relations():
     def __init__(self, relation_name):
         self._relation_name = relation_name
         self._relations: list[Relation] = list()
+        # Index of the same relations sorted by start date. As relations
+        # never overlap, their end dates are sorted as well.
+        self._sorted: list[Relation] = list()
+        self._starts: list[datetime.datetime] = list()
+        self._ends: list[datetime.datetime] = list()
 
     def __len__(self):
         return len(self._relations)
@@ -201,7 +216,8 @@ class Relations():
             entity,
             years: list[int],
             n_tries: int = 5,
-            seed: int | list[int] = None) -> Relation:
+            seed: int | list[int] = None,
+            rng: random.Random = None) -> Relation:
         """
         Try to create a new random relation using the entity
         with a DateInterval in the years passed. It will try
@@ -211,6 +227,8 @@ class Relations():
         anyother relation.
         The first try is done with the seed provided. All the
         others are made with random seed.
+        If rng is provided, every try uses it instead of the global
+        random state and seed is ignored.
         """
         seeds = list()
         if seed is None:
@@ -227,23 +245,40 @@ class Relations():
             )
 
         for id_try in range(n_tries):
-            random.seed(seeds[id_try])
-            new_relation = Relation(entity,
-                                    DateInterval.get_random(years, seed))
+            if rng is None:
+                random.seed(seeds[id_try])
+                date_interval = DateInterval.get_random(years, seed)
+            else:
+                date_interval = DateInterval.get_random(years, rng=rng)
+            new_relation = Relation(entity, date_interval)
 
             if self._dont_overlap_with_any_relation(new_relation):
-                self._relations.append(new_relation)
+                self._insert(new_relation)
                 return new_relation
 
         return None
 
     def _dont_overlap_with_any_relation(self, new_relation):
-        for relation in self._relations:
+        # Only relations ending after the new one starts and starting before
+        # the new one ends can overlap with it. Inside that range only the ones
+        # touching its boundaries may not overlap, so the loop is short.
+        interval = new_relation.date_interval
+        first = bisect.bisect_left(self._ends, interval.start)
+        last = bisect.bisect_right(self._starts, interval.end)
+        for relation in self._sorted[first:last]:
             if relation.overlap(new_relation):
                 return False
 
         return True
 
+    def _insert(self, relation: Relation):
+        interval = relation.date_interval
+        idx = bisect.bisect_left(self._starts, interval.start)
+        self._starts.insert(idx, interval.start)
+        self._ends.insert(idx, interval.end)
+        self._sorted.insert(idx, relation)
+        self._relations.append(relation)
+
     def add(self, relation: Relation) -> bool:
         """
         Tries to add the new relation to this collection.
@@ -252,7 +287,7 @@ class Relations():
         Returns if the relation was added or not
         """
         if self._dont_overlap_with_any_relation(relation):
-            self._relations.append(relation)
+            self._insert(relation)
             return True
 
         return False
@@ -261,12 +296,10 @@ class Relations():
         """
         Get the latest relation from this collection
         """
-        latest_rel = None
-        for relation in self._relations:
-            if latest_rel is None or relation > latest_rel:
-                latest_rel = relation
+        if len(self._sorted) == 0:
+            return None
 
-        return latest_rel
+        return self._sorted[-1]
 
     def to_dict(self) -> dict:
         """
@@ -296,13 +329,21 @@ class Relations():
         """
         Check if this Relations has a relation.
         """
-        for rel in self._relations:
-            if rel == relation:
-                return True
+        start = relation.date_interval.start
+        idx = bisect.bisect_left(self._starts, start)
+        # Start dates are unique as relations with the same start overlap
+        if idx < len(self._starts) and self._starts[idx] == start:
+            return self._sorted[idx] == relation
         return False
 
     def sorted(self, ascending: bool = True) -> list[Relation]:
-        return sorted(self._relations, reverse=not ascending)
+        """
+        Returns the relations sorted by their start date
+        """
+        if ascending:
+            return list(self._sorted)
+
+        return self._sorted[::-1]
 
     def __str__(self):
         final_str = ""
@@ -335,60 +376,74 @@ class StarGraph():
 
     def __init__(self):
         self.relations_map: dict[str, Relations] = dict()
+        # Number of edges, kept as they are added so it is never counted.
+        # Edges must be added with add_edge or generate_star_graph.
+        self._n_edges = 0
 
     def generate_star_graph(self,
                             entities: list[int],
                             relations: list[int],
                             start_year: int = 2000,
-                            end_year: int = 2025):
+                            end_year: int = 2025,
+                            rng: random.Random = None):
+        """
+        Generates a random graph with the entities and relations.
+        If rng is provided, it is used instead of the global random
+        state. This allows generating graphs independently.
+        """
+        random_state = random if rng is None else rng
         entities_copy = entities.copy()
-        random.shuffle(entities_copy)
+        random_state.shuffle(entities_copy)
 
         years = list(range(start_year, end_year))
 
         self.relations_map = dict()
+        self._n_edges = 0
         for entity in entities_copy:
-            relation = random.choice(relations)
+            relation = random_state.choice(relations)
             curr_relations: Relations = self.relations_map.setdefault(
                 relation, Relations(relation))
-            curr_relations.new_random_valid_relation_with(entity, years)
+            new_relation = curr_relations.new_random_valid_relation_with(
+                entity, years, rng=rng)
+            if new_relation is not None:
+                self._n_edges += 1
 
-    def add_edge(self, relation_name: str, relation: Relation):
+    def add_edge(self, relation_name: str, relation: Relation) -> bool:
         """
-        Add an edge with the central node
+        Add an edge with the central node. Returns if it was added, as it
+        isn't if it overlaps with another relation of the same type.
         """
-        self.relations_map.setdefault(relation_name,
-                                      Relations(relation_name)).add(relation)
+        added = self.relations_map.setdefault(
+            relation_name, Relations(relation_name)).add(relation)
+        if added:
+            self._n_edges += 1
+        return added
 
     def to_list(self) -> list[str]:
         """
         Returns a list of strings of Relations inside this graph
         """
-        if len(self.relations_map) == 0:
-            return list()
-
-        final_str = ""
-        for key in sorted(self.relations_map.keys()):
-            final_str += str(self.relations_map[key])
+        return list(rendering.iter_as_is(self))
 
-        final_str = final_str.strip(", ")
-        return [relation.strip() for relation in final_str.split(",")]
-
-    def shuffled_list(self, seed: int = None) -> list[str]:
+    def shuffled_list(self,
+                      seed: int = None,
+                      rng: random.Random = None) -> list[str]:
         """
-        Returns a shuffled list of strings of Relations inside this graph
+        Returns a shuffled list of strings of Relations inside this graph.
+        If rng is provided, it is used instead of the global random
+        state and seed is ignored.
         """
-        random.seed(seed)
+        if rng is None:
+            random.seed(seed)
+            rng = random
         graph_list = self.to_list()
-        random.shuffle(graph_list)
+        rng.shuffle(graph_list)
         return graph_list
 
-    def get_shuffled_str(self, seed: int = None) -> str:
-        shuffled_text = ""
-        for text in self.shuffled_list(seed):
-            shuffled_text += text + "\n"
-        shuffled_text = shuffled_text.strip("\n")
-        return shuffled_text
+    def get_shuffled_str(self,
+                         seed: int = None,
+                         rng: random.Random = None) -> str:
+        return "\n".join(self.shuffled_list(seed, rng))
 
     def get_interleaved_list(self, ascending: bool = True) -> list[str]:
         """
@@ -403,36 +458,15 @@ class StarGraph():
         if asceding == False:
             return [('e1', '2020'), ('e4', '2022'), ('e2', '2015'), ('e3', '2021')]
         """
-        queues: list[Queue] = list()
-        for key in sorted(self.relations_map.keys()):
-            q = Queue(maxsize=0)  #Infinite queue
-            relations = self.relations_map[key]
-            for relation in relations.sorted(ascending):
-                q.put((key, relation))
-            queues.append(q)
-
-        interleaved_relations = list()
-        while True:
-            n_empty_queues = 0
-            for queue in queues:
-                if not queue.empty():
-                    interleaved_relations.append(queue.get_nowait())
-                else:
-                    n_empty_queues += 1
-            if n_empty_queues == len(queues):
-                break
-
         return [
-            f"Relation {rel_name} with entity named {str(rel)}"
-            for rel_name, rel in interleaved_relations
+            rendering.fact_line(rel_name, relation)
+            for rel_name, relation in rendering.iter_interleaved(
+                self, ascending)
         ]
 
     def get_interleaved_str(self, ascending: bool = True):
-        interleaved_text = ""
-        for text in self.get_interleaved_list(ascending):
-            interleaved_text += text + "\n"
-        interleaved_text = interleaved_text.strip("\n")
-        return interleaved_text
+        return "\n".join(rendering.iter_interleaved_asc(
+            self) if ascending else rendering.iter_interleaved_desc(self))
 
     def get_all_latest(self) -> dict[str, Relation]:
         """
@@ -448,14 +482,17 @@ class StarGraph():
         return latest_relations
 
     def get_all_latest_str(self) -> str:
-        all_latest = self.get_all_latest()
+        return rendering.render(self, 'latest')
 
-        final_str = ""
-        for key in sorted(all_latest.keys()):
-            final_str += f"Relation {key} with entity named {str(all_latest[key])}\n"
-
-        final_str = final_str.strip("\n")
-        return final_str
+    def entity_names(self) -> list[str]:
+        """
+        Returns the sorted names of the entities related to the central node
+        """
+        return sorted({
+            relation.name
+            for relations in self.relations_map.values()
+            for relation in relations
+        })
 
     def n_nodes_for_relation(self, rel_name: str) -> int:
         """
@@ -511,14 +548,10 @@ class StarGraph():
         Return the number of diferent relations types this graph has. This is
         not the number of edges, but their labels
         """
-        return len(list(self.relations_map.keys()))
+        return len(self.relations_map)
 
     def n_relations(self) -> int:
-        sum = 0
-        for relations in self.relations_map.values():
-            sum += len(relations)
-
-        return sum
+        return self._n_edges
 
     def mean_nodes_per_relation_type(self) -> float:
         """
@@ -527,12 +560,10 @@ class StarGraph():
         return len(self) / self.n_relation_types()
 
     def __len__(self):
-        return len(self.to_list())
+        return self._n_edges
 
     def __str__(self):
-        self_list = [el + "\n" for el in self.to_list()]
-        self_list[-1] = self_list[-1].strip("\n")
-        return "".join(self_list)
+        return rendering.render(self, 'as_is')
 
     def __eq__(self, other: 'StarGraph'):
         if len(self) != len(other):
@@ -0,0 +1,665 @@
+from collections import OrderedDict
+import copy
+
+import numpy as np
+import torch
+from tokenizers import Encoding
+from transformers import Cache, pipeline, StoppingCriteria, StoppingCriteriaList
+from transformers.pipelines.question_answering import select_starts_ends
+
+from evaluators import LLM
+from utils import timer_dec
+
+# Candidate answers kept per window, as the question-answering pipeline does
+# when answers are aligned to words
+_QA_CANDIDATES_PER_WINDOW = 12
+
+
+def _run_in_length_buckets(hf_pipeline, inputs: list, lengths: list[int],
+                           batch_size: int, **kwargs) -> list:
+    """
+    Streams the inputs to the Hugging Face pipeline sorted by length, so
+    every batch of batch_size inputs has inputs of similar length and
+    little padding. Returns the outputs in the original order of the inputs.
+    """
+    order = sorted(range(len(inputs)), key=lambda idx: lengths[idx])
+    outputs = [None] * len(inputs)
+    sorted_outputs = hf_pipeline((inputs[idx] for idx in order),
+                                 batch_size=batch_size,
+                                 **kwargs)
+    for idx, output in zip(order, sorted_outputs):
+        outputs[idx] = output
+    return outputs
+
+
+def _span_to_chars(encoding: Encoding,
+                   start: int,
+                   end: int,
+                   first_token: int = 0,
+                   end_token: int = None) -> tuple[int, int]:
+    """
+    Returns the characters of the context spanned from its start token to
+    its end token, aligned to words. As in the question-answering pipeline,
+    whose inputs are truncated to a window of the context, the words are
+    cut to the tokens of the window, from first_token to end_token. A span
+    from the first token of the model input, which is before the context
+    and so has a negative index, starts at 0 and isn't aligned.
+    """
+    if start < 0:
+        return 0, encoding.offsets[end][1] if end >= 0 else 0
+
+    start_word = encoding.token_to_word(start)
+    end_word = encoding.token_to_word(end)
+    if start_word is None or end_word is None:
+        # Some tokenizers don't have words, so the offsets are used
+        return encoding.offsets[start][0], encoding.offsets[end][1]
+
+    end_token = len(encoding.ids) if end_token is None else end_token
+    word_start = max(encoding.word_to_tokens(start_word)[0], first_token)
+    word_end = min(encoding.word_to_tokens(end_word)[1], end_token)
+    return encoding.offsets[word_start][0], encoding.offsets[word_end - 1][1]
+
+
+def _optimize_for_cpu(hf_pipeline, quantize: bool, n_threads: int = None):
+    """
+    If quantize, the linear layers of the pipeline model are quantized to
+    int8 with PyTorch dynamic quantization, which only runs on CPU.
+    If n_threads is given, it sets the number of threads used by PyTorch
+    within every op.
+    """
+    if n_threads is not None:
+        assert n_threads > 0, f"n_threads must be positive but {n_threads} was given!"
+        torch.set_num_threads(n_threads)
+
+    if quantize:
+        assert hf_pipeline.device.type == 'cpu', "Only models on CPU can be quantized!"
+        hf_pipeline.model = torch.ao.quantization.quantize_dynamic(
+            hf_pipeline.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class HuggingFaceQuestionAnsweringLLM(LLM):
+    """
+    This uses the question-answering pipeline from hugging face using the provided model.
+    If the model_name is empty or None, it uses the default from the pipeline.
+
+    The pipeline answers in batches of pipeline_batch_s instances of
+    similar length. On CPU, it can use n_threads and quantize the model to
+    int8 for speed. See _optimize_for_cpu.
+
+    If reuse_context_encoding, it doesn't use the pipeline preprocessing.
+    Instead, every context is tokenized once and its tokens are reused for
+    every question about it, even across calls. The windows over the
+    context and the answer selection follow the pipeline. The windows are
+    answered in batches of pipeline_batch_s windows.
+    """
+
+    def __init__(self,
+                 model_name: str,
+                 device='cpu',
+                 pipeline_batch_s: int = 1,
+                 quantize: bool = False,
+                 n_threads: int = None,
+                 reuse_context_encoding: bool = False,
+                 max_seq_len: int = 384,
+                 doc_stride: int = 128,
+                 max_answer_len: int = 15,
+                 n_cached_contexts: int = 8,
+                 **kwargs):
+        super().__init__(model_name, **kwargs)
+        self.pipeline = pipeline("question-answering",
+                                 model=self.model_name,
+                                 device=device,
+                                 **kwargs)
+        self.quantize = quantize
+        _optimize_for_cpu(self.pipeline, quantize, n_threads)
+
+        self.pipeline_batch_s = pipeline_batch_s
+        self.reuse_context_encoding = reuse_context_encoding
+        self.max_seq_len = min(max_seq_len,
+                               self.pipeline.tokenizer.model_max_length)
+        self.doc_stride = min(doc_stride, self.max_seq_len // 2)
+        self.max_answer_len = max_answer_len
+        self.n_cached_contexts = n_cached_contexts
+        self._context_encodings: OrderedDict[str, Encoding] = OrderedDict()
+        if reuse_context_encoding:
+            assert self.pipeline.tokenizer.is_fast, "reuse_context_encoding needs a fast tokenizer!"
+
+    @timer_dec
+    def answer(self, data: list[dict[str, str]], **kwargs) -> list[dict]:
+        """
+        Data is a list of dict of instances. For this LLM, each dict must have 'question'
+        and 'context' keys. This allows for batched processing
+
+        Return a list of dicts of answers. Each dict has a 'answer' and 'score' key.
+        """
+        if self.reuse_context_encoding:
+            return self._answer_reusing_contexts(data)
+
+        inputs = [{
+            'question': item["question"],
+            'context': item["context"]
+        } for item in data]
+        lengths = [len(item["question"]) + len(item["context"]) for item in data]
+
+        return _run_in_length_buckets(self.pipeline, inputs, lengths,
+                                      self.pipeline_batch_s)
+
+    def _encode_context(self, context: str) -> Encoding:
+        """
+        Returns the encoding of the context without special tokens. The
+        latest contexts are cached, so the questions of the same graph reuse
+        them.
+        """
+        if context in self._context_encodings:
+            self._context_encodings.move_to_end(context)
+            return self._context_encodings[context]
+
+        self._context_encodings[context] = self.pipeline.tokenizer(
+            context, add_special_tokens=False).encodings[0]
+        if len(self._context_encodings) > self.n_cached_contexts:
+            self._context_encodings.popitem(last=False)
+        return self._context_encodings[context]
+
+    def _get_windows(
+            self, question: str, context_encoding: Encoding
+    ) -> list[tuple[list[int], list[int], int, int, int]]:
+        """
+        Returns the model inputs for the question over windows of the
+        encoded context. Each one is (input ids, token type ids, position of
+        the context in the input ids, index of its first context token,
+        number of context tokens).
+        """
+        tokenizer = self.pipeline.tokenizer
+        context_ids = context_encoding.ids
+        question_ids = tokenizer(question,
+                                 add_special_tokens=False)['input_ids']
+
+        # A placeholder token shows where the context goes among the
+        # special tokens of the model
+        template = tokenizer.build_inputs_with_special_tokens(
+            question_ids, [-1])
+        context_position = template.index(-1)
+        window_s = self.max_seq_len - (len(template) - 1)
+        step = max(1, window_s - self.doc_stride)
+
+        windows = list()
+        for window_start in range(0, max(1, len(context_ids)), step):
+            window_ids = context_ids[window_start:window_start + window_s]
+            input_ids = template[:context_position] + window_ids + template[
+                context_position + 1:]
+            token_type_ids = tokenizer.create_token_type_ids_from_sequences(
+                question_ids, window_ids)
+            windows.append((input_ids, token_type_ids, context_position,
+                            window_start, len(window_ids)))
+            if window_start + window_s >= len(context_ids):
+                break
+        return windows
+
+    def _get_windows_logits(
+        self, windows: list[tuple[list[int], list[int], int, int, int]]
+    ) -> list[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Returns the start logits, end logits and attention mask of every
+        window, each with a batch axis. The windows are answered in batches
+        of pipeline_batch_s windows of similar length, as the pipeline does.
+        """
+        tokenizer = self.pipeline.tokenizer
+        order = sorted(range(len(windows)),
+                       key=lambda window_id: len(windows[window_id][0]))
+        windows_logits = [None] * len(windows)
+        for batch_start in range(0, len(order), self.pipeline_batch_s):
+            batch_ids = order[batch_start:batch_start + self.pipeline_batch_s]
+            max_len = max(
+                len(windows[window_id][0]) for window_id in batch_ids)
+            input_ids = torch.full((len(batch_ids), max_len),
+                                   tokenizer.pad_token_id,
+                                   dtype=torch.long)
+            attention_mask = torch.zeros((len(batch_ids), max_len),
+                                         dtype=torch.long)
+            token_type_ids = torch.zeros((len(batch_ids), max_len),
+                                         dtype=torch.long)
+            for row, window_id in enumerate(batch_ids):
+                window_ids, window_type_ids = windows[window_id][:2]
+                input_ids[row, :len(window_ids)] = torch.tensor(window_ids)
+                attention_mask[row, :len(window_ids)] = 1
+                token_type_ids[row, :len(window_ids)] = torch.tensor(
+                    window_type_ids)
+
+            model_inputs = {
+                'input_ids': input_ids,
+                'attention_mask': attention_mask
+            }
+            if 'token_type_ids' in tokenizer.model_input_names:
+                model_inputs['token_type_ids'] = token_type_ids
+            with torch.no_grad():
+                outputs = self.pipeline.model(
+                    **{
+                        name: tensor.to(self.pipeline.device)
+                        for name, tensor in model_inputs.items()
+                    })
+            start_logits = outputs.start_logits.float().cpu().numpy()
+            end_logits = outputs.end_logits.float().cpu().numpy()
+            attention_mask = attention_mask.numpy()
+            for row, window_id in enumerate(batch_ids):
+                windows_logits[window_id] = (start_logits[row:row + 1],
+                                             end_logits[row:row + 1],
+                                             attention_mask[row:row + 1])
+        return windows_logits
+
+    def _answer_reusing_contexts(self,
+                                 data: list[dict[str, str]]) -> list[dict]:
+        # Every context is encoded once, for its windows and its answers
+        encodings = [self._encode_context(item['context']) for item in data]
+        windows = list()
+        instances_ids = list()
+        for instance_id, (item, encoding) in enumerate(zip(data, encodings)):
+            item_windows = self._get_windows(item['question'], encoding)
+            windows.extend(item_windows)
+            instances_ids.extend([instance_id] * len(item_windows))
+
+        answers = [list() for _ in data]
+        for window, instance_id, window_logits in zip(
+                windows, instances_ids, self._get_windows_logits(windows)):
+            _, _, context_position, window_start, n_context_tokens = window
+            self._add_window_answers(answers[instance_id],
+                                     data[instance_id]['context'],
+                                     encodings[instance_id], *window_logits,
+                                     context_position, window_start,
+                                     n_context_tokens)
+
+        return [
+            max(instance_answers, key=lambda answer: answer['score'])
+            if len(instance_answers) > 0 else {
+                'score': 0.0,
+                'start': 0,
+                'end': 0,
+                'answer': ''
+            } for instance_answers in answers
+        ]
+
+    def _add_window_answers(self, answers: list[dict], context: str,
+                            context_encoding: Encoding,
+                            start_logits: np.ndarray, end_logits: np.ndarray,
+                            attention_mask: np.ndarray, context_position: int,
+                            window_start: int, n_context_tokens: int):
+        """
+        Adds the candidate answers of a window to answers as the pipeline
+        does: spans are aligned to words and the scores of equal answers
+        are added up.
+        """
+        # As in the pipeline, only the first token and the context can be
+        # part of the answer
+        p_mask = np.ones(start_logits.shape, dtype=int)
+        p_mask[0, 0] = 0
+        p_mask[0, context_position:context_position + n_context_tokens] = 0
+
+        starts, ends, scores, _ = select_starts_ends(
+            start_logits,
+            end_logits,
+            p_mask,
+            attention_mask,
+            top_k=_QA_CANDIDATES_PER_WINDOW,
+            max_answer_len=self.max_answer_len)
+
+        for start, end, score in zip(starts, ends, scores):
+            start_char, end_char = _span_to_chars(
+                context_encoding, window_start + start - context_position,
+                window_start + end - context_position, window_start,
+                window_start + n_context_tokens)
+            answer_text = context[start_char:end_char]
+
+            for answer in answers:
+                if answer['answer'].lower() == answer_text.lower():
+                    answer['score'] += score.item()
+                    break
+            else:
+                answers.append({
+                    'score': score.item(),
+                    'start': start_char,
+                    'end': end_char,
+                    'answer': answer_text
+                })
+
+    def cache_id(self) -> str:
+        cache_id = super().cache_id()
+        if self.quantize:
+            cache_id += ":int8"
+        if self.reuse_context_encoding:
+            cache_id += ":reuse_context_encoding"
+        return cache_id
+
+
+class StopOnPeriod(StoppingCriteria):
+    """
+    Used in the HuggingFaceChatLLM to stop generating text after generating
+    a period (.). Every row of the batch stops on its own period, and the
+    generation stops once all of them have.
+    """
+
+    def __init__(self, tokenizer):
+        super().__init__()
+        self.tokenizer = tokenizer
+        # Every token that ends with a period once decoded
+        decoded_tokens = tokenizer.batch_decode(
+            [[token_id] for token_id in range(len(tokenizer))],
+            skip_special_tokens=True)
+        self.period_token_ids = torch.tensor([
+            token_id for token_id, decoded_text in enumerate(decoded_tokens)
+            if decoded_text.endswith(".")
+        ],
+                                             dtype=torch.long)
+
+    def __call__(self, input_ids, scores, **kwargs) -> torch.BoolTensor:
+        if self.period_token_ids.device != input_ids.device:
+            self.period_token_ids = self.period_token_ids.to(input_ids.device)
+        return torch.isin(input_ids[:, -1], self.period_token_ids)
+
+
+class HuggingFaceChatLLM(LLM):
+    """
+    This uses the text-generation pipeline from hugging face using the provided model.
+    By default, it stops generating after a period. See StopOnPeriod.
+    The pipeline generates in batches of pipeline_batch_s prompts of similar
+    length. On CPU, it can use n_threads. See _optimize_for_cpu.
+
+    If score_candidates, it doesn't generate. Instead, every instance must
+    have a 'candidates' key with the valid answers, and the answer is the
+    candidate with the highest log-likelihood after the prompt.
+
+    If reuse_context_cache, the past key values of every context are
+    computed once and reused for all the questions about it, even across
+    calls. Only the question part of each prompt is processed, but the
+    prompts are generated one at a time.
+    """
+
+    context_prefix_fmt = "Context: {}\n"
+    prompt_fmt = context_prefix_fmt + "User: {}\nAssistent:"
+
+    def __init__(self,
+                 model_name="",
+                 device='cpu',
+                 pipeline_batch_s: int = 1,
+                 n_threads: int = None,
+                 stop_on_period: bool = True,
+                 score_candidates: bool = False,
+                 reuse_context_cache: bool = False,
+                 n_cached_contexts: int = 8,
+                 **kwargs):
+        super().__init__(model_name, **kwargs)
+        self.pipeline = pipeline("text-generation",
+                                 model=self.model_name,
+                                 device=device,
+                                 **kwargs)
+        _optimize_for_cpu(self.pipeline, False, n_threads)
+
+        self.pipeline_batch_s = pipeline_batch_s
+        if self.pipeline_batch_s > 1:
+            # Batched prompts are padded on the left, so generation goes on
+            # from the end of every prompt
+            tokenizer = self.pipeline.tokenizer
+            if tokenizer.pad_token_id is None:
+                tokenizer.pad_token_id = tokenizer.eos_token_id
+            tokenizer.padding_side = 'left'
+
+        self.stop_on_period = stop_on_period
+        self.stopping_criteria = StoppingCriteriaList()
+        if self.stop_on_period:
+            self.stopping_criteria.append(
+                StopOnPeriod(tokenizer=self.pipeline.tokenizer))
+        self.score_candidates = score_candidates
+
+        self.reuse_context_cache = reuse_context_cache
+        self.n_cached_contexts = n_cached_contexts
+        # Context -> (token ids of its prefix, past key values of the prefix)
+        self._context_caches: OrderedDict[str, tuple[
+            list[int], Cache]] = OrderedDict()
+
+    def cache_id(self) -> str:
+        # Reusing the context cache gives the same responses
+        if self.score_candidates:
+            return f"{super().cache_id()}:score_candidates"
+        return f"{super().cache_id()}:stop_on_period={self.stop_on_period}"
+
+    def answer(self, data: list[dict[str, str]], **kwargs) -> list[dict]:
+        """
+        Data is a list of dict of instances. For this LLM, each dict must have 'question'
+        and 'context' keys. This allows for batched processing
+
+        Return a list of dicts of answers. Each dict has a 'answer' key.
+        When scoring the candidates, it also has a 'score' key.
+        """
+        if self.score_candidates:
+            return [self._answer_scoring_candidates(item) for item in data]
+
+        if 'max_tokens' in kwargs:
+            kwargs['max_new_tokens'] = kwargs['max_tokens']
+            del kwargs['max_tokens']
+
+        if self.reuse_context_cache:
+            return [
+                self._generate_reusing_context(item, **kwargs)
+                for item in data
+            ]
+
+        prompts = [
+            self.prompt_fmt.format(item["context"], item["question"])
+            for item in data
+        ]
+        outputs = _run_in_length_buckets(
+            self.pipeline,
+            prompts, [len(prompt) for prompt in prompts],
+            self.pipeline_batch_s,
+            pad_token_id=self.pipeline.tokenizer.eos_token_id,
+            temperature=0.1,  #Low temperature to keep things simple
+            stopping_criteria=self.stopping_criteria,
+            **kwargs)
+
+        responses = list()
+        for output in outputs:
+            responses.append({
+                "answer":
+                output[0]["generated_text"].split('Assistent:')[-1].strip()
+            })
+
+        return responses
+
+    def _answer_scoring_candidates(self, item: dict) -> dict:
+        """
+        Returns the candidate of the item with the highest log-likelihood
+        after its prompt. The prompt is encoded once and all the candidates
+        are scored in one batched forward pass that reuses its KV cache.
+        Each candidate is followed by a period, so that no candidate is a
+        prefix of another (as e1 of e12).
+        """
+        candidates = item['candidates']
+        assert len(candidates) > 0, "There must be at least one candidate!"
+
+        tokenizer = self.pipeline.tokenizer
+        model = self.pipeline.model
+        device = self.pipeline.device
+
+        prompt_ids, prompt_logits, past_key_values = self._encode_prompt(item)
+        candidates_ids = [
+            tokenizer(f" {candidate}.", add_special_tokens=False)['input_ids']
+            for candidate in candidates
+        ]
+        max_len = max(len(candidate_ids) for candidate_ids in candidates_ids)
+        input_ids = torch.full((len(candidates), max_len),
+                               tokenizer.eos_token_id,
+                               dtype=torch.long)
+        candidates_mask = torch.zeros((len(candidates), max_len),
+                                      dtype=torch.long)
+        for candidate_id, candidate_ids in enumerate(candidates_ids):
+            input_ids[candidate_id, :len(candidate_ids)] = torch.tensor(
+                candidate_ids)
+            candidates_mask[candidate_id, :len(candidate_ids)] = 1
+
+        with torch.no_grad():
+            past_key_values.batch_repeat_interleave(len(candidates))
+            attention_mask = torch.cat([
+                torch.ones((len(candidates), len(prompt_ids)),
+                           dtype=torch.long), candidates_mask
+            ],
+                                       dim=1)
+            outputs = model(input_ids=input_ids.to(device),
+                            attention_mask=attention_mask.to(device),
+                            past_key_values=past_key_values,
+                            use_cache=True)
+
+        # The logits of every candidate token are at the previous position,
+        # which for the first one is the last token of the prompt
+        logits = torch.cat([
+            prompt_logits.view(1, 1, -1).expand(len(candidates), -1, -1),
+            outputs.logits[:, :-1]
+        ],
+                           dim=1).float()
+        log_probs = torch.log_softmax(logits, dim=-1).cpu()
+        token_log_probs = log_probs.gather(2, input_ids.unsqueeze(2)).squeeze(2)
+        scores = (token_log_probs * candidates_mask).sum(dim=1)
+
+        best = int(scores.argmax())
+        return {'answer': candidates[best], 'score': float(scores[best])}
+
+    def _get_context_cache(self, context: str) -> tuple[list[int], Cache]:
+        """
+        Returns the token ids of the prefix of the prompts with the context
+        and its past key values, which must not be modified. The latest
+        contexts are cached, so the questions of the same graph reuse them.
+        """
+        if context in self._context_caches:
+            self._context_caches.move_to_end(context)
+            return self._context_caches[context]
+
+        prefix_ids = self.pipeline.tokenizer(
+            self.context_prefix_fmt.format(context))['input_ids']
+        with torch.no_grad():
+            outputs = self.pipeline.model(
+                input_ids=torch.tensor([prefix_ids],
+                                       device=self.pipeline.device),
+                use_cache=True)
+
+        self._context_caches[context] = (prefix_ids, outputs.past_key_values)
+        if len(self._context_caches) > self.n_cached_contexts:
+            self._context_caches.popitem(last=False)
+        return self._context_caches[context]
+
+    def _get_prompt_cache(
+            self, item: dict) -> tuple[list[int], Cache | None, int]:
+        """
+        Returns the token ids of the prompt of the item, a copy of the past
+        key values of its context and how many prompt tokens they cover.
+        If the context isn't reused or the prompt tokens don't start with
+        the ones of the context, there are no past key values.
+        """
+        prompt = self.prompt_fmt.format(item["context"], item["question"])
+        prompt_ids = self.pipeline.tokenizer(prompt)['input_ids']
+        if not self.reuse_context_cache:
+            return prompt_ids, None, 0
+
+        prefix_ids, prefix_cache = self._get_context_cache(item["context"])
+        if len(prefix_ids) >= len(
+                prompt_ids) or prompt_ids[:len(prefix_ids)] != prefix_ids:
+            return prompt_ids, None, 0
+
+        # The cache grows while used, so each prompt uses its own copy
+        return prompt_ids, copy.deepcopy(prefix_cache), len(prefix_ids)
+
+    def _encode_prompt(self, item: dict) -> tuple[list[int], torch.Tensor,
+                                                  Cache]:
+        """
+        Returns the token ids of the prompt of the item, the logits of its
+        next token and its past key values.
+        """
+        prompt_ids, past_key_values, n_cached = self._get_prompt_cache(item)
+        with torch.no_grad():
+            outputs = self.pipeline.model(
+                input_ids=torch.tensor([prompt_ids[n_cached:]],
+                                       device=self.pipeline.device),
+                past_key_values=past_key_values,
+                use_cache=True)
+        return prompt_ids, outputs.logits[0, -1], outputs.past_key_values
+
+    def _generate_reusing_context(self, item: dict, **kwargs) -> dict:
+        """
+        Generates the answer of the item as the pipeline, starting from the
+        past key values of its context.
+        """
+        tokenizer = self.pipeline.tokenizer
+        kwargs.setdefault(
+            'generation_config',
+            getattr(self.pipeline, 'generation_config',
+                    self.pipeline.model.generation_config))
+        prompt_ids, past_key_values, _ = self._get_prompt_cache(item)
+        input_ids = torch.tensor([prompt_ids], device=self.pipeline.device)
+        output_ids = self.pipeline.model.generate(
+            input_ids=input_ids,
+            attention_mask=torch.ones_like(input_ids),
+            past_key_values=past_key_values,
+            pad_token_id=tokenizer.eos_token_id,
+            temperature=0.1,  #Low temperature to keep things simple
+            stopping_criteria=self.stopping_criteria,
+            **kwargs)
+
+        answer = tokenizer.decode(output_ids[0, len(prompt_ids):],
+                                  skip_special_tokens=True)
+        return {"answer": answer.strip()}
+
+
+class HuggingFaceNLIModel(LLM):
+    """
+    This uses the text-classification pipeline from hugging face using the
+    provided model. The pipeline answers in batches of pipeline_batch_s
+    instances of similar length. On CPU, it can use n_threads and quantize
+    the model to int8 for speed. See _optimize_for_cpu.
+    """
+
+    def __init__(self,
+                 model_name="",
+                 device='cpu',
+                 pipeline_batch_s: int = 1,
+                 quantize: bool = False,
+                 n_threads: int = None,
+                 **kwargs):
+        super().__init__(model_name, **kwargs)
+        self.pipeline_batch_s = pipeline_batch_s
+        if 'ModernBERT' in model_name:
+            kwargs['model_kwargs'] = {"reference_compile": False}
+
+        self.pipeline = pipeline("text-classification",
+                                 model=self.model_name,
+                                 device=device,
+                                 **kwargs)
+        self.quantize = quantize
+        _optimize_for_cpu(self.pipeline, quantize, n_threads)
+
+    def cache_id(self) -> str:
+        if self.quantize:
+            return f"{super().cache_id()}:int8"
+        return super().cache_id()
+
+    def answer(self, data: list[dict[str, str]], **kwargs) -> list[dict]:
+        """
+        Data is a list of dict of instances. For this LLM, each dict must have 'question'
+        and 'context' keys. This allows for batched processing
+
+        Return a list of dicts of answers. Each dict has a 'answer' and 'score' keys.
+        """
+        premises = [item["context"] for item in data]
+        hypotheses = [item["question"] for item in data]
+
+        inputs = [{
+            'text': premise,
+            'text_pair': hypothesis
+        } for premise, hypothesis in zip(premises, hypotheses)]
+
+        lengths = [len(premise) + len(hypothesis)
+                   for premise, hypothesis in zip(premises, hypotheses)]
+        results = _run_in_length_buckets(self.pipeline, inputs, lengths,
+                                         self.pipeline_batch_s)
+
+        results = [{
+            'answer': result['label'],
+            'score': result['score']
+        } for result in results]
+
+        return results
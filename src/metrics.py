@@ -0,0 +1,195 @@
+from contextlib import contextmanager
+import csv
+import json
+import math
+import pathlib
+from timeit import default_timer as timer
+
+# Counters whose rate per second is part of the summary
+THROUGHPUT_COUNTERS = [
+    'instances', 'requests', 'prompt_tokens', 'completion_tokens'
+]
+
+PERCENTILES = [50, 90, 99]
+
+
+def _nearest_rank(sorted_values: list[float], percentile: float) -> float:
+    """
+    Returns the percentile of the sorted values with the nearest-rank method
+    """
+    rank = math.ceil(percentile / 100 * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
+
+
+class Histogram():
+    """
+    Keeps every observed value, such as the seconds of a stage, to
+    summarize them with their count, total, mean, extremes and percentiles.
+    """
+
+    def __init__(self, values: list[float] = None):
+        self.values: list[float] = values if values is not None else list()
+        self.total = sum(self.values)
+
+    def observe(self, value: float):
+        self.values.append(value)
+        self.total += value
+
+    def extend(self, values: list[float]):
+        self.values.extend(values)
+        self.total += sum(values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def percentile(self, percentile: float) -> float:
+        assert len(self.values) > 0, "There are no values!"
+        return _nearest_rank(sorted(self.values), percentile)
+
+    def summary(self) -> dict:
+        if len(self.values) == 0:
+            return {'count': 0, 'total': 0.0}
+
+        sorted_values = sorted(self.values)
+        summary = {
+            'count': len(sorted_values),
+            'total': self.total,
+            'mean': self.total / len(sorted_values),
+            'min': sorted_values[0],
+            'max': sorted_values[-1]
+        }
+        for percentile in PERCENTILES:
+            summary[f'p{percentile}'] = _nearest_rank(sorted_values,
+                                                      percentile)
+        return summary
+
+
+class MetricsRegistry():
+    """
+    Collects histograms, such as the seconds of every stage, and counters,
+    such as the number of instances or tokens. When disabled, recording does
+    nothing, so it can be left in the code.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.histograms: dict[str, Histogram] = dict()
+        self.counters: dict[str, float] = dict()
+        self._start = timer()
+
+    def reset(self):
+        self.histograms = dict()
+        self.counters = dict()
+        self._start = timer()
+
+    def observe(self, name: str, value: float):
+        if self.enabled:
+            self.histograms.setdefault(name, Histogram()).observe(value)
+
+    def increment(self, name: str, value: float = 1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def time(self, name: str):
+        """
+        Observes the seconds taken by the block in the name histogram
+        """
+        if not self.enabled:
+            yield
+            return
+
+        start = timer()
+        try:
+            yield
+        finally:
+            self.observe(name, timer() - start)
+
+    def elapsed(self) -> float:
+        """
+        Seconds since this registry was created or reset
+        """
+        return timer() - self._start
+
+    def take_snapshot(self) -> dict:
+        """
+        Returns the raw values recorded since the last snapshot and clears
+        them. Used to send the metrics of a worker process to the main one.
+        See merge.
+        """
+        snapshot = {
+            'histograms': {
+                name: histogram.values
+                for name, histogram in self.histograms.items()
+            },
+            'counters': self.counters
+        }
+        self.histograms = dict()
+        self.counters = dict()
+        return snapshot
+
+    def merge(self, snapshot: dict):
+        if not self.enabled:
+            return
+
+        for name, values in snapshot['histograms'].items():
+            self.histograms.setdefault(name, Histogram()).extend(values)
+        for name, value in snapshot['counters'].items():
+            self.increment(name, value)
+
+    def summary(self, with_percentiles: bool = True) -> dict:
+        """
+        Returns the counters, the summary of every histogram and the
+        throughput per second of the THROUGHPUT_COUNTERS. Without
+        percentiles, histograms only have their count and total.
+        """
+        elapsed = self.elapsed()
+        histograms = dict()
+        for name, histogram in self.histograms.items():
+            if with_percentiles:
+                histograms[name] = histogram.summary()
+            else:
+                histograms[name] = {
+                    'count': len(histogram),
+                    'total': histogram.total
+                }
+
+        return {
+            'elapsed_s': elapsed,
+            'counters': dict(self.counters),
+            'histograms': histograms,
+            'throughput': {
+                f'{name}_per_s': self.counters[name] / elapsed
+                for name in THROUGHPUT_COUNTERS
+                if name in self.counters and elapsed > 0
+            }
+        }
+
+    def save(self, path: str):
+        """
+        Saves the summary as JSON or, if the path ends with .csv, as a csv
+        with one (metric, stat, value) row per value
+        """
+        path = pathlib.Path(path)
+        path.parent.mkdir(exist_ok=True, parents=True)
+        summary = self.summary()
+        if path.suffix != ".csv":
+            with open(path, 'w') as metrics_file:
+                json.dump(summary, metrics_file, indent=2)
+            return
+
+        with open(path, 'w', newline='') as metrics_file:
+            writer = csv.writer(metrics_file)
+            writer.writerow(['metric', 'stat', 'value'])
+            writer.writerow(['elapsed_s', 'value', summary['elapsed_s']])
+            for name, value in summary['counters'].items():
+                writer.writerow([name, 'count', value])
+            for name, stats in summary['histograms'].items():
+                for stat, value in stats.items():
+                    writer.writerow([name, stat, value])
+            for name, value in summary['throughput'].items():
+                writer.writerow([name, 'value', value])
+
+
+# The registry used across the project
+METRICS = MetricsRegistry()
@@ -0,0 +1,147 @@
+"""
+Renders the relations of a StarGraph as the fact lines of a context, in one
+of the registered orderings. An ordering yields the lines lazily and the
+context is joined once, so rendering is linear in the number of relations.
+New orderings are added with register_ordering.
+"""
+from collections.abc import Callable, Iterator
+import heapq
+import itertools
+import random
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from graph import Relation, StarGraph
+
+Ordering = Callable[..., Iterator[str]]
+
+# Ordering name -> function yielding the fact lines of a graph
+ORDERINGS: dict[str, Ordering] = dict()
+
+
+def register_ordering(name: str) -> Callable[[Ordering], Ordering]:
+    """
+    Registers the decorated function as the ordering with the name. It
+    receives the graph and, as keyword args, the rng of the random orderings
+    and must yield the fact lines.
+    """
+
+    def register(ordering: Ordering) -> Ordering:
+        assert name not in ORDERINGS, f"Ordering {name} is already registered!"
+        ORDERINGS[name] = ordering
+        return ordering
+
+    return register
+
+
+def fact_line(rel_name: str, relation: 'Relation') -> str:
+    return f"Relation {rel_name} with entity named {relation}"
+
+
+def render(graph: 'StarGraph', ordering: str, **kwargs) -> str:
+    """
+    Returns the fact lines of the graph in the ordering, one per line
+    """
+    if ordering not in ORDERINGS:
+        raise ValueError(ordering, "is not a valid value!")
+
+    return "\n".join(ORDERINGS[ordering](graph, **kwargs))
+
+
+def _round_robin(iterables: list[Iterator]) -> Iterator:
+    """
+    Yields the first item of every iterable, then the second ones and so on,
+    skipping the iterables already exhausted
+    """
+    exhausted = object()
+    for items in itertools.zip_longest(*iterables, fillvalue=exhausted):
+        for item in items:
+            if item is not exhausted:
+                yield item
+
+
+@register_ordering('as_is')
+def iter_as_is(graph: 'StarGraph', **kwargs) -> Iterator[str]:
+    """
+    The relations of every type, sorted by name, in the order they were added
+    """
+    for rel_name in sorted(graph.relations_map):
+        for relation in graph.relations_map[rel_name]:
+            yield fact_line(rel_name, relation)
+
+
+@register_ordering('shuffle')
+def iter_shuffled(graph: 'StarGraph',
+                  rng: random.Random = None,
+                  **kwargs) -> Iterator[str]:
+    """
+    The relations in random order. Without rng, a new random generator is
+    used.
+    """
+    lines = list(iter_as_is(graph))
+    (rng if rng is not None else random.Random()).shuffle(lines)
+    yield from lines
+
+
+def iter_interleaved(
+        graph: 'StarGraph',
+        ascending: bool = True) -> Iterator[tuple[str, 'Relation']]:
+    """
+    Yields the (relation name, relation) of the first relation of every type,
+    sorted by name, then of the second ones and so on. The relations of a
+    type are sorted by date in the ascending or descending order.
+    """
+    yield from _round_robin([
+        zip(itertools.repeat(rel_name), relations.sorted(ascending))
+        for rel_name, relations in sorted(graph.relations_map.items())
+    ])
+
+
+@register_ordering('interleave_asc')
+def iter_interleaved_asc(graph: 'StarGraph', **kwargs) -> Iterator[str]:
+    for rel_name, relation in iter_interleaved(graph, True):
+        yield fact_line(rel_name, relation)
+
+
+@register_ordering('interleave_desc')
+def iter_interleaved_desc(graph: 'StarGraph', **kwargs) -> Iterator[str]:
+    for rel_name, relation in iter_interleaved(graph, False):
+        yield fact_line(rel_name, relation)
+
+
+@register_ordering('latest')
+def iter_latest(graph: 'StarGraph', **kwargs) -> Iterator[str]:
+    """
+    Only the latest relation of every type, sorted by name
+    """
+    for rel_name in sorted(graph.relations_map):
+        latest = graph.relations_map[rel_name].latest()
+        if latest is not None:
+            yield fact_line(rel_name, latest)
+
+
+def iter_chronological(graph: 'StarGraph',
+                       ascending: bool = True) -> Iterator[str]:
+    """
+    The relations of every type merged by start date, in the ascending or
+    descending order
+    """
+    sorted_relations = [[(relation.date_interval.start, rel_name, relation)
+                         for relation in relations.sorted(ascending)]
+                        for rel_name, relations in sorted(
+                            graph.relations_map.items())]
+    merged = heapq.merge(*sorted_relations,
+                         key=lambda item: item[:2],
+                         reverse=not ascending)
+    for _, rel_name, relation in merged:
+        yield fact_line(rel_name, relation)
+
+
+@register_ordering('chronological_asc')
+def iter_chronological_asc(graph: 'StarGraph', **kwargs) -> Iterator[str]:
+    yield from iter_chronological(graph, True)
+
+
+@register_ordering('chronological_desc')
+def iter_chronological_desc(graph: 'StarGraph', **kwargs) -> Iterator[str]:
+    yield from iter_chronological(graph, False)
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import pathlib
+import sqlite3
+
+# Max number of keys in a single SQLite query
+_QUERY_CHUNK_SIZE = 500
+
+
+class ResponseCache():
+    """
+    On-disk cache of LLM responses stored in a SQLite database. Responses are
+    keyed by a hash of the model, the instance and the generation params.
+    When it has more than max_entries, the least recently used responses are
+    evicted. It counts its hits and misses.
+    """
+
+    def __init__(self, path: str, max_entries: int = 1000000):
+        assert max_entries > 0, f"max_entries must be positive but {max_entries} was given!"
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._connection = sqlite3.connect(self.path)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, "
+                "response TEXT NOT NULL, "
+                "last_used INTEGER NOT NULL)")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_used "
+                "ON responses (last_used)")
+        # Logical clock used to know which responses were used last
+        self._clock = self._connection.execute(
+            "SELECT COALESCE(MAX(last_used), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(model_id: str, instance: dict, params: dict) -> str:
+        """
+        Returns the key of the response of the model with model_id to the
+        instance using the generation params
+        """
+        content = json.dumps([model_id, instance, params],
+                             sort_keys=True,
+                             default=str)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def get_many(self, keys: list[str]) -> dict[str, dict]:
+        """
+        Returns a dict with the cached response of every key found
+        """
+        found = dict()
+        unique_keys = list(dict.fromkeys(keys))
+        for chunk_start in range(0, len(unique_keys), _QUERY_CHUNK_SIZE):
+            chunk = unique_keys[chunk_start:chunk_start + _QUERY_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._connection.execute(
+                f"SELECT key, response FROM responses WHERE key IN ({placeholders})",
+                chunk)
+            found.update(
+                {key: json.loads(response)
+                 for key, response in rows})
+
+        if len(found) > 0:
+            self._clock += 1
+            with self._connection:
+                self._connection.executemany(
+                    "UPDATE responses SET last_used = ? WHERE key = ?",
+                    [(self._clock, key) for key in found])
+
+        n_hits = sum(1 for key in keys if key in found)
+        self.hits += n_hits
+        self.misses += len(keys) - n_hits
+        return found
+
+    def put_many(self, responses: dict[str, dict]):
+        """
+        Saves the responses, keyed by their keys. It evicts the least
+        recently used responses if the cache gets too big.
+        """
+        if len(responses) == 0:
+            return
+
+        self._clock += 1
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO responses (key, response, last_used) "
+                "VALUES (?, ?, ?)",
+                [(key, json.dumps(response), self._clock)
+                 for key, response in responses.items()])
+            self._evict()
+
+    def _evict(self):
+        n_entries = self._connection.execute(
+            "SELECT COUNT(*) FROM responses").fetchone()[0]
+        if n_entries > self.max_entries:
+            self._connection.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                (n_entries - self.max_entries, ))
+
+    def __len__(self):
+        return self._connection.execute(
+            "SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def stats(self) -> dict:
+        """
+        Returns the hits, misses and hit rate of this cache
+        """
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total > 0 else 0.0
+        }
+
+    def close(self):
+        self._connection.close()
@@ -0,0 +1,294 @@
+from abc import ABC, abstractmethod
+import argparse
+import csv
+import os
+import pathlib
+import queue
+import shutil
+import threading
+
+# The columns of a result. score is None if the LLM doesn't give it and
+# latency_s are the seconds of the model call that answered the instance.
+RESULTS_COLUMNS = [
+    'graph_id', 'rel_name', 'expected', 'predicted', 'score', 'latency_s'
+]
+
+# The columns of the csv results, as they have always been saved
+CSV_COLUMNS = RESULTS_COLUMNS[:4]
+
+# Number of results buffered before a Parquet row group is written
+PARQUET_ROW_GROUP_SIZE = 10000
+
+# Max number of row groups waiting for the writer thread
+_PENDING_ROW_GROUPS = 4
+
+
+def _parquet_schema():
+    import pyarrow as pa
+
+    return pa.schema([('graph_id', pa.int64()), ('rel_name', pa.string()),
+                      ('expected', pa.string()), ('predicted', pa.string()),
+                      ('score', pa.float64()), ('latency_s', pa.float64())])
+
+
+def is_parquet(results_path: str) -> bool:
+    return pathlib.Path(results_path).suffix == ".parquet"
+
+
+class ResultsSink(ABC):
+    """
+    Saves the results of a run, one tuple with the RESULTS_COLUMNS per
+    instance. It must be closed to save everything.
+    """
+
+    @abstractmethod
+    def write(self, results: list[tuple]):
+        pass
+
+    @abstractmethod
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class CSVResultsSink(ResultsSink):
+    """
+    Saves the CSV_COLUMNS of the results in a csv. The fields are quoted when
+    needed, so answers can have commas and newlines. Every write is flushed,
+    so a halted run can be continued.
+    """
+
+    def __init__(self, results_path: str, append: bool = False):
+        self.results_path = pathlib.Path(results_path)
+        self.results_path.parent.mkdir(exist_ok=True, parents=True)
+        self._file = open(self.results_path,
+                          'a' if append else 'w',
+                          newline='')
+        self._writer = csv.writer(self._file)
+        if not append or self._file.tell() == 0:
+            self._writer.writerow(CSV_COLUMNS)
+
+    def write(self, results: list[tuple]):
+        self._writer.writerows(result[:len(CSV_COLUMNS)] for result in results)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def parquet_parts_path(results_path: str) -> pathlib.Path:
+    """
+    The directory with the row groups of the Parquet results that were saved
+    but not merged into them yet. See ParquetResultsSink.
+    """
+    results_path = pathlib.Path(results_path)
+    return results_path.with_name(results_path.name + ".parts")
+
+
+def _parquet_results_files(results_path: str) -> list[pathlib.Path]:
+    """
+    Returns the Parquet results file, if it exists, and its parts in the
+    order they were written
+    """
+    results_path = pathlib.Path(results_path)
+    files = [results_path] if results_path.exists() else list()
+    parts_path = parquet_parts_path(results_path)
+    if parts_path.exists():
+        files.extend(
+            sorted(parts_path.glob("*.parquet"),
+                   key=lambda part_path: int(part_path.stem)))
+    return files
+
+
+class ParquetResultsSink(ResultsSink):
+    """
+    Saves the results in a Parquet file with typed columns. They are buffered
+    in row groups of at least row_group_size, with whole writes, which are
+    saved by a background thread, so writing a batch only appends to the
+    buffer. Every row group is saved as a part file next to the results, and
+    the parts are merged into them on close, as Parquet files are immutable.
+    If a run halts, its saved row groups are read with the results and
+    merged by the next run appending to them.
+    Needs pyarrow.
+    """
+
+    def __init__(self,
+                 results_path: str,
+                 append: bool = False,
+                 row_group_size: int = PARQUET_ROW_GROUP_SIZE):
+        assert row_group_size > 0, \
+            f"row_group_size must be positive but {row_group_size} was given!"
+        self.results_path = pathlib.Path(results_path)
+        self.results_path.parent.mkdir(exist_ok=True, parents=True)
+        self.row_group_size = row_group_size
+        self.append = append
+
+        # A halted merge leaves its temporary file, which is never complete
+        self._tmp_path = self.results_path.with_name(self.results_path.name +
+                                                     ".tmp")
+        self._tmp_path.unlink(missing_ok=True)
+        self._parts_path = parquet_parts_path(self.results_path)
+        if not append:
+            # As a csv opened to write, the previous results are discarded
+            self.results_path.unlink(missing_ok=True)
+            shutil.rmtree(self._parts_path, ignore_errors=True)
+        self._parts_path.mkdir(exist_ok=True)
+        # The parts of a halted run are kept before the new ones
+        self._n_parts = max(
+            (int(part_path.stem)
+             for part_path in self._parts_path.glob("*.parquet")),
+            default=-1) + 1
+
+        self._buffer: list[tuple] = list()
+        self._pending = queue.Queue(maxsize=_PENDING_ROW_GROUPS)
+        self._error: BaseException = None
+        self._thread = threading.Thread(target=self._write_row_groups,
+                                        daemon=True)
+        self._thread.start()
+
+    def _write_row_groups(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        while True:
+            rows = self._pending.get()
+            if rows is None:
+                return
+            if self._error is not None:
+                continue
+
+            try:
+                schema = _parquet_schema()
+                columns = [
+                    pa.array(column, type=field.type)
+                    for column, field in zip(zip(*rows), schema)
+                ]
+                # A part is only complete once it is renamed
+                part_path = self._parts_path / f"{self._n_parts}.parquet"
+                part_tmp_path = part_path.with_name(part_path.name + ".tmp")
+                pq.write_table(pa.Table.from_arrays(columns, schema=schema),
+                               str(part_tmp_path))
+                os.replace(part_tmp_path, part_path)
+                self._n_parts += 1
+            except BaseException as e:
+                self._error = e
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise RuntimeError(
+                f"Couldn't write the results to {self.results_path}!"
+            ) from self._error
+
+    def write(self, results: list[tuple]):
+        self._raise_error()
+        self._buffer.extend(results)
+        # Row groups have whole writes, so a halted run saved whole batches
+        if len(self._buffer) >= self.row_group_size:
+            self._pending.put(self._buffer)
+            self._buffer = list()
+
+    def _merge_parts(self):
+        """
+        Writes the results and their parts to a temporary file that replaces
+        the results, and removes the parts
+        """
+        import pyarrow.parquet as pq
+
+        with pq.ParquetWriter(str(self._tmp_path),
+                              _parquet_schema()) as writer:
+            for results_file in _parquet_results_files(self.results_path):
+                writer.write_table(pq.read_table(str(results_file)))
+        os.replace(self._tmp_path, self.results_path)
+        shutil.rmtree(self._parts_path)
+
+    def close(self):
+        if len(self._buffer) > 0:
+            self._pending.put(self._buffer)
+            self._buffer = list()
+        self._pending.put(None)
+        self._thread.join()
+        self._raise_error()
+        self._merge_parts()
+
+
+def open_results_sink(results_path: str, append: bool = False) -> ResultsSink:
+    """
+    Returns a ParquetResultsSink if the path ends with .parquet, else a
+    CSVResultsSink
+    """
+    if is_parquet(results_path):
+        return ParquetResultsSink(results_path, append)
+    return CSVResultsSink(results_path, append)
+
+
+def read_results_columns(results_path: str,
+                         columns: list[str] = None) -> dict[str, list]:
+    """
+    Returns the values of the columns of the results, by default all of them.
+    Only the requested columns are read from Parquet files, along with the
+    row groups saved by a halted run. The values of csv results are strings.
+    """
+    if is_parquet(results_path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        results_files = _parquet_results_files(results_path)
+        assert len(results_files) > 0, f"{results_path} doesn't exist!"
+        return pa.concat_tables(
+            pq.read_table(str(results_file), columns=columns)
+            for results_file in results_files).to_pydict()
+
+    with open(results_path, 'r', newline='') as result_file:
+        reader = csv.reader(result_file)
+        header = next(reader)
+        columns = header if columns is None else columns
+        for column in columns:
+            assert column in header, f"{results_path} has no {column} column!"
+
+        column_ids = [header.index(column) for column in columns]
+        column_values = {column: list() for column in columns}
+        n_columns = len(header)
+        for row in reader:
+            if len(row) > n_columns:
+                # Old results didn't quote the predictions with commas
+                row = row[:n_columns - 1] + [",".join(row[n_columns - 1:])]
+            for column, column_id in zip(columns, column_ids):
+                column_values[column].append(row[column_id])
+        return column_values
+
+
+def export_csv(results_path: str, csv_path: str):
+    """
+    Saves the results, such as a Parquet file, as a csv results file
+    """
+    results = read_results_columns(results_path, CSV_COLUMNS)
+    with CSVResultsSink(csv_path) as sink:
+        sink.write(list(zip(*results.values())))
+
+
+def config_argparser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Exports the results of a run as a csv")
+
+    parser.add_argument("--results_path",
+                        type=str,
+                        required=True,
+                        help="The results, such as a Parquet file")
+
+    parser.add_argument("--csv_path",
+                        type=str,
+                        required=True,
+                        help="Where to save the csv")
+
+    return parser
+
+
+if __name__ == "__main__":
+    args = config_argparser().parse_args()
+
+    export_csv(args.results_path, args.csv_path)
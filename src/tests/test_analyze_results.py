@@ -0,0 +1,67 @@
+import pathlib
+import tempfile
+from unittest import main, TestCase
+
+import numpy as np
+
+from analyze_results import (bootstrap_accuracy, load_reduced_results,
+                             load_runs, parse_run_name, report)
+
+
+class TestAnalyzeResults(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_path = pathlib.Path(self.tmp_dir.name)
+        self.results_path = self.tmp_path / "model_a_interleave_asc_results.txt"
+        self.results_path.write_text("graph_id,rel_name,expected,predicted\n"\
+                                     "0,r0,e1,e1\n0,r1,e2,\n1,r0,e3,e3\n")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_parse_run_name(self):
+        self.assertEqual(('model_a', 'interleave_asc'),
+                         parse_run_name(self.results_path))
+        self.assertEqual(('model_a', 'as_is'),
+                         parse_run_name("model_a_as_is_results.parquet"))
+        self.assertEqual(('other', ''), parse_run_name("other.csv"))
+
+    def test_reduced_results_are_cached(self):
+        cache_dir = self.tmp_path / "cache"
+        graphs = load_reduced_results(self.results_path, cache_dir)
+        self.assertEqual([2, 1], graphs['n_instances'].tolist())
+        self.assertEqual([1, 1], graphs['n_correct'].tolist())
+        self.assertEqual(1, len(list(cache_dir.iterdir())))
+
+        cached_graphs = load_reduced_results(self.results_path, cache_dir)
+        self.assertEqual(graphs.to_dict('list'), cached_graphs.to_dict('list'))
+
+    def test_report(self):
+        runs = load_runs([self.results_path])
+        accuracy_report = report(runs, n_bootstrap=100)
+
+        overall = accuracy_report[accuracy_report['group_by'] == 'all']
+        self.assertEqual(1, len(overall))
+        self.assertAlmostEqual(2 / 3, overall['accuracy'].iloc[0])
+        self.assertEqual([1, 2],
+                         accuracy_report[accuracy_report['group_by'] ==
+                                         'relations']['group'].tolist())
+
+    def test_bootstrap_interval(self):
+        n_instances = np.full(50, 10)
+        n_correct = np.arange(50) % 11
+        accuracy = n_correct.sum() / n_instances.sum()
+
+        low, high = bootstrap_accuracy(n_instances, n_correct,
+                                       rng=np.random.default_rng(0))
+        self.assertLess(low, accuracy)
+        self.assertGreater(high, accuracy)
+        self.assertEqual((low, high),
+                         bootstrap_accuracy(n_instances,
+                                            n_correct,
+                                            rng=np.random.default_rng(0)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+from datetime import datetime
+from unittest import main, TestCase
+
+import numpy as np
+
+from array_graph import ArrayStarGraph
+from graph import StarGraph, Relation, DateInterval
+
+
+class TestArrayStarGraph(TestCase):
+
+    def _get_graph_with_relations_of_2_types(self) -> StarGraph:
+        rel_to_relations = {
+            'r2': [
+                Relation(
+                    'e4',
+                    DateInterval(datetime(2030, 5, 6), datetime(2031, 7, 29))),
+                Relation(
+                    'e5',
+                    DateInterval(datetime(2005, 4, 15), datetime(2009, 3, 2))),
+                Relation(
+                    'e6',
+                    DateInterval(datetime(2022, 3, 19), datetime(2029, 4, 6)))
+            ],
+            'r1': [
+                Relation(
+                    'e1',
+                    DateInterval(datetime(2000, 5, 6), datetime(2001, 5, 6))),
+                Relation(
+                    'e3',
+                    DateInterval(datetime(2002, 6, 6), datetime(2003, 5, 6))),
+                Relation(
+                    'e2',
+                    DateInterval(datetime(2001, 6, 6), datetime(2002, 5, 6)))
+            ]
+        }
+        graph = StarGraph()
+        for rel_name, rels in rel_to_relations.items():
+            for rel in rels:
+                graph.add_edge(rel_name, rel)
+        return graph
+
+    def test_from_star_graph(self):
+        graph = self._get_graph_with_relations_of_2_types()
+        array_graph = ArrayStarGraph.from_star_graph(graph)
+
+        self.assertEqual(6, len(array_graph))
+        self.assertEqual(6, array_graph.n_relations())
+        self.assertEqual(2, array_graph.n_relation_types())
+        self.assertEqual(3, array_graph.n_nodes_for_relation('r1'))
+        self.assertEqual(0, array_graph.n_nodes_for_relation('j9'))
+        self.assertEqual(graph, array_graph.to_star_graph())
+
+    def test_empty_graph(self):
+        array_graph = ArrayStarGraph()
+
+        self.assertEqual(0, len(array_graph))
+        self.assertEqual(list(), array_graph.to_list())
+        self.assertDictEqual(dict(), array_graph.get_all_latest())
+        self.assertDictEqual(dict(), array_graph.to_dict())
+
+    def test_to_dict_matches_star_graph(self):
+        graph = self._get_graph_with_relations_of_2_types()
+        array_graph = ArrayStarGraph.from_star_graph(graph)
+
+        self.assertDictEqual(graph.to_dict(), array_graph.to_dict())
+        self.assertEqual(list(graph.to_dict().keys()),
+                         list(array_graph.to_dict().keys()))
+
+    def test_from_dict(self):
+        graph = self._get_graph_with_relations_of_2_types()
+        array_graph = ArrayStarGraph.from_dict(graph.to_dict())
+
+        self.assertEqual(ArrayStarGraph.from_star_graph(graph), array_graph)
+
+    def test_get_all_latest(self):
+        graph = self._get_graph_with_relations_of_2_types()
+        array_graph = ArrayStarGraph.from_star_graph(graph)
+
+        self.assertDictEqual(graph.get_all_latest(),
+                             array_graph.get_all_latest())
+        self.assertEqual(graph.get_all_latest_str(),
+                         array_graph.get_all_latest_str())
+
+    def test_renders_as_star_graph(self):
+        graph = self._get_graph_with_relations_of_2_types()
+        array_graph = ArrayStarGraph.from_star_graph(graph)
+
+        self.assertEqual(str(graph), str(array_graph))
+        self.assertEqual(graph.get_shuffled_str(42),
+                         array_graph.get_shuffled_str(42))
+        self.assertEqual(graph.get_interleaved_list(True),
+                         array_graph.get_interleaved_list(True))
+        self.assertEqual(graph.get_interleaved_list(False),
+                         array_graph.get_interleaved_list(False))
+
+    def test_not_equal_if_dates_differ(self):
+        graph = self._get_graph_with_relations_of_2_types()
+        array_graph = ArrayStarGraph.from_star_graph(graph)
+        other = ArrayStarGraph.from_star_graph(graph)
+        other.ends = other.ends.copy()
+        other.ends[0] += 1
+
+        self.assertNotEqual(array_graph, other)
+
+
+class TestGenerateStarGraphs(TestCase):
+
+    def _generate(self, seed: int) -> list[ArrayStarGraph]:
+        entities = [f'e{i}' for i in range(1, 30)]
+        relations = [f'r{i}' for i in range(10)]
+        return ArrayStarGraph.generate_star_graphs(
+            50, entities, relations, 2000, 2005, np.random.default_rng(seed))
+
+    def test_generates_valid_graphs(self):
+        for graph in self._generate(42):
+            star_graph = graph.to_star_graph()
+            # No relation is dropped for overlapping with another one
+            self.assertEqual(len(graph), len(star_graph))
+            self.assertEqual(graph.n_relation_types(),
+                             star_graph.n_relation_types())
+            self.assertEqual(list(graph.relation_names),
+                             list(star_graph.relations_map.keys()))
+            self.assertEqual(len(graph.entity_names),
+                             len(set(graph.entity_names)))
+            for relation in star_graph.get_all_latest().values():
+                self.assertGreaterEqual(relation.date_interval.start.year,
+                                        2000)
+                self.assertLess(relation.date_interval.end.year, 2005)
+
+    def test_same_seed_same_graphs(self):
+        self.assertEqual(self._generate(7), self._generate(7))
+        self.assertNotEqual(self._generate(7), self._generate(8))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import pathlib
+import tempfile
+from unittest import main, TestCase
+from unittest.mock import patch
+
+from context_store import (load_context_store, prepare,
+                           render_graph_contexts)
+from dataset import DatasetWriter
+import eval_model
+from eval_model import get_eval_pair
+from generate_dataset import generate
+
+
+class TestContextStore(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data_path = pathlib.Path(self.tmp_dir.name) / "dataset.jsonl"
+        self.write_graphs(10, seed=0)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_graphs(self, n_graphs: int, seed: int):
+        entities = [f'e{i}' for i in range(1, 12)]
+        relations = [f'r{i}' for i in range(4)]
+        with DatasetWriter(self.data_path) as writer:
+            writer.write_all(
+                generate(n_graphs, entities, relations, 2000, 2025, seed))
+
+    def get_instances(self, **kwargs) -> list:
+        return [
+            instance for batch in get_eval_pair(
+                self.data_path, batch_s=3, **kwargs) for instance in batch
+        ]
+
+    def test_same_instances_as_the_dataset(self):
+        context_store = prepare(self.data_path, ['as_is', 'interleave_desc'])
+        for relations_order in ['as_is', 'interleave_desc']:
+            self.assertEqual(
+                self.get_instances(relations_order=relations_order,
+                                   start_instance=5),
+                self.get_instances(relations_order=relations_order,
+                                   start_instance=5,
+                                   context_store=context_store))
+
+        with self.assertRaises(AssertionError):
+            self.get_instances(relations_order='latest',
+                               context_store=context_store)
+        context_store.close()
+
+    def test_shuffle_is_fixed_by_seed(self):
+        prepare(self.data_path, ['shuffle'], seed=1).close()
+        context_store = load_context_store(self.data_path)
+        instances = self.get_instances(relations_order='shuffle',
+                                       context_store=context_store)
+        context_store.close()
+
+        context_store = prepare(self.data_path, ['shuffle'], seed=1)
+        self.assertEqual(
+            instances,
+            self.get_instances(relations_order='shuffle',
+                               context_store=context_store))
+        context_store.close()
+
+    def test_stale_store_isnt_loaded(self):
+        prepare(self.data_path, ['as_is']).close()
+        self.write_graphs(1, seed=1)
+        self.assertIsNone(load_context_store(self.data_path))
+
+    def test_skipped_graphs_arent_rendered(self):
+        instances = self.get_instances()
+        # It starts in the second instance of the last graph
+        last_graph_id = instances[-1].graph_id
+        start_instance = next(idx for idx, instance in enumerate(instances)
+                              if instance.graph_id == last_graph_id) + 1
+
+        with patch.object(eval_model,
+                          'render_graph_contexts',
+                          wraps=render_graph_contexts) as render:
+            self.assertEqual(instances[start_instance:],
+                             self.get_instances(start_instance=start_instance))
+        self.assertEqual(1, render.call_count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import json
+import os
+import pathlib
+import tempfile
+from unittest import main, TestCase
+from unittest.mock import patch
+
+import dataset
+from dataset import (DatasetManifest, DatasetWriter, build_manifest,
+                     is_legacy_dataset, iter_graphs_dicts, load_manifest,
+                     manifest_path)
+
+
+class TestDataset(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data_path = pathlib.Path(self.tmp_dir.name) / "dataset.jsonl"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def get_graphs_dicts(self, n_graphs: int) -> list[dict]:
+        return [{
+            f'r{graph_id}': {
+                'rel_name':
+                f'r{graph_id}',
+                'relations': [{
+                    'name': 'e1',
+                    'date_interval': {
+                        'start_date': '06-05-2000',
+                        'end_date': '06-05-2001'
+                    }
+                }]
+            }
+        } for graph_id in range(n_graphs)]
+
+    def test_write_and_read(self):
+        graphs_dicts = self.get_graphs_dicts(3)
+        with DatasetWriter(self.data_path) as writer:
+            writer.write_all(graphs_dicts)
+
+        self.assertFalse(is_legacy_dataset(self.data_path))
+        self.assertEqual(graphs_dicts, list(iter_graphs_dicts(self.data_path)))
+
+    def test_append_keeps_dataset_valid(self):
+        graphs_dicts = self.get_graphs_dicts(4)
+        with DatasetWriter(self.data_path) as writer:
+            writer.write_all(graphs_dicts[:2])
+        with DatasetWriter(self.data_path) as writer:
+            writer.write_all(graphs_dicts[2:])
+
+        self.assertEqual(graphs_dicts, list(iter_graphs_dicts(self.data_path)))
+
+    def test_append_to_file_without_final_newline(self):
+        graphs_dicts = self.get_graphs_dicts(2)
+        self.data_path.write_text(json.dumps(graphs_dicts[0]))
+        with DatasetWriter(self.data_path) as writer:
+            writer.write(graphs_dicts[1])
+
+        self.assertEqual(graphs_dicts, list(iter_graphs_dicts(self.data_path)))
+
+    def test_read_legacy_dataset(self):
+        graphs_dicts = self.get_graphs_dicts(20)
+        self.data_path.write_text(json.dumps(graphs_dicts, indent=2))
+
+        self.assertTrue(is_legacy_dataset(self.data_path))
+        # A small chunk size forces graphs to be split between chunks
+        with patch.object(dataset, 'LEGACY_CHUNK_SIZE', 7):
+            self.assertEqual(graphs_dicts,
+                             list(iter_graphs_dicts(self.data_path)))
+
+    def test_read_empty_legacy_dataset(self):
+        self.data_path.write_text("[]")
+        self.assertEqual(list(), list(iter_graphs_dicts(self.data_path)))
+
+    def test_raise_invalid_legacy_dataset(self):
+        self.data_path.write_text(json.dumps(self.get_graphs_dicts(2))[:-20])
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_graphs_dicts(self.data_path))
+
+    def test_cant_append_to_legacy_dataset(self):
+        self.data_path.write_text(json.dumps(self.get_graphs_dicts(2)))
+        with self.assertRaises(ValueError):
+            DatasetWriter(self.data_path)
+
+
+class TestDatasetManifest(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data_path = pathlib.Path(self.tmp_dir.name) / "dataset.jsonl"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def get_graph_dict(self, n_relation_types: int) -> dict:
+        return {
+            f'r{rel_id}': {
+                'rel_name':
+                f'r{rel_id}',
+                'relations': [{
+                    'name': 'e1',
+                    'date_interval': {
+                        'start_date': '06-05-2000',
+                        'end_date': '06-05-2001'
+                    }
+                }, {
+                    'name': 'e2',
+                    'date_interval': {
+                        'start_date': '06-05-2002',
+                        'end_date': '06-05-2003'
+                    }
+                }]
+            }
+            for rel_id in range(n_relation_types)
+        }
+
+    def test_writer_saves_manifest(self):
+        graphs_dicts = [self.get_graph_dict(n) for n in (2, 3, 1)]
+        with DatasetWriter(self.data_path) as writer:
+            writer.write_all(graphs_dicts[:2])
+        with DatasetWriter(self.data_path) as writer:
+            writer.write(graphs_dicts[2])
+
+        manifest = load_manifest(self.data_path)
+        self.assertEqual(3, manifest.n_graphs())
+        self.assertEqual([2, 3, 1], manifest.n_relation_types)
+        self.assertEqual([4, 6, 2], manifest.n_edges)
+        self.assertEqual(
+            build_manifest(self.data_path).to_dict(), manifest.to_dict())
+        for graph_id, offset in enumerate(manifest.offsets):
+            self.assertEqual(
+                graphs_dicts[graph_id],
+                next(iter_graphs_dicts(self.data_path, offset)))
+
+    def test_stale_manifest_is_not_loaded(self):
+        with DatasetWriter(self.data_path) as writer:
+            writer.write(self.get_graph_dict(2))
+        with open(self.data_path, 'a') as data_file:
+            data_file.write(json.dumps(self.get_graph_dict(1)) + "\n")
+
+        self.assertIsNone(load_manifest(self.data_path))
+
+    def test_fresh_manifest_isnt_hashed(self):
+        with DatasetWriter(self.data_path) as writer:
+            writer.write(self.get_graph_dict(2))
+
+        with patch.object(dataset, '_hash_file',
+                          wraps=dataset._hash_file) as hash_file:
+            self.assertIsNotNone(load_manifest(self.data_path))
+            self.assertEqual(0, hash_file.call_count)
+
+            # Touching the dataset doesn't change its content
+            stat = self.data_path.stat()
+            os.utime(self.data_path,
+                     ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            self.assertIsNotNone(load_manifest(self.data_path))
+            self.assertEqual(1, hash_file.call_count)
+
+            # The manifest was saved with the new modification time
+            self.assertIsNotNone(load_manifest(self.data_path))
+            self.assertEqual(1, hash_file.call_count)
+
+    def test_modified_dataset_is_detected(self):
+        with DatasetWriter(self.data_path) as writer:
+            writer.write(self.get_graph_dict(2))
+        stat = self.data_path.stat()
+        # The same size, but a different content
+        content = self.data_path.read_bytes().replace(b"r0", b"r9")
+        self.data_path.write_bytes(content)
+        os.utime(self.data_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+        self.assertIsNone(load_manifest(self.data_path))
+
+    def test_old_manifest_is_hashed(self):
+        with DatasetWriter(self.data_path) as writer:
+            writer.write(self.get_graph_dict(2))
+        manifest_dict = json.loads(manifest_path(self.data_path).read_text())
+        del manifest_dict['dataset_size'], manifest_dict['dataset_mtime_ns']
+        manifest_path(self.data_path).write_text(json.dumps(manifest_dict))
+
+        with patch.object(dataset, '_hash_file',
+                          wraps=dataset._hash_file) as hash_file:
+            self.assertIsNotNone(load_manifest(self.data_path))
+            self.assertEqual(1, hash_file.call_count)
+
+    def test_total_instances(self):
+        manifest = DatasetManifest()
+        for offset, n_relation_types in enumerate([2, 3, 1]):
+            manifest.add(offset, self.get_graph_dict(n_relation_types))
+
+        self.assertEqual(6, manifest.total_instances())
+        self.assertEqual(5, manifest.total_instances(n_graphs=2))
+        self.assertEqual(0, manifest.total_instances(n_graphs=0))
+        self.assertEqual(4, manifest.total_instances(n_instances=4))
+        self.assertEqual(2, manifest.total_instances(1, 4))
+
+    def test_locate_instance(self):
+        manifest = DatasetManifest()
+        for offset, n_relation_types in enumerate([2, 3, 1]):
+            manifest.add(offset, self.get_graph_dict(n_relation_types))
+
+        self.assertEqual((0, 0), manifest.locate_instance(0))
+        self.assertEqual((0, 1), manifest.locate_instance(1))
+        self.assertEqual((1, 0), manifest.locate_instance(2))
+        self.assertEqual((1, 2), manifest.locate_instance(4))
+        self.assertEqual((2, 0), manifest.locate_instance(5))
+        self.assertEqual((3, 0), manifest.locate_instance(6))
+
+
+if __name__ == "__main__":
+    main()
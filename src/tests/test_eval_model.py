@@ -0,0 +1,350 @@
+import functools
+import pathlib
+import re
+import tempfile
+from unittest import main, skipUnless, TestCase
+
+from benchmarks.bench_pipeline import run as run_pipeline_benchmark
+from benchmarks.bench_pipeline import write_dataset
+from eval_model import (compare_to_reference, DataInstance, _group_by_graphs,
+                        post_process_packed_responses, read_results, run)
+from evaluators import OracleLLM
+from results_sink import CSVResultsSink, read_results_columns
+from tests.test_results_sink import HAS_PYARROW
+import utils
+
+
+class TestGroupByGraphs(TestCase):
+
+    def get_batches(self, graphs_sizes: list[int],
+                    batch_s: int) -> list[list[DataInstance]]:
+        instances = [
+            DataInstance(graph_id, f'r{rel_id}', 'e1', '')
+            for graph_id, graph_size in enumerate(graphs_sizes)
+            for rel_id in range(graph_size)
+        ]
+        return [
+            instances[batch_start:batch_start + batch_s]
+            for batch_start in range(0, len(instances), batch_s)
+        ]
+
+    def test_groups_have_whole_graphs(self):
+        batches = self.get_batches([2, 3, 1, 4], 2)
+        groups = list(_group_by_graphs(batches, 3))
+
+        self.assertEqual([[0, 0, 1, 1, 1], [2, 3, 3, 3, 3]],
+                         [[instance.graph_id for instance in group]
+                          for group in groups])
+
+    def test_keeps_every_instance_in_order(self):
+        batches = self.get_batches([5, 1, 2], 3)
+        instances = [instance for batch in batches for instance in batch]
+
+        groups = list(_group_by_graphs(batches, 1))
+        self.assertEqual(3, len(groups))
+        self.assertEqual(instances,
+                         [instance for group in groups for instance in group])
+
+
+class TestRunWithOracle(TestCase):
+
+    def test_oracle_answers_every_instance(self):
+        for packed in [False, True]:
+            result = run_pipeline_benchmark([5], packed=packed, batch_s=4)[0]
+            self.assertGreater(result['n_instances'], 0)
+            self.assertEqual(1.0, result['accuracy'])
+
+
+class TestPostProcessPackedResponses(TestCase):
+
+    def setUp(self):
+        self.batch_data = [
+            DataInstance(0, 'r1', 'e1', ''),
+            DataInstance(0, 'r10', 'e2', ''),
+            DataInstance(1, 'r3', 'e15', '')
+        ]
+        self.groups = [[0, 1], [2]]
+
+    def get_predictions(self,
+                        answers: list[str],
+                        apply_regex: bool = True) -> list[str]:
+        results = post_process_packed_responses(
+            self.batch_data, self.groups,
+            [{'answer': answer} for answer in answers], apply_regex)
+        return [result[3] for result in results]
+
+    def test_plain_lines(self):
+        self.assertEqual(['e1', 'e2', 'e15'],
+                         self.get_predictions(["r10: e2\nr1: e1", "r3: e15"]))
+
+    def test_decorated_lines(self):
+        self.assertEqual(['e1', 'e2', 'e15'],
+                         self.get_predictions(
+                             ["- r1: e1\n* **r10**: **e2**", "1. `r3`: e15."]))
+        self.assertEqual(['e1', '**e2**', 'e15.'],
+                         self.get_predictions(
+                             ["- r1: e1\n**r10**: **e2**", "r3 : e15."],
+                             apply_regex=False))
+
+    def test_extra_prose(self):
+        answer = "Sure! The answers for r1, r10:\n\nr1: e1\nr10: e2\n"\
+            "Let me know if you need anything else."
+        self.assertEqual(['e1', 'e2', 'e15'],
+                         self.get_predictions(
+                             [answer, "The answer is\nr3: e15"]))
+
+    def test_duplicate_lines(self):
+        self.assertEqual(['e1', 'e2', 'e15'],
+                         self.get_predictions(
+                             ["r1: e1\nr10: e2\nr1: e7", "r3: e15\nr3: e4"]))
+
+    def test_missing_lines(self):
+        self.assertEqual(['e1', '', ''],
+                         self.get_predictions(["r1: e1\nr2: e2", "e15"]))
+
+
+class TestCompareToReference(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_path = pathlib.Path(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_results(self, name: str, results: list[tuple]) -> pathlib.Path:
+        results_path = self.tmp_path / name
+        with CSVResultsSink(results_path) as sink:
+            sink.write(results)
+        return results_path
+
+    def test_compares_shared_instances(self):
+        results_path = self.write_results("results.csv",
+                                          [(0, 'r0', 'e1', 'e1'),
+                                           (0, 'r1', 'e2', 'e3'),
+                                           (1, 'r0', 'e4', 'e4'),
+                                           (2, 'r0', 'e5', 'e5')])
+        # Graph 2 is only in the results and graph 3 in the reference
+        reference_path = self.write_results("reference.csv",
+                                            [(0, 'r0', 'e1', 'e1'),
+                                             (0, 'r1', 'e2', 'e2'),
+                                             (1, 'r0', 'e4', 'e6'),
+                                             (3, 'r0', 'e7', 'e8')])
+
+        comparison = compare_to_reference(results_path, reference_path)
+        self.assertEqual(3, comparison['n_instances'])
+        self.assertAlmostEqual(2 / 3, comparison['accuracy'])
+        self.assertAlmostEqual(2 / 3, comparison['reference_accuracy'])
+        self.assertAlmostEqual(0.0, comparison['accuracy_delta'])
+        self.assertAlmostEqual(1 / 3, comparison['agreement'])
+
+        comparison = compare_to_reference(results_path, results_path)
+        self.assertEqual(4, comparison['n_instances'])
+        self.assertEqual(1.0, comparison['agreement'])
+
+    def test_needs_shared_instances(self):
+        results_path = self.write_results("results.csv",
+                                          [(0, 'r0', 'e1', 'e1')])
+        reference_path = self.write_results("reference.csv",
+                                            [(1, 'r0', 'e1', 'e1')])
+        with self.assertRaises(AssertionError):
+            compare_to_reference(results_path, reference_path)
+
+
+class RecordingOracleLLM(OracleLLM):
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.batches_entries = list()
+
+    def answer(self, data: list[dict[str, str]], **kwargs) -> list[dict]:
+        self.batches_entries.append(data)
+        return super().answer(data, **kwargs)
+
+
+class HaltingOracleLLM(OracleLLM):
+    """
+    Halts the run, as a crash would, once it has answered n_calls batches
+    """
+
+    def __init__(self, n_calls: int, **kwargs):
+        super().__init__(**kwargs)
+        self.n_calls = n_calls
+
+    def answer(self, data: list[dict[str, str]], **kwargs) -> list[dict]:
+        if self.n_calls == 0:
+            raise RuntimeError("Halted")
+        self.n_calls -= 1
+        return super().answer(data, **kwargs)
+
+
+class CandidatesOracleLLM(RecordingOracleLLM):
+    """
+    Answers as the oracle, with the score a LLM scoring candidates gives
+    """
+
+    def answer(self, data: list[dict[str, str]], **kwargs) -> list[dict]:
+        responses = super().answer(data, **kwargs)
+        for response in responses:
+            response['score'] = -1.0
+        return responses
+
+
+class TestScoreCandidatesRun(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.work_path = pathlib.Path(self.tmp_dir.name)
+        self.data_path = self.work_path / "dataset.jsonl"
+        write_dataset(self.data_path, 3, 12, 5, seed=0)
+        self.print_enabled = utils.PRINT_ENABLED
+        utils.PRINT_ENABLED = False
+
+    def tearDown(self):
+        utils.PRINT_ENABLED = self.print_enabled
+        self.tmp_dir.cleanup()
+
+    @skipUnless(HAS_PYARROW, "pyarrow is not installed")
+    def test_candidates_are_the_graph_entities(self):
+        llm = CandidatesOracleLLM()
+        results_path = self.work_path / "results.parquet"
+        run(self.data_path,
+            llm,
+            results_path,
+            batch_s=4,
+            no_progress_bar=True,
+            score_candidates=True)
+
+        entries = [entry for batch in llm.batches_entries for entry in batch]
+        for entry in entries:
+            entities = re.findall(r"named (e[0-9]+)", entry['context'])
+            self.assertCountEqual(set(entities), entry['candidates'])
+
+        columns = read_results_columns(results_path,
+                                       ['expected', 'predicted', 'score'])
+        self.assertEqual(len(entries), len(columns['score']))
+        self.assertEqual(columns['expected'], columns['predicted'])
+        self.assertTrue(all(score == -1.0 for score in columns['score']))
+
+
+class TestPackedRun(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.work_path = pathlib.Path(self.tmp_dir.name)
+        self.data_path = self.work_path / "dataset.jsonl"
+        self.n_graphs = 6
+        write_dataset(self.data_path, self.n_graphs, 12, 5, seed=0)
+        self.print_enabled = utils.PRINT_ENABLED
+        utils.PRINT_ENABLED = False
+
+    def tearDown(self):
+        utils.PRINT_ENABLED = self.print_enabled
+        self.tmp_dir.cleanup()
+
+    def run_packed(self, **kwargs) -> RecordingOracleLLM:
+        llm = RecordingOracleLLM()
+        run(self.data_path,
+            llm,
+            self.work_path / "results.csv",
+            no_progress_bar=True,
+            packed=True,
+            **kwargs)
+        return llm
+
+    def test_one_entry_per_graph(self):
+        llm = self.run_packed()
+
+        entries = [entry for batch in llm.batches_entries for entry in batch]
+        self.assertEqual(self.n_graphs, len(entries))
+        self.assertEqual(self.n_graphs, len(llm.batches_entries))
+
+        results = read_results(self.work_path / "results.csv")
+        self.assertGreater(len(results), self.n_graphs)
+        self.assertTrue(
+            all(expected == predicted
+                for expected, predicted in results.values()))
+
+    def test_batches_have_whole_graphs(self):
+        llm = self.run_packed(batch_s=8)
+
+        entries = [entry for batch in llm.batches_entries for entry in batch]
+        self.assertEqual(self.n_graphs, len(entries))
+        self.assertLess(len(llm.batches_entries), self.n_graphs)
+
+    def test_resume_after_halt(self):
+        self.run_packed(batch_s=4)
+        results_path = self.work_path / "results.csv"
+        expected = results_path.read_text()
+
+        with self.assertRaises(RuntimeError):
+            run(self.data_path,
+                HaltingOracleLLM(2),
+                results_path,
+                batch_s=4,
+                no_progress_bar=True,
+                packed=True)
+        llm = self.run_packed(batch_s=4, starting_batch=2)
+
+        self.assertEqual(expected, results_path.read_text())
+        # The graphs of the saved batches aren't asked again
+        self.assertEqual(
+            self.n_graphs - 2,
+            sum(len(batch_entries) for batch_entries in llm.batches_entries))
+
+
+class TestWorkersRun(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.work_path = pathlib.Path(self.tmp_dir.name)
+        self.data_path = self.work_path / "dataset.jsonl"
+        write_dataset(self.data_path, 6, 12, 5, seed=0)
+        self.print_enabled = utils.PRINT_ENABLED
+        utils.PRINT_ENABLED = False
+
+    def tearDown(self):
+        utils.PRINT_ENABLED = self.print_enabled
+        self.tmp_dir.cleanup()
+
+    def run_in_workers(self, results_path: pathlib.Path, **kwargs):
+        run(self.data_path,
+            None,
+            results_path,
+            batch_s=8,
+            no_progress_bar=True,
+            workers=2,
+            llm_factory=functools.partial(OracleLLM),
+            **kwargs)
+
+    def test_same_results_as_one_worker(self):
+        expected_path = self.work_path / "expected.csv"
+        run(self.data_path,
+            OracleLLM(),
+            expected_path,
+            batch_s=8,
+            no_progress_bar=True)
+        results_path = self.work_path / "results.csv"
+        self.run_in_workers(results_path)
+
+        self.assertEqual(expected_path.read_text(), results_path.read_text())
+
+    def test_resume_after_halt(self):
+        expected_path = self.work_path / "expected.csv"
+        self.run_in_workers(expected_path)
+
+        # A halted run saved the first groups, of 2 graphs with 5 instances
+        results_path = self.work_path / "results.csv"
+        batch_metrics_path = self.work_path / "batch_metrics.jsonl"
+        self.run_in_workers(results_path,
+                            n_graphs=4,
+                            batch_metrics_path=batch_metrics_path)
+        n_saved_groups = len(batch_metrics_path.read_text().splitlines())
+        self.assertEqual(2, n_saved_groups)
+        self.run_in_workers(results_path, starting_batch=n_saved_groups)
+
+        self.assertEqual(expected_path.read_text(), results_path.read_text())
+
+
+if __name__ == "__main__":
+    main()
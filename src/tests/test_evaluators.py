@@ -0,0 +1,489 @@
+import copy
+import json
+import pathlib
+import tempfile
+from types import SimpleNamespace
+from unittest import main, TestCase
+from unittest.mock import patch
+
+import torch
+from transformers import (BertConfig, BertForQuestionAnswering,
+                          BertTokenizerFast, GPT2Config, GPT2LMHeadModel,
+                          GPT2TokenizerFast)
+from transformers.models.gpt2.tokenization_gpt2 import bytes_to_unicode
+
+from benchmarks.import_time import measure_import
+from evaluators import get_llm_class, OracleLLM
+from hf_evaluators import (_optimize_for_cpu, _run_in_length_buckets,
+                           _span_to_chars,
+                           HuggingFaceChatLLM,
+                           HuggingFaceQuestionAnsweringLLM, StopOnPeriod)
+from url_evaluators import URLLLM
+
+
+class TestLLMBackends(TestCase):
+
+    def test_get_llm_class(self):
+        self.assertIs(URLLLM, get_llm_class('local'))
+        with self.assertRaises(ValueError):
+            get_llm_class('other')
+
+    def test_eval_model_doesnt_import_backends(self):
+        self.assertEqual(list(),
+                         measure_import('eval_model')['slow_dependencies'])
+
+
+class TestURLLLMCacheId(TestCase):
+
+    def served_models(self, llm: URLLLM, model_ids: list[str]):
+        models = [SimpleNamespace(id=model_id) for model_id in model_ids]
+        return patch.object(llm.client.models, 'list', return_value=models)
+
+    def test_servers_dont_share_ids(self):
+        llm_a = URLLLM('', url="http://localhost:8000/v1")
+        llm_b = URLLLM('', url="http://localhost:8001/v1")
+        with self.served_models(llm_a, ['m1']), self.served_models(
+                llm_b, ['m1']):
+            self.assertNotEqual(llm_a.cache_id(), llm_b.cache_id())
+
+        self.assertNotEqual(
+            URLLLM('m1', url="http://localhost:8000/v1").cache_id(),
+            URLLLM('m1', url="http://localhost:8001/v1").cache_id())
+
+    def test_served_model_is_part_of_the_id(self):
+        llm_m1 = URLLLM('', url="http://localhost:8000/v1")
+        llm_m2 = URLLLM('', url="http://localhost:8000/v1")
+        with self.served_models(llm_m1, ['m1']) as list_models, \
+                self.served_models(llm_m2, ['m2']):
+            self.assertNotEqual(llm_m1.cache_id(), llm_m2.cache_id())
+            # The served models are only asked once
+            self.assertEqual(llm_m1.cache_id(), llm_m1.cache_id())
+            list_models.assert_called_once()
+
+    def test_named_model_doesnt_ask_the_server(self):
+        llm = URLLLM('m1', url="http://localhost:8000/v1")
+        with self.served_models(llm, ['m2']) as list_models:
+            self.assertIn('m1', llm.cache_id())
+            list_models.assert_not_called()
+
+
+class TestOracleLLM(TestCase):
+
+    def setUp(self):
+        self.context = "Facts:\n"\
+            "Relation r0 with entity named e1 in time interval 2001-01-01 to 2002-01-01\n"\
+            "Relation r0 with entity named e2 in time interval 2010-01-01 to 2011-01-01\n"\
+            "Relation r1 with entity named e3 in time interval 2005-01-01 to 2006-01-01"
+
+    def test_answers_latest_entity(self):
+        data = [{
+            'context': self.context,
+            'question': f"What is the entity with the latest relation {rel}?"
+        } for rel in ['r0', 'r1']]
+        self.assertEqual([{
+            'answer': 'e2'
+        }, {
+            'answer': 'e3'
+        }],
+                         OracleLLM().answer(data))
+
+    def test_answers_packed_questions(self):
+        data = [{
+            'context':
+            self.context,
+            'question':
+            "For each of the relations r0, r1, what is the entity with the latest relation?"
+        }]
+        self.assertEqual("r0: e2\nr1: e3",
+                         OracleLLM().answer(data)[0]['answer'])
+
+    def test_error_rate(self):
+        data = [{
+            'context': self.context,
+            'question': f"What is the entity with the latest relation r{i}?"
+        } for i in range(100)]
+        self.assertTrue(
+            all(response['answer'] != 'e2'
+                for response in OracleLLM(error_rate=1).answer(data)))
+        # The wrong answers only depend on the instances
+        self.assertEqual(
+            OracleLLM(error_rate=0.5).answer(data),
+            OracleLLM(error_rate=0.5).answer(data))
+
+
+class FakeTokenizer():
+
+    def __init__(self, vocab: list[str]):
+        self.vocab = vocab
+
+    def __len__(self):
+        return len(self.vocab)
+
+    def batch_decode(self, sequences: list[list[int]], **kwargs) -> list[str]:
+        return [
+            "".join(self.vocab[token_id] for token_id in sequence)
+            for sequence in sequences
+        ]
+
+
+class TestStopOnPeriod(TestCase):
+
+    def setUp(self):
+        self.criteria = StopOnPeriod(
+            FakeTokenizer(["e1", ".", " date", "1.", ".5"]))
+
+    def test_period_tokens(self):
+        self.assertEqual([1, 3], self.criteria.period_token_ids.tolist())
+
+    def test_every_row_stops_on_its_own(self):
+        input_ids = torch.tensor([[0, 1], [1, 2], [2, 3], [0, 4]])
+        self.assertEqual([True, False, True, False],
+                         self.criteria(input_ids, None).tolist())
+
+
+class TestRunInLengthBuckets(TestCase):
+
+    def test_outputs_in_original_order(self):
+        seen_inputs = list()
+
+        def fake_pipeline(inputs, batch_size):
+            for text in inputs:
+                seen_inputs.append(text)
+                yield text.upper()
+
+        inputs = ["ccc", "a", "dddd", "bb"]
+        outputs = _run_in_length_buckets(fake_pipeline, inputs,
+                                         [len(text) for text in inputs], 2)
+
+        self.assertEqual(["a", "bb", "ccc", "dddd"], seen_inputs)
+        self.assertEqual(["CCC", "A", "DDDD", "BB"], outputs)
+
+
+class TestOptimizeForCPU(TestCase):
+
+    def setUp(self):
+        self.hf_pipeline = SimpleNamespace(model=torch.nn.Sequential(
+            torch.nn.Linear(8, 4), torch.nn.ReLU(), torch.nn.Linear(4, 2)),
+                                           device=torch.device('cpu'))
+        self.n_threads = torch.get_num_threads()
+
+    def tearDown(self):
+        torch.set_num_threads(self.n_threads)
+
+    def test_quantize_linear_layers(self):
+        inputs = torch.randn(3, 8)
+        expected = self.hf_pipeline.model(inputs)
+        _optimize_for_cpu(self.hf_pipeline, quantize=True)
+
+        linear_layers = [self.hf_pipeline.model[0], self.hf_pipeline.model[2]]
+        for layer in linear_layers:
+            self.assertIsInstance(layer, torch.ao.nn.quantized.dynamic.Linear)
+        self.assertEqual(torch.qint8, linear_layers[0].weight().dtype)
+        self.assertTrue(
+            torch.allclose(expected,
+                           self.hf_pipeline.model(inputs),
+                           atol=0.1))
+
+    def test_without_quantize_keeps_the_model(self):
+        model = self.hf_pipeline.model
+        _optimize_for_cpu(self.hf_pipeline, quantize=False)
+        self.assertIs(model, self.hf_pipeline.model)
+        self.assertIsInstance(model[0], torch.nn.Linear)
+
+    def test_n_threads(self):
+        n_threads = self.n_threads + 1
+        _optimize_for_cpu(self.hf_pipeline, False, n_threads)
+        self.assertEqual(n_threads, torch.get_num_threads())
+
+        with self.assertRaises(AssertionError):
+            _optimize_for_cpu(self.hf_pipeline, False, 0)
+
+
+class TestQuestionAnsweringReuseContexts(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # A tiny untrained model, so its answers are arbitrary but
+        # deterministic, with a max length short enough for many windows
+        cls.model_dir = tempfile.TemporaryDirectory()
+        model_path = pathlib.Path(cls.model_dir.name)
+        vocab = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + [
+            'relation', 'with', 'entity', 'named', 'in', 'time', 'interval',
+            'to', 'what', 'is', 'the', 'latest'
+        ] + list("0123456789er-?") + [f"##{digit}" for digit in range(10)]
+        (model_path / "vocab.txt").write_text("\n".join(vocab))
+        BertTokenizerFast(str(model_path / "vocab.txt"),
+                          model_max_length=64).save_pretrained(model_path)
+        torch.manual_seed(0)
+        BertForQuestionAnswering(
+            BertConfig(vocab_size=len(vocab),
+                       hidden_size=16,
+                       num_hidden_layers=1,
+                       num_attention_heads=2,
+                       intermediate_size=32,
+                       max_position_embeddings=64)).save_pretrained(model_path)
+
+        cls.pipeline_llm = HuggingFaceQuestionAnsweringLLM(str(model_path))
+        cls.reuse_llm = HuggingFaceQuestionAnsweringLLM(
+            str(model_path), reuse_context_encoding=True)
+
+        lines = [
+            f"Relation r{i % 3} with entity named e{i} in time interval"\
+                f" {2000 + i}-01-01 to {2001 + i}-01-01" for i in range(9)
+        ]
+        cls.data = [{
+            'context': "\n".join(lines[:n_lines]),
+            'question': f"What is the entity with the latest relation r{rel}?"
+        } for n_lines in [1, 2, 9] for rel in range(3)]
+        cls.data.append({'context': "e1", 'question': "What is the latest?"})
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.model_dir.cleanup()
+
+    def test_quantize_and_n_threads(self):
+        n_threads = torch.get_num_threads()
+        try:
+            llm = HuggingFaceQuestionAnsweringLLM(self.model_dir.name,
+                                                  quantize=True,
+                                                  n_threads=n_threads + 1)
+            self.assertEqual(n_threads + 1, torch.get_num_threads())
+        finally:
+            torch.set_num_threads(n_threads)
+
+        self.assertTrue(
+            any(
+                isinstance(module, torch.ao.nn.quantized.dynamic.Linear)
+                for module in llm.pipeline.model.modules()))
+        self.assertFalse(
+            any(
+                type(module) is torch.nn.Linear
+                for module in llm.pipeline.model.modules()))
+        self.assertTrue(llm.cache_id().endswith(":int8"))
+        self.assertEqual(len(self.data), len(llm.answer(self.data)))
+
+    def test_same_windows_as_pipeline(self):
+        tokenizer = self.pipeline_llm.pipeline.tokenizer
+        for item in self.data:
+            # The windows of the pipeline preprocessing
+            encodings = tokenizer(item['question'],
+                                  item['context'],
+                                  truncation="only_second",
+                                  max_length=self.reuse_llm.max_seq_len,
+                                  stride=self.reuse_llm.doc_stride,
+                                  return_overflowing_tokens=True)
+            windows = self.reuse_llm._get_windows(
+                item['question'],
+                self.reuse_llm._encode_context(item['context']))
+
+            self.assertEqual(encodings['input_ids'],
+                             [window[0] for window in windows])
+            self.assertEqual(encodings['token_type_ids'],
+                             [window[1] for window in windows])
+
+    def test_windows_offsets(self):
+        item = self.data[-2]
+        context_ids = self.reuse_llm._encode_context(item['context']).ids
+        windows = self.reuse_llm._get_windows(
+            item['question'], self.reuse_llm._encode_context(item['context']))
+        self.assertGreater(len(windows), 2)
+
+        previous_end = None
+        for input_ids, _, context_position, window_start, n_tokens in windows:
+            self.assertLessEqual(len(input_ids), self.reuse_llm.max_seq_len)
+            self.assertEqual(
+                context_ids[window_start:window_start + n_tokens],
+                input_ids[context_position:context_position + n_tokens])
+            if previous_end is not None:
+                self.assertEqual(self.reuse_llm.doc_stride,
+                                 previous_end - window_start)
+            previous_end = window_start + n_tokens
+        # The last window is shorter and ends with the context
+        self.assertEqual(len(context_ids), previous_end)
+        self.assertLess(len(windows[-1][0]), self.reuse_llm.max_seq_len)
+
+    def test_encodes_every_context_once(self):
+        self.reuse_llm._context_encodings.clear()
+        with patch.object(self.reuse_llm,
+                          '_encode_context',
+                          wraps=self.reuse_llm._encode_context) as encode:
+            self.reuse_llm.answer(self.data)
+        self.assertEqual(len(self.data), encode.call_count)
+
+    def test_windows_in_pipeline_batches(self):
+        pipeline_answers = self.pipeline_llm.answer(self.data)
+        model = self.reuse_llm.pipeline.model
+        self.reuse_llm.pipeline_batch_s = 4
+        try:
+            with patch.object(self.reuse_llm.pipeline, 'model',
+                              wraps=model) as batched_model:
+                reuse_answers = self.reuse_llm.answer(self.data)
+        finally:
+            self.reuse_llm.pipeline_batch_s = 1
+
+        batches_s = [
+            call.kwargs['input_ids'].shape[0]
+            for call in batched_model.call_args_list
+        ]
+        self.assertGreater(len(batches_s), 1)
+        self.assertTrue(all(batch_s <= 4 for batch_s in batches_s))
+        self.assertEqual([answer['answer'] for answer in pipeline_answers],
+                         [answer['answer'] for answer in reuse_answers])
+
+    def test_span_to_chars(self):
+        encoding = self.reuse_llm._encode_context("e12 named e3")
+        # e, ##1, ##2, named, e, ##3
+        self.assertEqual((0, 3), _span_to_chars(encoding, 1, 2))
+        self.assertEqual((4, 12), _span_to_chars(encoding, 3, 5))
+        # The words are cut to the tokens of the window
+        self.assertEqual((1, 3), _span_to_chars(encoding, 1, 2, 1, 6))
+        self.assertEqual((4, 11), _span_to_chars(encoding, 3, 4, 0, 5))
+        # Spans from the first token of the input, before the context
+        self.assertEqual((0, 2), _span_to_chars(encoding, -1, 1))
+        self.assertEqual((0, 0), _span_to_chars(encoding, -1, -1))
+
+    def test_same_answers_as_pipeline(self):
+        pipeline_answers = self.pipeline_llm.answer(self.data)
+        reuse_answers = self.reuse_llm.answer(self.data)
+
+        for pipeline_answer, reuse_answer in zip(pipeline_answers,
+                                                 reuse_answers):
+            self.assertEqual(
+                (pipeline_answer['answer'], pipeline_answer['start'],
+                 pipeline_answer['end']),
+                (reuse_answer['answer'], reuse_answer['start'],
+                 reuse_answer['end']))
+            self.assertAlmostEqual(pipeline_answer['score'],
+                                   reuse_answer['score'],
+                                   places=6)
+
+
+def save_tiny_gpt2(model_path: pathlib.Path):
+    """
+    Saves an untrained GPT-2 whose tokens are the ASCII characters, so its
+    generations are arbitrary but deterministic and readable
+    """
+    byte_chars = bytes_to_unicode()
+    vocab = {
+        byte_chars[char_byte]: token_id
+        for token_id, char_byte in enumerate([10] + list(range(32, 127)))
+    }
+    vocab['<|endoftext|>'] = len(vocab)
+    (model_path / "vocab.json").write_text(json.dumps(vocab))
+    (model_path / "merges.txt").write_text("#version: 0.2\n")
+    tokenizer = GPT2TokenizerFast(str(model_path / "vocab.json"),
+                                  str(model_path / "merges.txt"))
+    tokenizer.save_pretrained(model_path)
+    torch.manual_seed(0)
+    GPT2LMHeadModel(
+        GPT2Config(vocab_size=len(vocab),
+                   n_positions=512,
+                   n_embd=32,
+                   n_layer=2,
+                   n_head=2,
+                   initializer_range=0.5)).save_pretrained(model_path)
+
+
+class TestChatLLM(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.model_dir = tempfile.TemporaryDirectory()
+        cls.model_path = pathlib.Path(cls.model_dir.name)
+        save_tiny_gpt2(cls.model_path)
+
+        contexts = [
+            "Relation r0 with entity named e1\n"\
+                "Relation r1 with entity named e12",
+            "Relation r0 with entity named e3\n"\
+                "Relation r1 with entity named e2"
+        ]
+        cls.data = [{
+            'context': context,
+            'question': f"What is the entity with the latest relation r{rel}?",
+            'candidates': ['e1', 'e12', 'e2', 'e3']
+        } for context in contexts for rel in range(2)]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.model_dir.cleanup()
+
+    def get_llm(self, **kwargs) -> HuggingFaceChatLLM:
+        return HuggingFaceChatLLM(str(self.model_path),
+                                  stop_on_period=False,
+                                  **kwargs)
+
+    def test_reuse_context_cache_generates_the_same(self):
+        expected = self.get_llm().answer(self.data,
+                                         max_tokens=8,
+                                         do_sample=False)
+
+        reuse_llm = self.get_llm(reuse_context_cache=True)
+        # The questions of the first context are asked again after the
+        # second one, from its cached past key values
+        answers = reuse_llm.answer(self.data, max_tokens=8, do_sample=False)
+        answers_again = reuse_llm.answer(self.data[:2],
+                                         max_tokens=8,
+                                         do_sample=False)
+
+        self.assertEqual(expected, answers)
+        self.assertEqual(expected[:2], answers_again)
+        self.assertGreater(len({answer['answer'] for answer in expected}), 1)
+
+    def test_reuse_doesnt_modify_context_cache(self):
+        reuse_llm = self.get_llm(reuse_context_cache=True)
+        reuse_llm.answer(self.data[:1], max_tokens=8, do_sample=False)
+        prefix_ids, context_cache = reuse_llm._get_context_cache(
+            self.data[0]['context'])
+        snapshot = copy.deepcopy(context_cache)
+
+        reuse_llm.answer(self.data[:2], max_tokens=8, do_sample=False)
+        reuse_llm._answer_scoring_candidates(self.data[1])
+
+        self.assertEqual(len(prefix_ids), context_cache.get_seq_length())
+        for layer, snapshot_layer in zip(context_cache.layers,
+                                         snapshot.layers):
+            self.assertTrue(torch.equal(snapshot_layer.keys, layer.keys))
+            self.assertTrue(torch.equal(snapshot_layer.values, layer.values))
+
+    def get_candidates_log_likelihoods(self, llm: HuggingFaceChatLLM,
+                                       item: dict) -> list[float]:
+        """
+        The log-likelihood of every candidate after the prompt, with a
+        forward pass over the whole text of each one
+        """
+        tokenizer = llm.pipeline.tokenizer
+        prompt_ids = tokenizer(
+            llm.prompt_fmt.format(item['context'],
+                                  item['question']))['input_ids']
+        log_likelihoods = list()
+        for candidate in item['candidates']:
+            candidate_ids = tokenizer(f" {candidate}.",
+                                      add_special_tokens=False)['input_ids']
+            with torch.no_grad():
+                logits = llm.pipeline.model(
+                    input_ids=torch.tensor([prompt_ids +
+                                            candidate_ids])).logits[0]
+            log_probs = torch.log_softmax(logits.float(), dim=-1)
+            log_likelihoods.append(
+                sum(log_probs[len(prompt_ids) + idx - 1, token_id].item()
+                    for idx, token_id in enumerate(candidate_ids)))
+        return log_likelihoods
+
+    def test_scores_candidates_as_forward_passes(self):
+        for reuse_context_cache in [False, True]:
+            llm = self.get_llm(score_candidates=True,
+                               reuse_context_cache=reuse_context_cache)
+            for item, response in zip(self.data, llm.answer(self.data)):
+                log_likelihoods = self.get_candidates_log_likelihoods(
+                    llm, item)
+                best = max(range(len(log_likelihoods)),
+                           key=lambda idx: log_likelihoods[idx])
+                self.assertEqual(item['candidates'][best], response['answer'])
+                self.assertAlmostEqual(log_likelihoods[best],
+                                       response['score'],
+                                       places=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from datetime import datetime
+import random
 from unittest import main, TestCase
 from graph import StarGraph, Relation, DateInterval
 
@@ -137,6 +138,11 @@ class TestStarGraph(TestCase):
         n_relations = len(graph.get_all_latest_str().split("\n"))
         self.assertEqual(n_relations, 2)
 
+    def test_entity_names(self):
+        graph = self._get_graph_with_relations_of_2_types()
+        self.assertEqual(['e1', 'e2', 'e3', 'e4', 'e5', 'e6'],
+                         graph.entity_names())
+
     def test_get_shuffled_text(self):
         graph = self.get_graph_with_3_relations_single_type()
         self.assertNotEqual(graph.get_shuffled_str(42), str(graph))
@@ -145,6 +151,22 @@ class TestStarGraph(TestCase):
         graph = self._get_graph_with_relations_of_2_types()
         self.assertEqual(6, graph.n_relations())
 
+    def test_len_counts_added_edges(self):
+        graph = self._get_graph_with_relations_of_2_types()
+        overlapping = next(iter(graph.relations_map['r1']))
+        self.assertFalse(graph.add_edge('r1', overlapping))
+        self.assertEqual(6, len(graph))
+        self.assertEqual(len(graph.to_list()), len(graph))
+
+        for seed in range(5):
+            graph = StarGraph()
+            graph.generate_star_graph([f'e{i}' for i in range(1, 30)],
+                                      ['r0', 'r1', 'r2'],
+                                      rng=random.Random(seed))
+            self.assertEqual(len(graph.to_list()), len(graph))
+            self.assertEqual(len(graph),
+                             len(StarGraph.from_dict(graph.to_dict())))
+
     def test_get_interleaved_list(self):
         graph = self._get_graph_with_relations_of_2_types()
         self.assertEqual(6, len(graph.get_interleaved_list()))
@@ -180,6 +202,27 @@ class TestStarGraph(TestCase):
         graph = self._get_graph_with_relations_of_2_types()
         self.assertEqual(graph.n_nodes_for_relation('j9'), 0)
 
+    def test_generate_star_graph_with_rng(self):
+        entities = [f'e{i}' for i in range(1, 20)]
+        relations = [f'r{i}' for i in range(5)]
+        random.seed(0)
+        global_state = random.getstate()
+
+        graph = StarGraph()
+        graph.generate_star_graph(entities, relations, rng=random.Random(3))
+        same_seed_graph = StarGraph()
+        same_seed_graph.generate_star_graph(entities,
+                                            relations,
+                                            rng=random.Random(3))
+
+        self.assertEqual(graph, same_seed_graph)
+        self.assertEqual(global_state, random.getstate())
+
+    def test_shuffled_list_with_rng(self):
+        graph = self._get_graph_with_relations_of_2_types()
+        self.assertEqual(graph.shuffled_list(rng=random.Random(3)),
+                         graph.shuffled_list(rng=random.Random(3)))
+
 
 if __name__ == "__main__":
     main()
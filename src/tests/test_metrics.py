@@ -0,0 +1,106 @@
+import csv
+import json
+import pathlib
+import tempfile
+from unittest import main, TestCase
+from unittest.mock import patch
+
+from metrics import Histogram, MetricsRegistry
+import utils
+
+
+class TestHistogram(TestCase):
+
+    def test_summary(self):
+        histogram = Histogram()
+        for value in range(1, 11):
+            histogram.observe(float(value))
+
+        summary = histogram.summary()
+        self.assertEqual(10, summary['count'])
+        self.assertEqual(55.0, summary['total'])
+        self.assertEqual(5.5, summary['mean'])
+        self.assertEqual(1.0, summary['min'])
+        self.assertEqual(10.0, summary['max'])
+        self.assertEqual(5.0, summary['p50'])
+        self.assertEqual(9.0, summary['p90'])
+        self.assertEqual(10.0, summary['p99'])
+
+    def test_empty_summary(self):
+        self.assertEqual({'count': 0, 'total': 0.0}, Histogram().summary())
+
+
+class TestMetricsRegistry(TestCase):
+
+    def test_disabled_records_nothing(self):
+        metrics = MetricsRegistry()
+        metrics.increment('instances')
+        metrics.observe('model_call', 1.0)
+        with metrics.time('result_writing'):
+            pass
+
+        self.assertEqual(dict(), metrics.counters)
+        self.assertEqual(dict(), metrics.histograms)
+
+    def test_time_and_count(self):
+        metrics = MetricsRegistry(enabled=True)
+        metrics.increment('instances', 3)
+        metrics.increment('instances')
+        with metrics.time('model_call'):
+            pass
+
+        summary = metrics.summary()
+        self.assertEqual({'instances': 4}, summary['counters'])
+        self.assertEqual(1, summary['histograms']['model_call']['count'])
+        self.assertIn('instances_per_s', summary['throughput'])
+
+    def test_merge_snapshot(self):
+        worker_metrics = MetricsRegistry(enabled=True)
+        worker_metrics.increment('requests', 2)
+        worker_metrics.observe('model_call', 1.0)
+        metrics = MetricsRegistry(enabled=True)
+        metrics.increment('requests')
+        metrics.observe('model_call', 3.0)
+
+        metrics.merge(worker_metrics.take_snapshot())
+        self.assertEqual({'requests': 3}, metrics.counters)
+        self.assertEqual([3.0, 1.0], metrics.histograms['model_call'].values)
+        self.assertEqual(dict(), worker_metrics.counters)
+
+    def test_save(self):
+        metrics = MetricsRegistry(enabled=True)
+        metrics.increment('instances', 2)
+        metrics.observe('model_call', 1.0)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            json_path = pathlib.Path(tmp_dir) / "metrics.json"
+            metrics.save(json_path)
+            with open(json_path, 'r') as metrics_file:
+                summary = json.load(metrics_file)
+            self.assertEqual({'instances': 2}, summary['counters'])
+
+            csv_path = pathlib.Path(tmp_dir) / "metrics.csv"
+            metrics.save(csv_path)
+            with open(csv_path, 'r') as metrics_file:
+                rows = list(csv.reader(metrics_file))
+            self.assertEqual(['metric', 'stat', 'value'], rows[0])
+            self.assertIn(['model_call', 'total', '1.0'], rows)
+
+
+class TestTimerDec(TestCase):
+
+    def test_records_into_metrics(self):
+        metrics = MetricsRegistry(enabled=True)
+
+        @utils.timer_dec(name="stage")
+        def stage(value):
+            return value
+
+        with patch.object(utils, 'METRICS', metrics), \
+                patch.object(utils, 'PRINT_ENABLED', False):
+            self.assertEqual(2, stage(2))
+
+        self.assertEqual(1, len(metrics.histograms['stage']))
+
+
+if __name__ == "__main__":
+    main()
@@ -124,6 +124,70 @@ class TestRelations(TestCase):
 
         self.assertEqual(expected_relations, Relations.from_dict(target_dict))
 
+    def test_sorted_by_start_date(self):
+        relations = Relations("r1")
+        relations_to_add = [
+            Relation('e1',
+                     DateInterval(datetime(2018, 6, 19), datetime(2020, 6,
+                                                                  19))),
+            Relation('e2',
+                     DateInterval(datetime(2013, 4, 2), datetime(2015, 3,
+                                                                 23))),
+            Relation('e3',
+                     DateInterval(datetime(2021, 4, 2), datetime(2023, 3, 23)))
+        ]
+        for relation in relations_to_add:
+            relations.add(relation)
+
+        self.assertEqual(['e2', 'e1', 'e3'],
+                         [rel.name for rel in relations.sorted()])
+        self.assertEqual(['e3', 'e1', 'e2'],
+                         [rel.name for rel in relations.sorted(False)])
+        self.assertEqual(['e1', 'e2', 'e3'],
+                         [rel.name for rel in relations])
+
+    def test_dont_add_relation_overlapping_neighbours(self):
+        relations = Relations("r1")
+        relations.add(
+            Relation('e1',
+                     DateInterval(datetime(2010, 1, 1), datetime(2011, 1,
+                                                                 1))))
+        relations.add(
+            Relation('e2',
+                     DateInterval(datetime(2014, 1, 1), datetime(2015, 1,
+                                                                 1))))
+        contains_one = Relation(
+            'e3', DateInterval(datetime(2013, 1, 1), datetime(2016, 1, 1)))
+        between = Relation(
+            'e4', DateInterval(datetime(2012, 1, 1), datetime(2013, 1, 1)))
+
+        self.assertFalse(relations.add(contains_one))
+        self.assertTrue(relations.add(between))
+        self.assertEqual(3, len(relations))
+
+    def test_add_relation_touching_another(self):
+        relations = Relations("r1")
+        relations.add(
+            Relation('e1',
+                     DateInterval(datetime(2010, 1, 1), datetime(2011, 1,
+                                                                 1))))
+        touching = Relation(
+            'e2', DateInterval(datetime(2011, 1, 1), datetime(2012, 1, 1)))
+
+        self.assertTrue(relations.add(touching))
+        self.assertIs(relations.latest(), touching)
+
+    def test_has_relation(self):
+        relations = Relations("r1")
+        relation = Relation(
+            'e1', DateInterval(datetime(2010, 1, 1), datetime(2011, 1, 1)))
+        relations.add(relation)
+
+        same_dates_other_entity = Relation(
+            'e2', DateInterval(datetime(2010, 1, 1), datetime(2011, 1, 1)))
+        self.assertTrue(relations.has(relation))
+        self.assertFalse(relations.has(same_dates_other_entity))
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,74 @@
+from datetime import datetime
+import random
+from unittest import main, TestCase
+
+from graph import DateInterval, Relation, StarGraph
+import rendering
+
+
+class TestRendering(TestCase):
+
+    def setUp(self):
+        self.graph = StarGraph()
+        edges = [('r2', 'e1', 2010), ('r1', 'e2', 2000), ('r1', 'e3', 2020),
+                 ('r2', 'e4', 2005), ('r1', 'e5', 2015)]
+        for rel_name, entity, year in edges:
+            self.graph.add_edge(
+                rel_name,
+                Relation(
+                    entity,
+                    DateInterval(datetime(year, 1, 1), datetime(year, 6, 1))))
+
+    def get_entities(self, ordering: str, **kwargs) -> list[str]:
+        return [
+            line.split(" ")[5]
+            for line in rendering.render(self.graph, ordering, **kwargs).split(
+                "\n")
+        ]
+
+    def test_orderings(self):
+        self.assertEqual(['e2', 'e3', 'e5', 'e1', 'e4'],
+                         self.get_entities('as_is'))
+        self.assertEqual(['e2', 'e4', 'e5', 'e1', 'e3'],
+                         self.get_entities('interleave_asc'))
+        self.assertEqual(['e3', 'e1', 'e5', 'e4', 'e2'],
+                         self.get_entities('interleave_desc'))
+        self.assertEqual(['e3', 'e1'], self.get_entities('latest'))
+        self.assertEqual(['e2', 'e4', 'e1', 'e5', 'e3'],
+                         self.get_entities('chronological_asc'))
+        self.assertEqual(['e3', 'e5', 'e1', 'e4', 'e2'],
+                         self.get_entities('chronological_desc'))
+
+    def test_shuffle_uses_rng(self):
+        shuffled = self.get_entities('shuffle', rng=random.Random(1))
+        self.assertEqual(shuffled,
+                         self.get_entities('shuffle', rng=random.Random(1)))
+        self.assertCountEqual(self.get_entities('as_is'), shuffled)
+
+    def test_matches_graph_strings(self):
+        self.assertEqual(str(self.graph), rendering.render(self.graph, 'as_is'))
+        self.assertEqual(self.graph.get_interleaved_str(False),
+                         rendering.render(self.graph, 'interleave_desc'))
+        self.assertEqual(self.graph.get_all_latest_str(),
+                         rendering.render(self.graph, 'latest'))
+
+    def test_register_ordering(self):
+        with self.assertRaises(ValueError):
+            rendering.render(self.graph, 'reversed')
+
+        @rendering.register_ordering('reversed')
+        def iter_reversed(graph: StarGraph, **kwargs):
+            yield from reversed(graph.to_list())
+
+        try:
+            self.assertEqual(['e4', 'e1', 'e5', 'e3', 'e2'],
+                             self.get_entities('reversed'))
+        finally:
+            del rendering.ORDERINGS['reversed']
+
+    def test_empty_graph(self):
+        self.assertEqual("", rendering.render(StarGraph(), 'interleave_asc'))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import pathlib
+import tempfile
+from unittest import main, TestCase
+
+from response_cache import ResponseCache
+
+
+class TestResponseCache(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_path = pathlib.Path(self.tmp_dir.name) / "cache.sqlite"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_key_depends_on_params(self):
+        instance = {'context': 'c', 'question': 'q'}
+        key = ResponseCache.make_key('model', instance, {'max_tokens': 20})
+
+        self.assertEqual(
+            key, ResponseCache.make_key('model', dict(instance),
+                                        {'max_tokens': 20}))
+        self.assertNotEqual(
+            key, ResponseCache.make_key('model', instance, {'max_tokens': 5}))
+        self.assertNotEqual(
+            key, ResponseCache.make_key('other', instance, {'max_tokens': 20}))
+
+    def test_get_saved_responses(self):
+        cache = ResponseCache(self.cache_path)
+        cache.put_many({
+            'a': {
+                'answer': 'e1'
+            },
+            'b': {
+                'answer': 'e2',
+                'score': 0.5
+            }
+        })
+
+        found = cache.get_many(['a', 'b', 'c'])
+        self.assertDictEqual(
+            {
+                'a': {
+                    'answer': 'e1'
+                },
+                'b': {
+                    'answer': 'e2',
+                    'score': 0.5
+                }
+            }, found)
+        self.assertEqual(2, cache.hits)
+        self.assertEqual(1, cache.misses)
+        cache.close()
+
+    def test_responses_persist(self):
+        cache = ResponseCache(self.cache_path)
+        cache.put_many({'a': {'answer': 'e1'}})
+        cache.close()
+
+        cache = ResponseCache(self.cache_path)
+        self.assertDictEqual({'a': {'answer': 'e1'}}, cache.get_many(['a']))
+        cache.close()
+
+    def test_evict_least_recently_used(self):
+        cache = ResponseCache(self.cache_path, max_entries=2)
+        cache.put_many({'a': {'answer': 'e1'}})
+        cache.put_many({'b': {'answer': 'e2'}})
+        cache.get_many(['a'])
+        cache.put_many({'c': {'answer': 'e3'}})
+
+        self.assertEqual(2, len(cache))
+        self.assertEqual({'a', 'c'}, set(cache.get_many(['a', 'b', 'c'])))
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import importlib.util
+import pathlib
+import tempfile
+from unittest import main, skipUnless, TestCase
+
+from eval_model import read_results
+from results_sink import (CSVResultsSink, export_csv, open_results_sink,
+                          read_results_columns)
+
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+
+class TestResultsSink(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_path = pathlib.Path(self.tmp_dir.name)
+        self.results = [(0, 'r0', 'e1', 'e1', 0.9, 0.1),
+                        (0, 'r1', 'e2', '2027-07-06, to 2028', None, 0.1),
+                        (1, 'r0', 'e3', 'e3\nand e4', 0.5, 0.2)]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_csv_quotes_answers(self):
+        results_path = self.tmp_path / "results.csv"
+        with CSVResultsSink(results_path) as sink:
+            sink.write(self.results[:2])
+            sink.write(self.results[2:])
+
+        self.assertEqual(
+            {(str(result[0]), result[1]): (result[2], result[3])
+             for result in self.results}, read_results(results_path))
+
+    def test_csv_append_keeps_one_header(self):
+        results_path = self.tmp_path / "results.csv"
+        with CSVResultsSink(results_path) as sink:
+            sink.write(self.results[:1])
+        with CSVResultsSink(results_path, append=True) as sink:
+            sink.write(self.results[1:])
+
+        self.assertEqual(['0', '0', '1'],
+                         read_results_columns(results_path,
+                                              ['graph_id'])['graph_id'])
+
+    def test_reads_old_csv_results(self):
+        results_path = self.tmp_path / "results.csv"
+        results_path.write_text(
+            "graph_id,rel_name,expected,predicted\n0,r0,e1,e1, e2\n")
+
+        self.assertEqual({('0', 'r0'): ('e1', 'e1, e2')},
+                         read_results(results_path))
+
+    @skipUnless(HAS_PYARROW, "pyarrow is not installed")
+    def test_parquet_keeps_typed_columns(self):
+        results_path = self.tmp_path / "results.parquet"
+        with open_results_sink(results_path) as sink:
+            sink.row_group_size = 2
+            sink.write(self.results[:1])
+        with open_results_sink(results_path, append=True) as sink:
+            sink.write(self.results[1:])
+
+        columns = read_results_columns(results_path, ['graph_id', 'score'])
+        self.assertEqual({
+            'graph_id': [0, 0, 1],
+            'score': [0.9, None, 0.5]
+        }, columns)
+
+        csv_path = self.tmp_path / "results.csv"
+        export_csv(results_path, csv_path)
+        self.assertEqual(read_results(results_path), read_results(csv_path))
+
+    @skipUnless(HAS_PYARROW, "pyarrow is not installed")
+    def test_parquet_halted_run_keeps_saved_row_groups(self):
+        results_path = self.tmp_path / "results.parquet"
+        with open_results_sink(results_path) as sink:
+            sink.write(self.results[:1])
+
+        sink = open_results_sink(results_path, append=True)
+        sink.row_group_size = 2
+        sink.write(self.results[1:2])
+        sink.write(self.results[2:])
+        sink.write(self.results[:1])
+        # It halts once the row groups are saved, without closing
+        sink._pending.put(None)
+        sink._thread.join()
+        # The buffered results are lost, but not the saved row groups
+        self.assertEqual([0, 0, 1],
+                         read_results_columns(results_path,
+                                              ['graph_id'])['graph_id'])
+
+        # A stale temporary file of a halted merge is removed
+        (self.tmp_path / "results.parquet.tmp").write_text("halted")
+        with open_results_sink(results_path, append=True) as sink:
+            sink.write(self.results[2:])
+
+        self.assertEqual([0, 0, 1, 1],
+                         read_results_columns(results_path,
+                                              ['graph_id'])['graph_id'])
+        self.assertEqual([results_path], list(self.tmp_path.iterdir()))
+
+    @skipUnless(HAS_PYARROW, "pyarrow is not installed")
+    def test_parquet_without_append_discards_saved_results(self):
+        results_path = self.tmp_path / "results.parquet"
+        sink = open_results_sink(results_path)
+        sink.row_group_size = 1
+        sink.write(self.results[:2])
+        sink._pending.put(None)
+        sink._thread.join()
+
+        with open_results_sink(results_path) as sink:
+            sink.write(self.results[2:])
+        self.assertEqual([1],
+                         read_results_columns(results_path,
+                                              ['graph_id'])['graph_id'])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import asyncio
+import time
+
+from openai import AsyncOpenAI, OpenAI, OpenAIError
+
+from evaluators import LLM
+from metrics import METRICS
+from utils import timer_dec
+
+
+def _record_request(chat_completion):
+    """
+    Counts the request and its tokens, if the server reports its usage
+    """
+    METRICS.increment('requests')
+    usage = getattr(chat_completion, 'usage', None)
+    if usage is not None:
+        METRICS.increment('prompt_tokens', usage.prompt_tokens or 0)
+        METRICS.increment('completion_tokens', usage.completion_tokens or 0)
+
+
+class URLLLM(LLM):
+    """
+    It first connects to the given url using the token and
+    then can answer the given text. This is useful when running local-llm.
+    If max_in_flight is greater than 1, the instances of a batch are sent
+    concurrently, with up to max_in_flight requests at a time.
+    """
+
+    def __init__(self,
+                 model_name: str = "",
+                 url: str = "",
+                 token: str = 'foo',
+                 max_in_flight: int = 1,
+                 **kwargs):
+        super().__init__(model_name, **kwargs)
+        assert max_in_flight > 0, f"max_in_flight must be positive but {max_in_flight} was given!"
+        self.max_in_flight = max_in_flight
+        self.client = OpenAI(
+            api_key=token,
+            base_url=url,
+        )
+        if self.max_in_flight > 1:
+            self.async_client = AsyncOpenAI(
+                api_key=token,
+                base_url=url,
+            )
+            # The same loop is used for every batch so the async client
+            # can reuse its connections
+            self._loop = asyncio.new_event_loop()
+        self._served_model_ids = None
+
+    def cache_id(self) -> str:
+        """
+        The url is part of the id, as every server may serve other models.
+        Without a model name, the server answers with the model it serves,
+        so its ids are part of it too.
+        """
+        cache_id = f"{super().cache_id()}:{self.client.base_url}"
+        if self.model_name is not None:
+            return cache_id
+
+        if self._served_model_ids is None:
+            self._served_model_ids = sorted(
+                model.id for model in self.client.models.list())
+        return f"{cache_id}:{','.join(self._served_model_ids)}"
+
+    @timer_dec
+    def answer(self, data: list[dict[str, str]], **kwargs) -> list[dict]:
+        """
+        Data is a list of dict of instances. For this LLM, each dict must have 'question'
+        and 'context' keys.
+        """
+        if self.max_in_flight > 1:
+            return self._loop.run_until_complete(
+                self._answer_concurrently(data, **kwargs))
+
+        for attempt in range(5):
+            responses = list()
+            try:
+                for instance in data:
+                    content = instance['context'] + "\n" + instance['question']
+                    chat_completion = self.client.chat.completions.create(
+                        messages=[
+                            {
+                                "role": "user",
+                                "content": content,
+                            },
+                        ],
+                        model=self.model_name,
+                        **kwargs)
+                    _record_request(chat_completion)
+                    for choice in chat_completion.choices:
+                        responses.append({'answer': choice.message.content})
+            except OpenAIError as e:
+                error_message = str(e)
+                if "is currently loading" in error_message:
+                    print(
+                        f"Attempt {attempt + 1}/5: Model is still loading. Waiting 10 seconds to try again..."
+                    )
+                    METRICS.increment('retries')
+                    time.sleep(10)
+                else:
+                    print(f"Unnespected error: {error_message}")
+                    raise e
+            else:
+                return responses
+        raise RuntimeError(f"The model didn't load after many tries.")
+
+    async def _answer_concurrently(self, data: list[dict[str, str]],
+                                   **kwargs) -> list[dict]:
+        """
+        Answer every instance concurrently. The responses follow the
+        order of the instances.
+        """
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        async def answer_with_limit(instance: dict[str, str]) -> list[dict]:
+            async with semaphore:
+                return await self._answer_instance_async(instance, **kwargs)
+
+        instances_responses = await asyncio.gather(
+            *[answer_with_limit(instance) for instance in data])
+        return [
+            response for responses in instances_responses
+            for response in responses
+        ]
+
+    async def _answer_instance_async(self, instance: dict[str, str],
+                                     **kwargs) -> list[dict]:
+        for attempt in range(5):
+            try:
+                content = instance['context'] + "\n" + instance['question']
+                chat_completion = await self.async_client.chat.completions.create(
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": content,
+                        },
+                    ],
+                    model=self.model_name,
+                    **kwargs)
+            except OpenAIError as e:
+                error_message = str(e)
+                if "is currently loading" in error_message:
+                    print(
+                        f"Attempt {attempt + 1}/5: Model is still loading. Waiting 10 seconds to try again..."
+                    )
+                    METRICS.increment('retries')
+                    await asyncio.sleep(10)
+                else:
+                    print(f"Unnespected error: {error_message}")
+                    raise e
+            else:
+                _record_request(chat_completion)
+                return [{
+                    'answer': choice.message.content
+                } for choice in chat_completion.choices]
+        raise RuntimeError(f"The model didn't load after many tries.")
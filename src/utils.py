@@ -1,16 +1,34 @@
+import functools
 from timeit import default_timer as timer
 
+from metrics import METRICS
+
 PRINT_ENABLED = True
 
 
-def timer_dec(func):
+def timer_dec(func=None, *, name: str = None):
+    """
+    Times every call of the decorated function. The seconds are observed in
+    the METRICS histogram with the name, by default the function name, and
+    printed if PRINT_ENABLED. It can be used as @timer_dec or
+    @timer_dec(name=...).
+    """
+    if func is None:
+        return functools.partial(timer_dec, name=name)
+
+    metric_name = name if name is not None else func.__name__
 
+    @functools.wraps(func)
     def inner(*args, **kwargs):
+        if not (PRINT_ENABLED or METRICS.enabled):
+            return func(*args, **kwargs)
+
         start = timer()
         result = func(*args, **kwargs)
         end = timer()
+        METRICS.observe(metric_name, end - start)
         if PRINT_ENABLED:
-            print(func.__name__, end - start, " s")
+            print(metric_name, end - start, " s")
         return result
 
     return inner